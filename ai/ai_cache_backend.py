@@ -0,0 +1,93 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from config.constants import Constants
+
+logger = logging.getLogger(__name__)
+
+
+class AICacheBackend(ABC):
+    """Classes that defines an interface for a cache of AI responses shared between replicas"""
+
+    @abstractmethod
+    def get(self, key: str) -> str | None:  # pragma: no cover
+        """
+        Look up a cached response.
+
+        Args:
+            key: The prompt key
+
+        Returns:
+            The cached response, or None if there is no live entry
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, response: str, ttl: float):  # pragma: no cover
+        """
+        Store a response.
+
+        Args:
+            key: The prompt key
+            response: The response to cache
+            ttl: The number of seconds the response stays valid
+        """
+        pass
+
+
+class MongoAICacheBackend(AICacheBackend):
+    """Shared AI response cache stored in a MongoDB collection.
+
+    Entries are keyed by _id, so lookups use the primary key index, and a TTL index removes them once they expire.
+    Backend errors are logged and treated as misses so that the cache can never fail a request.
+    """
+
+    def __init__(self, collection: Collection):
+        """Initializes the backend
+
+        The TTL index is created when the first entry is stored, so that constructing the backend (and the app) does
+        not need MongoDB to be reachable.
+
+        Args:
+            collection: The collection holding the cached responses
+        """
+        self.collection = collection
+        self._index_ready = False
+        self._index_lock = threading.Lock()
+
+    def _ensure_ttl_index(self):
+        """Creates the TTL index on first use (creating an existing index is a no-op)."""
+        if not self._index_ready:
+            with self._index_lock:
+                if not self._index_ready:
+                    self.collection.create_index([(Constants.EXPIRES_AT_FIELD, ASCENDING)], expireAfterSeconds=0,
+                                                 name="expires_at_ttl")
+                    self._index_ready = True
+
+    def get(self, key: str) -> str | None:
+        try:
+            # The TTL monitor only runs periodically, so expired entries are filtered out here as well
+            document = self.collection.find_one(
+                {Constants.ID_FIELD: key, Constants.EXPIRES_AT_FIELD: {"$gt": datetime.now(tz=timezone.utc)}},
+                {Constants.ID_FIELD: 0, Constants.RESPONSE_FIELD: 1})
+        except PyMongoError as e:
+            logger.error(f"Error reading the shared AI response cache: {str(e)}")
+            return None
+        return document[Constants.RESPONSE_FIELD] if document else None
+
+    def set(self, key: str, response: str, ttl: float):
+        expires_at = datetime.now(tz=timezone.utc) + timedelta(seconds=ttl)
+        try:
+            self._ensure_ttl_index()
+            self.collection.replace_one(
+                {Constants.ID_FIELD: key},
+                {Constants.RESPONSE_FIELD: response, Constants.EXPIRES_AT_FIELD: expires_at},
+                upsert=True)
+        except PyMongoError as e:
+            logger.error(f"Error writing the shared AI response cache: {str(e)}")
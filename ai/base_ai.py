@@ -1,18 +1,64 @@
 from abc import ABC, abstractmethod
+from typing import Iterator
+
+
+class AIStreamError(Exception):
+    """Raised by stream_ai_response when the model fails, so that the chunks already yielded are never taken for a
+    complete response"""
+
+    def __init__(self, error_response: str):
+        """Initializes the error
+
+        Args:
+            error_response: The placeholder response to show and store instead of the partial one
+        """
+        super().__init__(error_response)
+        self.error_response = error_response
 
 
 class AIModel(ABC):
     """Classes that defines an interface for communicating with AI models"""
 
+    # The placeholder response returned when the model fails, which must never be cached
+    error_response: str | None = None
+    # Whether responses depend on the conversation context; it is only built for models that use it
+    uses_context: bool = False
+
     @abstractmethod
-    def get_ai_response(self, user_message: str) -> str:  # pragma: no cover
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None) -> str:  # pragma: no cover
         """
         Get response from AI for a user message.
 
         Args:
             user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
 
         Returns:
             str: The response from the AI
         """
         pass
+
+    def warm_up(self):
+        """
+        Prepare the model to serve requests (e.g. create its API client), so that the first request does not pay for
+        it. Called once per process at startup; the default implementation does nothing.
+        """
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None) -> Iterator[str]:
+        """
+        Stream the response from AI for a user message as it is generated.
+
+        The default implementation yields the complete response as a single chunk; models that support incremental
+        generation should override it.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
+
+        Returns:
+            Iterator[str]: The chunks of the response from the AI
+
+        Raises:
+            AIStreamError: If the model fails, possibly after some chunks were yielded
+        """
+        yield self.get_ai_response(user_message, context)
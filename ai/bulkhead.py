@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from config.constants import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# The same defaults as the AI_MAX_CONCURRENCY, AI_MAX_QUEUE and AI_QUEUE_TIMEOUT settings
+DEFAULT_MAX_CONCURRENCY = int(AppConfig.AI_MAX_CONCURRENCY.value)
+DEFAULT_MAX_QUEUE = int(AppConfig.AI_MAX_QUEUE.value)
+DEFAULT_QUEUE_TIMEOUT_SECONDS = float(AppConfig.AI_QUEUE_TIMEOUT.value)
+
+# Each worker process has its own bulkhead; with several workers, /metrics adds up their calls and reports the most
+# saturated worker (multiprocess_mode only applies when PROMETHEUS_MULTIPROC_DIR is set)
+AI_IN_FLIGHT = Gauge("chat_ai_in_flight", "AI calls currently running", multiprocess_mode="livesum")
+AI_QUEUE_DEPTH = Gauge("chat_ai_queue_depth", "Requests waiting for an AI call slot", multiprocess_mode="livesum")
+AI_SATURATION = Gauge("chat_ai_saturation",
+                      "AI calls running or waiting, relative to the maximum concurrency (above 1 means queueing)",
+                      multiprocess_mode="livemax")
+AI_QUEUE_WAIT_SECONDS = Histogram("chat_ai_queue_wait_seconds", "Time spent waiting for an AI call slot",
+                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+AI_REJECTED = Counter("chat_ai_rejected", "Requests shed because no AI call slot was available", ["reason"])
+
+
+class BulkheadFullError(Exception):
+    """Raised when an AI call slot cannot be obtained, so that the request can be shed"""
+
+    def __init__(self, reason: str):
+        """Initializes the error
+
+        Args:
+            reason: Why the request was shed ("queue_full" or "timeout")
+        """
+        super().__init__(f"AI bulkhead rejected the request: {reason}")
+        self.reason = reason
+
+
+class Bulkhead:
+    """Bounds the number of concurrent AI calls, so that a slow model cannot tie up every worker.
+
+    Up to max_concurrency calls run at once. Further callers wait in a queue of at most max_queue entries for up to
+    queue_timeout seconds; callers that find the queue full, or that time out, are rejected with BulkheadFullError.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_queue: int = DEFAULT_MAX_QUEUE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        """Initializes an idle bulkhead
+
+        Args:
+            max_concurrency: The maximum number of AI calls running at once
+            max_queue: The maximum number of callers waiting for a slot
+            queue_timeout: The maximum number of seconds a caller waits for a slot
+
+        Raises:
+            ValueError: If max_concurrency is not positive, or max_queue or queue_timeout is negative
+        """
+        if max_concurrency <= 0:
+            raise ValueError(f"AI bulkhead concurrency must be positive, got {max_concurrency}")
+        if max_queue < 0:
+            raise ValueError(f"AI bulkhead queue size must not be negative, got {max_queue}")
+        if queue_timeout < 0:
+            raise ValueError(f"AI bulkhead queue timeout must not be negative, got {queue_timeout}")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take an AI call slot, waiting in the queue if none is free.
+
+        Raises:
+            BulkheadFullError: If the queue is full or no slot became free within queue_timeout
+        """
+        start = time.perf_counter()
+        with self._condition:
+            if self.in_flight >= self.max_concurrency:
+                if self.waiting >= self.max_queue:
+                    self._reject("queue_full")
+
+                self.waiting += 1
+                self._update_gauges()
+                try:
+                    acquired = self._condition.wait_for(lambda: self.in_flight < self.max_concurrency,
+                                                        timeout=self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not acquired:
+                    self._update_gauges()
+                    self._reject("timeout")
+
+            self.in_flight += 1
+            self._update_gauges()
+        AI_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    def release(self):
+        """Give back an AI call slot taken with acquire."""
+        with self._condition:
+            self.in_flight -= 1
+            self._update_gauges()
+            self._condition.notify()
+
+    def _reject(self, reason: str):
+        """Counts and raises a rejection (lock must be held)."""
+        AI_REJECTED.labels(reason=reason).inc()
+        logger.warning(f"Shedding AI request ({reason}): {self.in_flight} running, {self.waiting} waiting")
+        raise BulkheadFullError(reason)
+
+    def _update_gauges(self):
+        """Publishes the current occupancy (lock must be held)."""
+        AI_IN_FLIGHT.set(self.in_flight)
+        AI_QUEUE_DEPTH.set(self.waiting)
+        AI_SATURATION.set((self.in_flight + self.waiting) / self.max_concurrency)
@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterator
+
+import orjson
+from prometheus_client import Counter, Gauge
+
+from ai.ai_cache_backend import AICacheBackend
+from ai.base_ai import AIModel
+from config.constants import Constants
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 3600.0
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Each worker process has its own cache; with several workers, /metrics adds them up
+AI_CACHE_HITS = Counter("chat_ai_cache_hits", "Prompts answered from the AI response cache, by cache (local or shared)",
+                        ["source"])
+AI_CACHE_MISSES = Counter("chat_ai_cache_misses", "Prompts looked up in the AI response cache and sent to the model")
+AI_CACHE_ENTRIES = Gauge("chat_ai_cache_entries", "Responses held in the local AI response cache",
+                         multiprocess_mode="livesum")
+AI_CACHE_BYTES = Gauge("chat_ai_cache_bytes", "Size of the responses held in the local AI response cache",
+                       multiprocess_mode="livesum")
+
+
+def normalize_prompt(user_message: str) -> str:
+    """Normalizes a prompt so that trivially different spellings of the same message share a cache entry.
+
+    Args:
+        user_message: The message from the user
+
+    Returns:
+        The prompt with Unicode compatibility forms folded, case folded and whitespace collapsed
+    """
+    normalized = unicodedata.normalize("NFKC", user_message).casefold()
+    return WHITESPACE_PATTERN.sub(" ", normalized).strip()
+
+
+def prompt_key(user_message: str, context: list[dict] | None = None) -> str:
+    """Returns the cache key of a prompt.
+
+    Args:
+        user_message: The message from the user
+        context: The earlier messages of the conversation sent with it, matched exactly
+
+    Returns:
+        The hex SHA-256 digest of the context and the normalized prompt
+    """
+    turns = [[message[Constants.ROLE_FIELD], message[Constants.CONTENT_FIELD]] for message in context or ()]
+    return hashlib.sha256(orjson.dumps([turns, normalize_prompt(user_message)])).hexdigest()
+
+
+class CachedAI(AIModel):
+    """AIModel decorator that answers repeated prompts from a cache.
+
+    Prompts are matched exactly after normalization, together with the conversation context sent with them, so a
+    response is only reused for the same message following the same conversation. The local cache is an LRU bounded
+    both by number of entries and by the encoded size of the responses, and every entry expires ttl seconds after it
+    was stored. An optional shared backend is consulted on local misses, so that replicas reuse each other's
+    responses. Error responses of the wrapped model are never cached.
+    """
+
+    def __init__(self, ai: AIModel, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL_SECONDS, backend: AICacheBackend | None = None):
+        """Initializes an empty AI response cache
+
+        Args:
+            ai: The AI model to cache
+            max_entries: The maximum number of cached responses
+            max_bytes: The maximum total size in bytes of the cached responses
+            ttl: The number of seconds a response stays cached
+            backend: The shared cache consulted on local misses
+        """
+        self.ai = ai
+        self.uses_context = ai.uses_context
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (response, size in bytes, expiry on the monotonic clock), least recently used first
+        self._entries: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None, bypass_cache: bool = False) -> str:
+        """
+        Get AI response for user message, from the cache if it has been answered before.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, part of the cache key
+            bypass_cache: Whether to skip the lookup (the fresh response still replaces the cached one)
+
+        Returns:
+            The AI response message
+        """
+        key = prompt_key(user_message, context)
+        if not bypass_cache:
+            response = self._lookup(key)
+            if response is not None:
+                return response
+
+        response = self.ai.get_ai_response(user_message, context)
+        self._store(key, response)
+        return response
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None,
+                           bypass_cache: bool = False) -> Iterator[str]:
+        """
+        Stream AI response for user message. A cached response is returned as a single chunk.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, part of the cache key
+            bypass_cache: Whether to skip the lookup (the fresh response still replaces the cached one)
+
+        Returns:
+            The chunks of the AI response message
+        """
+        key = prompt_key(user_message, context)
+        if not bypass_cache:
+            response = self._lookup(key)
+            if response is not None:
+                yield response
+                return
+
+        chunks = []
+        for chunk in self.ai.stream_ai_response(user_message, context):
+            chunks.append(chunk)
+            yield chunk
+        # Only a completely consumed stream is cached (a failed one raises AIStreamError before getting here)
+        self._store(key, ''.join(chunks))
+
+    def cache_stats(self) -> dict:
+        """Reports the cache counters.
+
+        Returns:
+            The hits (local and shared), misses, hit rate, evictions, and current entries and bytes
+        """
+        with self._lock:
+            total = self.hits + self.backend_hits + self.misses
+            return {
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.backend_hits) / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def clear(self):
+        """Drop every locally cached response."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._publish_size()
+
+    def _lookup(self, key: str) -> str | None:
+        """Returns the live cached response for a key, from the local cache or else the shared backend."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, _, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    AI_CACHE_HITS.labels("local").inc()
+                    return response
+                self._remove(key)
+
+        response = self.backend.get(key) if self.backend is not None else None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                AI_CACHE_MISSES.inc()
+                return None
+            self.backend_hits += 1
+            AI_CACHE_HITS.labels("shared").inc()
+            self._insert(key, response)
+        return response
+
+    def _store(self, key: str, response: str):
+        """Caches a fresh response locally and in the shared backend."""
+        if response == self.ai.error_response:
+            return
+        with self._lock:
+            self._insert(key, response)
+        if self.backend is not None:
+            self.backend.set(key, response, self.ttl)
+
+    def _insert(self, key: str, response: str):
+        """Inserts a local entry and evicts least recently used entries until the bounds hold (lock must be held)."""
+        size = len(key) + len(response.encode())
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (response, size, time.monotonic() + self.ttl)
+        self._size += size
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._publish_size()
+
+    def _remove(self, key: str):
+        """Removes a local entry (lock must be held)."""
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+        self._publish_size()
+
+    def _publish_size(self):
+        """Reports the number and size of the local entries on /metrics (lock must be held)."""
+        AI_CACHE_ENTRIES.set(len(self._entries))
+        AI_CACHE_BYTES.set(self._size)
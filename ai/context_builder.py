@@ -0,0 +1,160 @@
+import html
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable
+
+from config.constants import Constants
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID
+from utils.message_utils import history_position, utc_timestamp
+
+DEFAULT_MAX_TOKENS = 2000
+DEFAULT_MAX_CONVERSATIONS = 1000
+# Tokens the chat completion format adds to every message (role and delimiters)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Average characters per token of English text for OpenAI's tokenizers
+CHARS_PER_TOKEN = 4
+AI_USER = "AI"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens in a text without a tokenizer.
+
+    Args:
+        text: The text
+
+    Returns:
+        The text's length in characters divided by CHARS_PER_TOKEN, rounded up
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class _Window:
+    """The newest messages of a conversation that fit in the token budget, with their token counts"""
+
+    def __init__(self):
+        # (chat completion message, tokens), oldest first
+        self.entries: deque[tuple[dict, int]] = deque()
+        self.tokens = 0
+        # Where the next read of the conversation starts (see history_position)
+        self.position: tuple[datetime, int] | None = None
+        self.lock = threading.Lock()
+
+
+class ContextBuilder:
+    """Assembles the earlier turns of a conversation into the context sent to the AI model, within a token budget.
+
+    Each conversation has a rolling window of its newest messages, kept in an LRU of max_conversations windows. A build
+    only reads the messages stored since the previous one (and the last one it read), from any process, counts their
+    tokens once and appends them to the window, evicting the oldest messages beyond max_tokens; a build therefore costs
+    one indexed read of a few new messages rather than reading and tokenizing the whole history.
+    """
+
+    def __init__(self, db: BaseDb, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 max_conversations: int = DEFAULT_MAX_CONVERSATIONS,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        """Initializes a context builder with no windows
+
+        Args:
+            db: The message store
+            max_tokens: The token budget of the context and the new user message together
+            max_conversations: The number of most recently used conversations whose windows are kept
+            count_tokens: Counts the tokens of a text
+        """
+        self.db = db
+        self.max_tokens = max_tokens
+        self.max_conversations = max_conversations
+        self.count_tokens = count_tokens
+        self._windows: OrderedDict[str, _Window] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, user_message: str, conversation_id: str = DEFAULT_CONVERSATION_ID) -> list[dict]:
+        """Builds the context of a new user message.
+
+        Args:
+            user_message: The new message from the user, which is not part of the context
+            conversation_id: The conversation the message belongs to
+
+        Returns:
+            The newest earlier messages of the conversation as chat completion messages, oldest first, whose tokens
+            and those of the user message fit in max_tokens
+        """
+        budget = self.max_tokens - self.message_tokens(user_message)
+        window = self._window(conversation_id)
+        with window.lock:
+            self._refresh(window, conversation_id)
+            if window.tokens <= budget:
+                return [message for message, _ in window.entries]
+            context = []
+            for message, tokens in reversed(window.entries):
+                if tokens > budget:
+                    break
+                budget -= tokens
+                context.append(message)
+        context.reverse()
+        return context
+
+    def message_tokens(self, text: str) -> int:
+        """Counts the tokens of a message in the chat completion payload.
+
+        Args:
+            text: The message text
+
+        Returns:
+            The tokens of the text and the message overhead
+        """
+        return self.count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def clear(self):
+        """Drops every window, so that conversations are read again from the store."""
+        with self._lock:
+            self._windows.clear()
+
+    def _window(self, conversation_id: str) -> _Window:
+        """Returns the window of a conversation, creating an empty one (and evicting the least recently used window)
+        if there is none."""
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is None:
+                window = self._windows[conversation_id] = _Window()
+                if len(self._windows) > self.max_conversations:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(conversation_id)
+            return window
+
+    def _refresh(self, window: _Window, conversation_id: str):
+        """Appends the messages stored since the window was last read and evicts the oldest beyond the budget.
+
+        The read starts with the messages the window ends with, so that a conversation cleared (or trimmed past the
+        window) since the last read is noticed by their absence; the window is then rebuilt from the store.
+        """
+        messages = self._read_since(window, conversation_id)
+        if messages is None:
+            window.entries.clear()
+            window.tokens = 0
+            window.position = None
+            messages = self.db.retrieve_messages(conversation_id=conversation_id)
+        for stored in messages:
+            # Messages are stored HTML-escaped (see utils.sanitize_utils), the model is sent the text itself
+            text = html.unescape(stored[Constants.MESSAGE_FIELD])
+            role = "assistant" if stored[Constants.USER_FIELD] == AI_USER else "user"
+            tokens = self.message_tokens(text)
+            window.entries.append(({Constants.ROLE_FIELD: role, Constants.CONTENT_FIELD: text}, tokens))
+            window.tokens += tokens
+        while window.tokens > self.max_tokens:
+            _, tokens = window.entries.popleft()
+            window.tokens -= tokens
+        window.position = history_position(messages, window.position)
+
+    def _read_since(self, window: _Window, conversation_id: str) -> list[dict] | None:
+        """Returns the messages of a conversation stored after the window's position, or None if the messages at its
+        position are gone."""
+        if window.position is None:
+            return self.db.retrieve_messages(conversation_id=conversation_id)
+        timestamp, seen = window.position
+        messages = self.db.retrieve_messages(after=(timestamp, 0), conversation_id=conversation_id)
+        if sum(utc_timestamp(stored[Constants.TIMESTAMP_FIELD]) == timestamp for stored in messages[:seen]) < seen:
+            return None
+        return messages[seen:]
@@ -1,5 +1,8 @@
 import logging
 import random
+import re
+import time
+from typing import Iterator
 
 from ai.base_ai import AIModel
 
@@ -13,11 +16,41 @@ DUMMY_RESPONSES = [
     "I understand what you're saying. Please tell me more!"
 ]
 
+# Splits a response into word-sized chunks, keeping the whitespace that follows each word
+CHUNK_PATTERN = re.compile(r"\S+\s*")
+
+
+def response_delay(latency: float, jitter: float) -> float:
+    """Draws the simulated latency of one response.
+
+    Args:
+        latency: The mean latency in seconds
+        jitter: The maximum deviation in seconds from the mean, drawn uniformly
+
+    Returns:
+        The latency in seconds (never negative)
+    """
+    if not jitter:
+        return latency
+    return max(0.0, latency + random.uniform(-jitter, jitter))
+
 
 class DummyAI(AIModel):
     """Wrapper class that implements a dummy AI model"""
 
-    def get_ai_response(self, user_message: str) -> str:
+    def __init__(self, latency: float = 0.0, chunk_latency: float = 0.0, jitter: float = 0.0):
+        """Initializes a dummy AI model
+
+        Args:
+            latency: Seconds to wait before the response (or its first chunk) is returned, simulating LLM latency
+            chunk_latency: Seconds to wait between streamed chunks, simulating token generation
+            jitter: Maximum number of seconds the latency of each response randomly deviates by
+        """
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.jitter = jitter
+
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None) -> str:
         """
         Get AI response for user message.
 
@@ -25,18 +58,32 @@ class DummyAI(AIModel):
 
         Args:
             user_message: The message from the user
+            context: The earlier messages of the conversation (ignored by the dummy model)
 
         Returns:
             The AI response message
         """
         # See ai/gpt_40_mini.py for an example of how to implement an AI response with a real LLM
 
-        # Splunk logging:
-        # logger.info('AI request', extra={
-        #     'event_type': 'ai_call',
-        #     'component': 'ai',
-        #     'ai_model': 'dummy',
-        #     'user_message': user_message
-        # })
-        logger.info(f"Generating AI response for message: {user_message}")
+        logger.info('Generating AI response', extra={'event_type': 'ai_call', 'body': user_message})
+        delay = response_delay(self.latency, self.jitter)
+        if delay:
+            time.sleep(delay)
         return random.choice(DUMMY_RESPONSES)
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None) -> Iterator[str]:
+        """
+        Stream AI response for user message one word at a time.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
+
+        Returns:
+            The chunks of the AI response message
+        """
+        response = self.get_ai_response(user_message, context)
+        for index, chunk in enumerate(CHUNK_PATTERN.findall(response)):
+            if index and self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield chunk
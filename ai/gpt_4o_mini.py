@@ -1,9 +1,9 @@
 import logging
 import os
+from typing import Iterator
 
-from openai import OpenAI
-
-from ai.base_ai import AIModel
+from ai.base_ai import AIModel, AIStreamError
+from ai.openai_client import get_openai_client
 from config.constants import EnvironmentVariables, Constants
 
 # For splunk logging:
@@ -11,42 +11,47 @@ from config.constants import EnvironmentVariables, Constants
 
 OPENAI_API_KEY = os.environ.get(EnvironmentVariables.OPENAI_API_KEY_VARIABLE)
 
+ERROR_RESPONSE = "I apologize, but I'm having trouble processing your request."
+MODEL_NAME = "gpt-4o-mini"
+
 logger = logging.getLogger(__name__)
 
 
 class GPT4oMini(AIModel):
     """Wrapper class that implements support for the GPT-4o Mini model"""
 
-    def get_ai_response(self, user_message: str) -> str:
+    error_response = ERROR_RESPONSE
+    uses_context = True
+
+    def warm_up(self):
+        """
+        Create the process's OpenAI client ahead of the first request (loading the TLS certificates alone takes about
+        200ms).
+        """
+        try:
+            get_openai_client(OPENAI_API_KEY)
+        except Exception as e:
+            logger.warning(f"Could not create the OpenAI client: {str(e)}")
+
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None) -> str:
         """
         Get AI response for user message.
 
         Args:
             user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
 
         Returns:
             The AI response message
         """
         try:
 
-            client = OpenAI(api_key=OPENAI_API_KEY)
+            client = get_openai_client(OPENAI_API_KEY)
 
-            # Splunk logging:
-            # logger.info('AI call', extra={
-            #     'event_type': 'ai_call',
-            #     'component': 'ai',
-            #     'error_message': str(e),
-            #     'user_message': user_message
-            # })
-            logger.info(f"Generating AI response for message: {user_message}")
+            logger.info('Generating AI response', extra={'event_type': 'ai_call', 'body': user_message})
             response = client.chat.completions.create(
-                messages=[
-                    {
-                        Constants.ROLE_FIELD: "user",
-                        Constants.CONTENT_FIELD: user_message
-                    }
-                ],
-                model="gpt-4o-mini",
+                messages=self._build_messages(user_message, context),
+                model=MODEL_NAME,
             )
 
             return response.choices[0].message.content
@@ -61,4 +66,57 @@ class GPT4oMini(AIModel):
             #     'stack_trace': traceback.format_exc()
             # })
             logger.error(f"Error calling LLM API: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request."
+            return ERROR_RESPONSE
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None) -> Iterator[str]:
+        """
+        Stream AI response for user message as the model generates it.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
+
+        Returns:
+            The chunks of the AI response message
+
+        Raises:
+            AIStreamError: If the API call fails, before or after some chunks were yielded
+        """
+        try:
+            client = get_openai_client(OPENAI_API_KEY)
+
+            logger.info('Streaming AI response', extra={'event_type': 'ai_call', 'body': user_message})
+            stream = client.chat.completions.create(
+                messages=self._build_messages(user_message, context),
+                model=MODEL_NAME,
+                stream=True,
+            )
+
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {str(e)}")
+            raise AIStreamError(ERROR_RESPONSE) from e
+
+    @staticmethod
+    def _build_messages(user_message: str, context: list[dict] | None = None) -> list[dict]:
+        """
+        Build the chat completion messages payload for a user message: the conversation context followed by the
+        message.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, oldest first (see ai/context_builder.py)
+
+        Returns:
+            The messages payload
+        """
+        return [
+            *(context or ()),
+            {
+                Constants.ROLE_FIELD: "user",
+                Constants.CONTENT_FIELD: user_message
+            }
+        ]
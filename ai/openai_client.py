@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+
+import httpx
+from openai import OpenAI
+
+from config.constants import AppConfig, EnvironmentVariables
+
+logger = logging.getLogger(__name__)
+
+_client: OpenAI | None = None
+_client_pid: int | None = None
+_client_lock = threading.Lock()
+
+
+def _env_float(variable: EnvironmentVariables, default: AppConfig) -> float:
+    """Reads a numeric setting from the environment, falling back to the app config default."""
+    return float(os.environ.get(variable, default.value))
+
+
+def _limits() -> httpx.Limits:
+    """Builds the connection pool limits from the OPENAI_* environment variables."""
+    return httpx.Limits(
+        max_connections=int(_env_float(EnvironmentVariables.OPENAI_MAX_CONNECTIONS_VARIABLE,
+                                       AppConfig.OPENAI_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(_env_float(EnvironmentVariables.OPENAI_MAX_KEEPALIVE_CONNECTIONS_VARIABLE,
+                                                 AppConfig.OPENAI_MAX_KEEPALIVE_CONNECTIONS)),
+        keepalive_expiry=_env_float(EnvironmentVariables.OPENAI_KEEPALIVE_EXPIRY_VARIABLE,
+                                    AppConfig.OPENAI_KEEPALIVE_EXPIRY),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    """Builds the request timeouts from the OPENAI_* environment variables."""
+    return httpx.Timeout(
+        _env_float(EnvironmentVariables.OPENAI_TIMEOUT_VARIABLE, AppConfig.OPENAI_TIMEOUT),
+        connect=_env_float(EnvironmentVariables.OPENAI_CONNECT_TIMEOUT_VARIABLE, AppConfig.OPENAI_CONNECT_TIMEOUT),
+    )
+
+
+def create_http_client() -> httpx.Client:
+    """Creates the pooled HTTP client used for OpenAI requests.
+
+    Pool size, keep-alive and timeouts are read from the OPENAI_* environment variables.
+
+    Returns:
+        The HTTP client
+    """
+    return httpx.Client(limits=_limits(), timeout=_timeout())
+
+
+def get_openai_client(api_key: str | None) -> OpenAI:
+    """Returns the process-wide OpenAI client, creating it on first use.
+
+    The client (and its connection pool) is shared by all threads. A forked child process never reuses its parent's
+    client, since the inherited sockets belong to the parent.
+
+    Args:
+        api_key: The OpenAI API key
+
+    Returns:
+        The shared OpenAI client
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = OpenAI(api_key=api_key, http_client=create_http_client())
+            _client_pid = pid
+            logger.info(f"Created OpenAI client for process {pid}")
+        return _client
+
+
+def reset_openai_client():
+    """Discards the shared OpenAI client so that the next call creates a new one."""
+    global _client, _client_pid
+
+    with _client_lock:
+        _client = None
+        _client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    # The child inherits the parent's lock and client; start it with fresh ones
+    def _reset_after_fork():
+        global _client, _client_pid, _client_lock
+        _client_lock = threading.Lock()
+        _client = None
+        _client_pid = None
+
+    os.register_at_fork(after_in_child=_reset_after_fork)
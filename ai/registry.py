@@ -0,0 +1,56 @@
+import importlib
+import logging
+import time
+from typing import NamedTuple
+
+from ai.base_ai import AIModel
+from config.constants import AIBackends
+
+logger = logging.getLogger(__name__)
+
+
+class AIBackend(NamedTuple):
+    """Where the class of an AI backend lives; the module is only imported when the backend is selected"""
+    module: str
+    model: str
+
+
+# Backends by AI_BACKEND name. Modules are named rather than imported, so that e.g. the OpenAI SDK (about a second of
+# import time) is not loaded by processes that serve the dummy model.
+AI_BACKENDS: dict[str, AIBackend] = {
+    AIBackends.DUMMY: AIBackend("ai.dummy_ai", "DummyAI"),
+    AIBackends.GPT_4O_MINI: AIBackend("ai.gpt_4o_mini", "GPT4oMini"),
+}
+
+
+def register_ai_backend(name: str, module: str, model: str):
+    """Makes an AI backend selectable by name.
+
+    Args:
+        name: The AI_BACKEND value that selects the backend
+        module: The module defining the backend's class
+        model: The name of its AIModel class
+    """
+    AI_BACKENDS[name] = AIBackend(module, model)
+
+
+def create_ai(name: str) -> AIModel:
+    """Imports the module of the named backend and creates its model.
+
+    Args:
+        name: The backend's name (see AIBackends)
+
+    Returns:
+        The AI model
+
+    Raises:
+        ValueError: If no backend is registered under the name
+    """
+    backend = AI_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown AI backend {name!r}, expected one of: {', '.join(AI_BACKENDS)}")
+
+    start = time.perf_counter()
+    module = importlib.import_module(backend.module)
+    logger.info(f"Loaded AI backend {name} in {(time.perf_counter() - start) * 1000:.0f}ms")
+    return getattr(module, backend.model)()
@@ -0,0 +1,100 @@
+import logging
+import threading
+from typing import Callable, Iterator
+
+from prometheus_client import Counter
+
+from ai.base_ai import AIModel
+from ai.cached_ai import prompt_key
+
+logger = logging.getLogger(__name__)
+
+AI_COALESCED = Counter("chat_ai_coalesced", "AI requests answered by an identical request already in flight")
+
+
+class _Call:
+    """An upstream AI call that concurrent identical requests wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: str | None = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlightAI(AIModel):
+    """AIModel decorator that merges identical concurrent requests into one upstream call.
+
+    The first request for a key calls the wrapped model; requests for the same key that arrive while it is running
+    wait for it and receive the same response, or the same exception. Nothing is kept once the call completes, so
+    later requests make a new call (see CachedAI for reuse over time). Requests are identical when their normalized
+    prompts and their conversation contexts are. Streams are not coalesced.
+    """
+
+    def __init__(self, ai: AIModel, key: Callable[[str, list[dict] | None], str] = prompt_key):
+        """Initializes the single-flight layer
+
+        Args:
+            ai: The AI model to call
+            key: Maps a user message and its context to the key that identical requests share
+        """
+        self.ai = ai
+        self.key = key
+        self.error_response = ai.error_response
+        self.uses_context = ai.uses_context
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None) -> str:
+        """
+        Get AI response for user message, sharing the call of an identical request already in flight.
+
+        Args:
+            user_message: The message from the user
+            context: The earlier messages of the conversation, part of the key
+
+        Returns:
+            The AI response message
+
+        Raises:
+            Exception: Whatever the wrapped model raised for the shared call
+        """
+        key = self.key(user_message, context)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.response = self.ai.get_ai_response(user_message, context)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            if call.waiters:
+                logger.info(f"Shared one AI response with {call.waiters} identical requests")
+        else:
+            AI_COALESCED.inc()
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.response
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None) -> Iterator[str]:
+        return self.ai.stream_ai_response(user_message, context)
+
+    def in_flight(self) -> int:
+        """Counts the distinct upstream calls currently running.
+
+        Returns:
+            The number of in-flight keys
+        """
+        with self._lock:
+            return len(self._calls)
@@ -1,46 +1,371 @@
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, Response
+from flask import Blueprint, Config, Flask, current_app, request, jsonify, render_template, Response
 from datetime import datetime, timezone
+from typing import Callable, Iterator
 
-import bleach
+import logging
 import os
+import queue
+import threading
 
-from ai.dummy_ai import DummyAI
-# from ai.gpt_4o_mini import GPT4oMini
-from config.constants import AppConfig, Constants, EnvironmentVariables, StatusCodes
+from ai.ai_cache_backend import MongoAICacheBackend
+from ai.base_ai import AIStreamError
+from ai.bulkhead import Bulkhead, BulkheadFullError
+from ai.cached_ai import CachedAI
+from ai.context_builder import ContextBuilder
+from ai.registry import create_ai
+from ai.single_flight_ai import SingleFlightAI
+from broadcast.base_broadcaster import CLOSED
+from broadcast.in_process_broadcaster import InProcessBroadcaster
+from broadcast.mongo_change_stream_broadcaster import MongoChangeStreamBroadcaster
+from config.constants import AppConfig, BroadcasterTypes, Constants, DbBackends, EnvironmentVariables, MetricStages, \
+    RetentionSchedules, StatusCodes
+from db.cached_db import CachedDb
+from db.in_memory_db import InMemoryDb
+from db.instrumented_db import InstrumentedDb
+from db.leader_lock import MongoLeaderLock
 from db.mongo_db import MongoDb
-from models.message import Message
-from utils.log_utils import configure_logger
-from utils.message_utils import remove_mongo_id
+from db.retention_scheduler import RetentionScheduler
+from db.sqlite_db import SqliteDb
+from db.write_behind_db import WriteBehindDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+from utils.compression_utils import ENCODINGS, compress, negotiate_encoding, precompress
+from utils.json_utils import EncodedHistory, OrjsonProvider, encode_history
+from utils.log_utils import configure_logger, stop_logging
+from utils.message_utils import MessageClock, decode_cursor, parse_conversation_id
+from utils.metrics_utils import render_metrics, stage
+from utils.sanitize_utils import sanitize
+
+# Name of the leader lock held by the replica that is trimming (see RetentionScheduler)
+RETENTION_LOCK_NAME = "retention"
 
 load_dotenv()
 MONGO_URI = os.environ.get(EnvironmentVariables.MONGO_URI_VARIABLE)
 OPENAI_API_KEY = os.environ.get(EnvironmentVariables.OPENAI_API_KEY_VARIABLE)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config[Constants.MONGO_URI_FIELD] = MONGO_URI
+# Routes are registered on this blueprint and the app is built by create_app()
+chat = Blueprint('chat', __name__)
+# Key of the app's ChatServices in app.extensions
+EXTENSION_NAME = 'chat'
+
+logger = logging.getLogger(__name__)
+
+
+class ChatServices:
+    """ The services built by create_app for one app (AI model, message store, caches, broadcaster, ...), kept in
+    app.extensions where the routes look them up (see services())
+    """
+
+    def __init__(self):
+        self.ai = None
+        self.mongo_db: MongoDb | None = None
+        self.db = None
+        self.history_cache: CachedDb | None = None
+        self.context_builder: ContextBuilder | None = None
+        self.bulkhead: Bulkhead | None = None
+        self.stream_slots: threading.BoundedSemaphore | None = None
+        self.ai_cache: CachedAI | None = None
+        self.broadcaster = None
+        self.retention_scheduler: RetentionScheduler | None = None
+        self.home_page = None
+        self.clock = MessageClock()
+        # Callbacks run by drain() once the server is asked to stop
+        self.drainers: list[Callable[[], None]] = []
+        # Cleanup callbacks, run newest first by close()
+        self.closers: list[Callable[[], None]] = []
+
+    def drain(self):
+        """ Prepare the services for shutdown while requests are still completing """
+        for drainer in self.drainers:
+            drainer()
+
+    def close(self):
+        """ Release the services, newest first """
+        while self.closers:
+            self.closers.pop()()
+
+
+def services() -> ChatServices:
+    """ Get the services of the app handling the current request
+
+    :return:
+        The app's services
+    """
+    return current_app.extensions[EXTENSION_NAME]
+
+
+def load_config(config: Config):
+    """ Fill the app config from: (1) environment variables; (2) the defaults in constants.py
+
+    :param config: The Flask config to fill
+    """
+    config[Constants.MONGO_URI_FIELD] = MONGO_URI
+
+    # The AI model (see ai/registry.py); only the selected backend's module is imported
+    config[Constants.AI_BACKEND_FIELD] = os.getenv(
+        EnvironmentVariables.AI_BACKEND_VARIABLE, AppConfig.AI_BACKEND.value).lower()
+
+    # In production, these would be environment variables
+    config[Constants.MAX_MESSAGES_FIELD] = int(
+        os.getenv(EnvironmentVariables.MAX_MESSAGES_VARIABLE, AppConfig.MAX_MESSAGES.value))
+
+    config[Constants.DB_BACKEND_FIELD] = os.getenv(
+        EnvironmentVariables.DB_BACKEND_VARIABLE, AppConfig.DB_BACKEND.value).lower()
+    config[Constants.SQLITE_PATH_FIELD] = os.getenv(
+        EnvironmentVariables.SQLITE_PATH_VARIABLE, AppConfig.SQLITE_PATH.value)
+
+    # Trimming runs off the request path by default, overshooting MAX_MESSAGES by at most RETENTION_MAX_OVERSHOOT
+    config[Constants.RETENTION_SCHEDULE_FIELD] = os.getenv(
+        EnvironmentVariables.RETENTION_SCHEDULE_VARIABLE, AppConfig.RETENTION_SCHEDULE.value).lower()
+    config[Constants.RETENTION_INTERVAL_FIELD] = float(
+        os.getenv(EnvironmentVariables.RETENTION_INTERVAL_VARIABLE, AppConfig.RETENTION_INTERVAL.value))
+    config[Constants.RETENTION_MAX_OVERSHOOT_FIELD] = int(
+        os.getenv(EnvironmentVariables.RETENTION_MAX_OVERSHOOT_VARIABLE, AppConfig.RETENTION_MAX_OVERSHOOT.value))
+
+    config[Constants.BROADCASTER_FIELD] = os.getenv(
+        EnvironmentVariables.BROADCASTER_VARIABLE, AppConfig.BROADCASTER.value).lower()
+
+    config[Constants.DEBUG_FIELD] = os.getenv(EnvironmentVariables.DEBUG_VARIABLE, 'False').lower() == 'true'
+
+    # Optionally serve the history from an in-process cache
+    config[Constants.HISTORY_CACHE_FIELD] = os.getenv(
+        EnvironmentVariables.HISTORY_CACHE_VARIABLE, 'False').lower() == 'true'
+    config[Constants.HISTORY_CACHE_TTL_FIELD] = float(
+        os.getenv(EnvironmentVariables.HISTORY_CACHE_TTL_VARIABLE, AppConfig.HISTORY_CACHE_TTL.value))
+    config[Constants.HISTORY_CACHE_MAX_CONVERSATIONS_FIELD] = int(
+        os.getenv(EnvironmentVariables.HISTORY_CACHE_MAX_CONVERSATIONS_VARIABLE,
+                  AppConfig.HISTORY_CACHE_MAX_CONVERSATIONS.value))
+
+    # JSON bodies from this size on are sent brotli or gzip encoded; the chat page may be cached by browsers this long
+    config[Constants.COMPRESS_MIN_SIZE_FIELD] = int(
+        os.getenv(EnvironmentVariables.COMPRESS_MIN_SIZE_VARIABLE, AppConfig.COMPRESS_MIN_SIZE.value))
+    config[Constants.PAGE_MAX_AGE_FIELD] = int(
+        os.getenv(EnvironmentVariables.PAGE_MAX_AGE_VARIABLE, AppConfig.PAGE_MAX_AGE.value))
+
+    # Token budget of the conversation history sent with each prompt (0 sends the prompt alone)
+    config[Constants.AI_CONTEXT_TOKENS_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_CONTEXT_TOKENS_VARIABLE, AppConfig.AI_CONTEXT_TOKENS.value))
+
+    # Optionally merge identical concurrent prompts into one AI call
+    config[Constants.AI_SINGLE_FLIGHT_FIELD] = os.getenv(
+        EnvironmentVariables.AI_SINGLE_FLIGHT_VARIABLE, 'False').lower() == 'true'
+
+    # Optionally answer repeated prompts from a cache (shared between replicas through MongoDB if AI_CACHE_SHARED is
+    # set)
+    config[Constants.AI_CACHE_FIELD] = os.getenv(EnvironmentVariables.AI_CACHE_VARIABLE, 'False').lower() == 'true'
+    config[Constants.AI_CACHE_SHARED_FIELD] = os.getenv(
+        EnvironmentVariables.AI_CACHE_SHARED_VARIABLE, 'False').lower() == 'true'
+    config[Constants.AI_CACHE_MAX_ENTRIES_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_CACHE_MAX_ENTRIES_VARIABLE, AppConfig.AI_CACHE_MAX_ENTRIES.value))
+    config[Constants.AI_CACHE_MAX_BYTES_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_CACHE_MAX_BYTES_VARIABLE, AppConfig.AI_CACHE_MAX_BYTES.value))
+    config[Constants.AI_CACHE_TTL_FIELD] = float(
+        os.getenv(EnvironmentVariables.AI_CACHE_TTL_VARIABLE, AppConfig.AI_CACHE_TTL.value))
+
+    # Bound the number of concurrent AI calls; requests that cannot get a slot are shed with 503
+    config[Constants.AI_MAX_CONCURRENCY_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_MAX_CONCURRENCY_VARIABLE, AppConfig.AI_MAX_CONCURRENCY.value))
+    config[Constants.AI_MAX_QUEUE_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_MAX_QUEUE_VARIABLE, AppConfig.AI_MAX_QUEUE.value))
+    config[Constants.AI_QUEUE_TIMEOUT_FIELD] = float(
+        os.getenv(EnvironmentVariables.AI_QUEUE_TIMEOUT_VARIABLE, AppConfig.AI_QUEUE_TIMEOUT.value))
+    config[Constants.AI_RETRY_AFTER_FIELD] = int(
+        os.getenv(EnvironmentVariables.AI_RETRY_AFTER_VARIABLE, AppConfig.AI_RETRY_AFTER.value))
+
+    # Each /chat/stream client holds a request thread for as long as it is connected; further clients get 503
+    config[Constants.STREAM_MAX_SUBSCRIBERS_FIELD] = int(
+        os.getenv(EnvironmentVariables.STREAM_MAX_SUBSCRIBERS_VARIABLE, AppConfig.STREAM_MAX_SUBSCRIBERS.value))
+
+    # Optionally queue writes and flush them to the database in batches
+    config[Constants.WRITE_BEHIND_FIELD] = os.getenv(
+        EnvironmentVariables.WRITE_BEHIND_VARIABLE, 'False').lower() == 'true'
+    config[Constants.WRITE_BEHIND_BATCH_SIZE_FIELD] = int(
+        os.getenv(EnvironmentVariables.WRITE_BEHIND_BATCH_SIZE_VARIABLE, AppConfig.WRITE_BEHIND_BATCH_SIZE.value))
+    config[Constants.WRITE_BEHIND_FLUSH_INTERVAL_FIELD] = float(
+        os.getenv(EnvironmentVariables.WRITE_BEHIND_FLUSH_INTERVAL_VARIABLE,
+                  AppConfig.WRITE_BEHIND_FLUSH_INTERVAL.value))
+
+    # Logging runs on a background thread; hot path events can be sampled and their message text truncated
+    config[Constants.LOG_FILE_FIELD] = os.getenv(EnvironmentVariables.LOG_FILE_VARIABLE, AppConfig.LOG_FILE.value)
+    config[Constants.LOG_MAX_BYTES_FIELD] = int(
+        os.getenv(EnvironmentVariables.LOG_MAX_BYTES_VARIABLE, AppConfig.LOG_MAX_BYTES.value))
+    config[Constants.LOG_BACKUP_COUNT_FIELD] = int(
+        os.getenv(EnvironmentVariables.LOG_BACKUP_COUNT_VARIABLE, AppConfig.LOG_BACKUP_COUNT.value))
+    config[Constants.LOG_QUEUE_SIZE_FIELD] = int(
+        os.getenv(EnvironmentVariables.LOG_QUEUE_SIZE_VARIABLE, AppConfig.LOG_QUEUE_SIZE.value))
+    config[Constants.LOG_SAMPLE_RATE_FIELD] = float(
+        os.getenv(EnvironmentVariables.LOG_SAMPLE_RATE_VARIABLE, AppConfig.LOG_SAMPLE_RATE.value))
+    config[Constants.LOG_MAX_BODY_CHARS_FIELD] = int(
+        os.getenv(EnvironmentVariables.LOG_MAX_BODY_CHARS_VARIABLE, AppConfig.LOG_MAX_BODY_CHARS.value))
+    config[Constants.LOG_REMOTE_URL_FIELD] = os.getenv(EnvironmentVariables.LOG_REMOTE_URL_VARIABLE)
+    config[Constants.LOG_REMOTE_AUTHORIZATION_FIELD] = os.getenv(
+        EnvironmentVariables.LOG_REMOTE_AUTHORIZATION_VARIABLE)
+
+
+def create_app() -> Flask:
+    """ Build the Flask app and the services its routes use (AI model, message store, caches, broadcaster, ...)
+
+    Everything is created in the calling process, so a server that calls this in each worker after forking (see
+    gunicorn.conf.py) gives every worker its own MongoDB connection pool, AI client and background threads. Nothing
+    connects to MongoDB until a request needs it. The services are kept in app.extensions (see services()).
+
+    :return:
+        The Flask app
+    """
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    load_config(app.config)
+    chat_services = app.extensions[EXTENSION_NAME] = ChatServices()
+
+    # The chat page has no per-request content, so it is rendered and compressed once
+    with app.app_context():
+        chat_services.home_page = precompress(render_template('index.html').encode())
+
+    configure_logger(log_file=app.config[Constants.LOG_FILE_FIELD],
+                     max_bytes=app.config[Constants.LOG_MAX_BYTES_FIELD],
+                     backup_count=app.config[Constants.LOG_BACKUP_COUNT_FIELD],
+                     queue_size=app.config[Constants.LOG_QUEUE_SIZE_FIELD],
+                     sample_rate=app.config[Constants.LOG_SAMPLE_RATE_FIELD],
+                     max_body_chars=app.config[Constants.LOG_MAX_BODY_CHARS_FIELD],
+                     remote_url=app.config[Constants.LOG_REMOTE_URL_FIELD],
+                     remote_authorization=app.config[Constants.LOG_REMOTE_AUTHORIZATION_FIELD])
+    chat_services.closers.append(stop_logging)
+
+    ai = create_ai(app.config[Constants.AI_BACKEND_FIELD])
+    ai.warm_up()
+    if app.config[Constants.AI_SINGLE_FLIGHT_FIELD]:
+        ai = SingleFlightAI(ai)
+    chat_services.ai = ai
+
+    # Database configuration
+    create_db(app, chat_services)
+    db, mongo_db = chat_services.db, chat_services.mongo_db
+
+    # Conversations are trimmed in the background, by one replica at a time, unless RETENTION_SCHEDULE=inline
+    if app.config[Constants.RETENTION_SCHEDULE_FIELD] == RetentionSchedules.BACKGROUND:
+        chat_services.retention_scheduler = RetentionScheduler(
+            db, app.config[Constants.MAX_MESSAGES_FIELD],
+            interval=app.config[Constants.RETENTION_INTERVAL_FIELD],
+            max_overshoot=app.config[Constants.RETENTION_MAX_OVERSHOOT_FIELD],
+            lock=MongoLeaderLock(mongo_db.db[Constants.LOCKS_COLLECTION], RETENTION_LOCK_NAME)
+            if mongo_db is not None else None)
+        chat_services.closers.append(chat_services.retention_scheduler.close)
+
+    # Conversation history sent with each prompt, only built for models that use it
+    if ai.uses_context and app.config[Constants.AI_CONTEXT_TOKENS_FIELD] > 0:
+        chat_services.context_builder = ContextBuilder(db, max_tokens=app.config[Constants.AI_CONTEXT_TOKENS_FIELD])
+
+    chat_services.bulkhead = Bulkhead(max_concurrency=app.config[Constants.AI_MAX_CONCURRENCY_FIELD],
+                                      max_queue=app.config[Constants.AI_MAX_QUEUE_FIELD],
+                                      queue_timeout=app.config[Constants.AI_QUEUE_TIMEOUT_FIELD])
+
+    if app.config[Constants.AI_CACHE_FIELD]:
+        chat_services.ai_cache = create_ai_cache(app, ai, mongo_db)
+
+    # Push channel for new messages (see GET /chat/stream)
+    chat_services.broadcaster = create_broadcaster(app, mongo_db)
+    chat_services.stream_slots = threading.BoundedSemaphore(app.config[Constants.STREAM_MAX_SUBSCRIBERS_FIELD])
+    chat_services.drainers.append(chat_services.broadcaster.close)
+    chat_services.closers.append(chat_services.broadcaster.close)
+
+    app.register_blueprint(chat)
+    return app
 
-logger = configure_logger()
 
-# In production, these would be environment variables
-app.config[Constants.MAX_MESSAGES_FIELD] = int(
-    os.getenv(EnvironmentVariables.MAX_MESSAGES_VARIABLE, AppConfig.MAX_MESSAGES.value))
+def create_db(app: Flask, chat_services: ChatServices):
+    """ Build the message store selected by DB_BACKEND, wrapped in the write-behind queue and the history cache if
+    they are enabled
+
+    :param app: The Flask app, whose config selects the store
+    :param chat_services: The app's services, which receive the store and its cleanup callbacks
+    """
+    mongo_db = None
+    if app.config[Constants.DB_BACKEND_FIELD] == DbBackends.MEMORY:
+        # Nothing is shared between processes or kept across restarts, so this only suits a single node
+        db = InMemoryDb(app.config[Constants.MAX_MESSAGES_FIELD])
+    elif app.config[Constants.DB_BACKEND_FIELD] == DbBackends.SQLITE:
+        # A local file, shared only by the processes of this host
+        db = SqliteDb(app.config[Constants.SQLITE_PATH_FIELD], app.config[Constants.MAX_MESSAGES_FIELD])
+        chat_services.closers.append(db.close)
+    else:
+        mongo_db = db = MongoDb(app)
+        chat_services.closers.append(mongo_db.mongo.cx.close)
+    # Wrapped before the caches and queues, so that only calls reaching the store are timed
+    db = InstrumentedDb(db)
+    if app.config[Constants.WRITE_BEHIND_FIELD]:
+        db = WriteBehindDb(db,
+                           batch_size=app.config[Constants.WRITE_BEHIND_BATCH_SIZE_FIELD],
+                           flush_interval=app.config[Constants.WRITE_BEHIND_FLUSH_INTERVAL_FIELD])
+        chat_services.drainers.append(db.flush)
+        chat_services.closers.append(db.close)
+    if app.config[Constants.HISTORY_CACHE_FIELD]:
+        db = chat_services.history_cache = CachedDb(
+            db, app.config[Constants.MAX_MESSAGES_FIELD],
+            ttl=app.config[Constants.HISTORY_CACHE_TTL_FIELD],
+            max_conversations=app.config[Constants.HISTORY_CACHE_MAX_CONVERSATIONS_FIELD])
+    chat_services.mongo_db, chat_services.db = mongo_db, db
+
+
+def create_ai_cache(app: Flask, ai, mongo_db: MongoDb | None) -> CachedAI:
+    """ Build the AI response cache, shared between replicas through MongoDB if AI_CACHE_SHARED is set
+
+    :param app: The Flask app, whose config sizes the cache
+    :param ai: The synchronous AI model to cache
+    :param mongo_db: The MongoDB store, or None with the other backends
+    :return:
+        The cached model
+    """
+    if app.config[Constants.AI_CACHE_SHARED_FIELD] and mongo_db is None:
+        raise ValueError(f"{EnvironmentVariables.AI_CACHE_SHARED_VARIABLE} requires "
+                         f"{EnvironmentVariables.DB_BACKEND_VARIABLE}={DbBackends.MONGO}")
+    return CachedAI(
+        ai,
+        max_entries=app.config[Constants.AI_CACHE_MAX_ENTRIES_FIELD],
+        max_bytes=app.config[Constants.AI_CACHE_MAX_BYTES_FIELD],
+        ttl=app.config[Constants.AI_CACHE_TTL_FIELD],
+        backend=MongoAICacheBackend(mongo_db.db[Constants.AI_CACHE_COLLECTION])
+        if app.config[Constants.AI_CACHE_SHARED_FIELD] else None)
+
+
+def create_broadcaster(app: Flask, mongo_db: MongoDb | None):
+    """ Build the broadcaster selected by BROADCASTER
+
+    :param app: The Flask app, whose config selects the broadcaster
+    :param mongo_db: The MongoDB store, or None with the other backends
+    :return:
+        The broadcaster
+    """
+    if app.config[Constants.BROADCASTER_FIELD] == BroadcasterTypes.MONGO_CHANGE_STREAM:
+        if mongo_db is None:
+            raise ValueError(f"{EnvironmentVariables.BROADCASTER_VARIABLE}={BroadcasterTypes.MONGO_CHANGE_STREAM} "
+                             f"requires {EnvironmentVariables.DB_BACKEND_VARIABLE}={DbBackends.MONGO}")
+        return MongoChangeStreamBroadcaster(mongo_db.db.messages)
+    return InProcessBroadcaster()
 
-app.config[Constants.DEBUG_FIELD] = os.getenv(EnvironmentVariables.DEBUG_VARIABLE, 'False').lower() == 'true'
 
-# AI response using dummy AI model
-ai = DummyAI()
-# AI responses using GPT 4o-mini model
-# ai = GPT4oMini()
+def drain(app: Flask):
+    """ Prepare the services built by create_app for shutdown as soon as the server is asked to stop: end the
+    /chat/stream responses, which would otherwise hold their threads until the server gives up on them, and flush the
+    queued writes. Requests in flight still complete; shutdown() releases the services once they have.
 
-# Database configuration
-db = MongoDb(app)
+    :param app: The app built by create_app
+    """
+    app.extensions[EXTENSION_NAME].drain()
+
+
+def shutdown(app: Flask):
+    """ Release the services built by create_app for an app, newest first: flush queued writes, stop the background
+    threads and write out the queued log records. Called by each server worker as it exits, once its requests have
+    drained.
+
+    :param app: The app built by create_app
+    """
+    app.extensions[EXTENSION_NAME].close()
 
 
-@app.route('/')
+@chat.route('/')
 def home() -> (Response, int):
-    """Serve the chat interface"""
+    """Serve the chat interface, rendered at startup, with a strong ETag per content coding"""
     try:
         # Splunk logging:
         # logger.info('Home page accessed', extra={
@@ -50,8 +375,12 @@ def home() -> (Response, int):
         #     'client_ip': request.remote_addr,
         #     'user_agent': request.user_agent.string
         # })
-        logger.info('Retrieved home page')
-        return render_template('index.html')
+        # Debug level, as the compose health check requests the page every 30 seconds
+        logger.debug('Retrieved home page')
+        home_page = services().home_page
+        return conditional_response(home_page.body, home_page.etag, 'text/html',
+                                    f"public, max-age={current_app.config[Constants.PAGE_MAX_AGE_FIELD]}",
+                                    home_page.encoded_bodies)
     except Exception as e:
         # Splunk logging:
         # logger.error('Home page error', extra={
@@ -66,7 +395,7 @@ def home() -> (Response, int):
         return jsonify({Constants.ERROR_FIELD: 'Internal server error'}), StatusCodes.INTERNAL_SERVER_ERROR_CODE
 
 
-@app.route('/chat/message', methods=['POST'])
+@chat.route('/chat/message', methods=['POST'])
 def send_message() -> (Response, int):
     """
     Handle incoming chat messages
@@ -77,83 +406,83 @@ def send_message() -> (Response, int):
         "message": "User's message here",
         "timestamp":
     }
+
+    The message is added to the conversation named by the optional `conversation_id` query parameter (the default
+    conversation if it is omitted). With `?stream=true` the AI response is returned as Server-Sent Events while it is
+    generated. A request sent with
+    `Cache-Control: no-cache` skips the AI response cache. When too many AI calls are running and queued, the request
+    is rejected with 503 and a Retry-After header.
     """
     try:
-        data = request.get_json()
+        with stage(MetricStages.VALIDATE):
+            data = request.get_json()
 
-        if not data or Constants.MESSAGE_FIELD not in data:
-            # Splunk logging:
-            # logger.warning('Invalid message format', extra={
-            #     'event_type': 'validation_error',
-            #     'component': 'flask',
-            #     'endpoint': '/chat/message',
-            #     'client_ip': request.remote_addr,
-            #     'request_data': data
-            # })
-            logger.warning("Invalid message format received")
-            return jsonify({Constants.ERROR_FIELD: 'Invalid request format'}), StatusCodes.BAD_REQUEST_ERROR_CODE
+            if not data or Constants.MESSAGE_FIELD not in data:
+                # Splunk logging:
+                # logger.warning('Invalid message format', extra={
+                #     'event_type': 'validation_error',
+                #     'component': 'flask',
+                #     'endpoint': '/chat/message',
+                #     'client_ip': request.remote_addr,
+                #     'request_data': data
+                # })
+                logger.warning("Invalid message format received")
+                return jsonify({Constants.ERROR_FIELD: 'Invalid request format'}), StatusCodes.BAD_REQUEST_ERROR_CODE
+
+            user_message = data[Constants.MESSAGE_FIELD].strip()
+            if not user_message:
+                # Splunk logging:
+                # logger.warning('Message cannot be empty', extra={
+                #     'component': 'flask',
+                #     'event_type': 'validation_error',
+                #     'endpoint': '/chat/message',
+                #     'client_ip': request.remote_addr,
+                #     'request_data': data
+                # })
+                logger.warning("Message cannot be empty")
+                return jsonify({Constants.ERROR_FIELD: 'Message cannot be empty'}), StatusCodes.BAD_REQUEST_ERROR_CODE
+
+            try:
+                conversation_id = parse_conversation_id(request.args.get(Constants.CONVERSATION_ID_FIELD))
+            except ValueError as e:
+                logger.warning(str(e))
+                return jsonify({Constants.ERROR_FIELD: 'Invalid conversation id'}), StatusCodes.BAD_REQUEST_ERROR_CODE
 
-        user_message = data[Constants.MESSAGE_FIELD].strip()
-        if not user_message:
+        # Both messages are written together once the AI has responded
+        user_msg = create_message("User", user_message, conversation_id)
+        logger.info('User message received', extra={
+            'event_type': 'user_message',
+            'endpoint': '/chat/message',
+            'user': user_msg.user,
+            'conversation_id': conversation_id,
+            'body': user_msg.message,
+            'message_length': len(user_msg.message),
+            'client_ip': request.remote_addr
+        })
+
+        context = build_context(user_message, conversation_id)
+
+        try:
+            services().bulkhead.acquire()
+        except BulkheadFullError as e:
             # Splunk logging:
-            # logger.warning('Message cannot be empty', extra={
+            # logger.warning('AI request shed', extra={
+            #     'event_type': 'load_shedding',
             #     'component': 'flask',
-            #     'event_type': 'validation_error',
             #     'endpoint': '/chat/message',
-            #     'client_ip': request.remote_addr,
-            #     'request_data': data
+            #     'reason': e.reason,
+            #     'client_ip': request.remote_addr
             # })
-            logger.warning("Message cannot be empty")
-            return jsonify({Constants.ERROR_FIELD: 'Message cannot be empty'}), StatusCodes.BAD_REQUEST_ERROR_CODE
-        sanitized_user_message = bleach.clean(user_message)
-
-        user_msg = Message(
-            user="User",
-            message=sanitized_user_message,
-            timestamp=datetime.now(tz=timezone.utc)
-        )
-        db.insert_message(user_msg)
-        # Splunk logging:
-        # logger.info('User message received', extra={
-        #     'event_type': 'user_message',
-        #     'component': 'flask',
-        #     'endpoint': '/chat/message',
-        #     'user': user_msg.user,
-        #     'message_length': len(user_msg.message),
-        #     'timestamp': user_msg.timestamp.isoformat(),
-        #     'client_ip': request.remote_addr
-        # })
-        logger.info(
-            f"Message from user: {user_msg.user}, message = {user_msg.message}, timestamp = {user_msg.timestamp}")
-
-        ai_response = ai.get_ai_response(user_message)
-        sanitized_ai_response = bleach.clean(ai_response)
-        ai_msg = Message(
-            user="AI",
-            message=sanitized_ai_response,
-            timestamp=datetime.now(tz=timezone.utc)
-        )
-        db.insert_message(ai_msg)
-        # Splunk logging:
-        # logger.info('AI response generated', extra={
-        #     'event_type': 'ai_response',
-        #     'component': 'flask',
-        #     'endpoint': '/chat/message',
-        #     'response_length': len(ai_response),
-        #     'processing_time': (datetime.now() - user_msg.timestamp).total_seconds(),
-        #     'timestamp': ai_msg.timestamp.isoformat()
-        # })
-        logger.info(
-            f"Message from user: {ai_msg.user}, message = {ai_msg.message}, timestamp = {ai_msg.timestamp}")
+            logger.warning(f"Shedding message, AI is saturated: {e.reason}")
+            response = jsonify({Constants.ERROR_FIELD: 'Service is busy, please retry later'})
+            response.retry_after = current_app.config[Constants.AI_RETRY_AFTER_FIELD]
+            return response, StatusCodes.SERVICE_UNAVAILABLE_CODE
 
-        # Maintain message limit
-        total_messages = db.count_messages()
-        if total_messages > app.config[Constants.MAX_MESSAGES_FIELD]:
-            nth_newest = db.get_nth_newest()
-            if nth_newest.count:
-                cutoff_timestamp = nth_newest[0][Constants.TIMESTAMP_FIELD]
-                db.delete_messages_by_timestamp(cutoff_timestamp)
+        bypass_cache = bool(request.cache_control.no_cache)
+        if request.args.get(Constants.STREAM_FIELD, '').lower() == 'true':
+            return stream_message(user_msg, user_message, context, bypass_cache)
 
+        answer_message(user_msg, user_message, context, bypass_cache)
         return jsonify({Constants.STATUS_FIELD: 'success'}), StatusCodes.SUCCESS_CODE
 
     except Exception as e:
@@ -161,26 +490,292 @@ def send_message() -> (Response, int):
         return jsonify({Constants.ERROR_FIELD: 'Internal server error'}), StatusCodes.INTERNAL_SERVER_ERROR_CODE
 
 
-@app.route('/chat/history', methods=['GET'])
+def stream_message(user_msg: Message, user_message: str, context: list[dict] | None, bypass_cache: bool) -> Response:
+    """ Respond to a user message with its AI response streamed as Server-Sent Events (see stream_ai_message),
+    releasing the request's AI slot once the stream is closed
+
+    :param user_msg: The sanitized user message
+    :param user_message: The validated message from the user, as sent to the AI
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the AI response cache lookup
+    :return:
+        The streaming event response
+    """
+    response = Response(stream_ai_message(user_msg, user_message, context, bypass_cache),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The slot is held until the stream is closed, even if the client disconnects before it starts
+    response.call_on_close(services().bulkhead.release)
+    return response
+
+
+def answer_message(user_msg: Message, user_message: str, context: list[dict] | None, bypass_cache: bool):
+    """ Get the AI response to a user message and store both, then release the request's AI slot
+
+    :param user_msg: The sanitized user message
+    :param user_message: The validated message from the user, as sent to the AI
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the AI response cache lookup
+    """
+    try:
+        handle_message(user_msg, user_message, context, bypass_cache)
+    finally:
+        services().bulkhead.release()
+
+
+def handle_message(user_msg: Message, user_message: str, context: list[dict] | None = None,
+                   bypass_cache: bool = False):
+    """ Get the AI response to a user message and store both
+
+    :param user_msg: The sanitized user message
+    :param user_message: The validated message from the user, as sent to the AI
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the AI response cache lookup
+    """
+    with stage(MetricStages.AI):
+        ai_response = get_ai_response(user_message, context, bypass_cache)
+    store_messages(user_msg, ai_response)
+
+
+def create_message(user: str, text: str, conversation_id: str = DEFAULT_CONVERSATION_ID) -> Message:
+    """ Create a sanitized, timestamped message
+
+    :param user: The author of the message ("User" or "AI")
+    :param text: The raw message text
+    :param conversation_id: The conversation the message belongs to
+    :return:
+        The message
+    """
+    timestamp = services().clock.now()
+    with stage(MetricStages.SANITIZE):
+        text = sanitize(text)
+    return Message(
+        user=user,
+        message=text,
+        timestamp=timestamp,
+        conversation_id=conversation_id
+    )
+
+
+def build_context(user_message: str, conversation_id: str) -> list[dict] | None:
+    """ Build the conversation context sent to the AI with a user message, if the AI model uses it
+
+    :param user_message: The validated message from the user
+    :param conversation_id: The conversation the message belongs to
+    :return:
+        The newest earlier messages of the conversation that fit in the token budget, or None
+    """
+    context_builder = services().context_builder
+    if context_builder is None:
+        return None
+    with stage(MetricStages.CONTEXT):
+        return context_builder.build(user_message, conversation_id)
+
+
+def get_ai_response(user_message: str, context: list[dict] | None = None, bypass_cache: bool = False) -> str:
+    """ Get the AI response to a user message, through the AI response cache if it is enabled
+
+    :param user_message: The validated message from the user
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the cache lookup
+    :return:
+        The AI response
+    """
+    chat_services = services()
+    if chat_services.ai_cache is not None:
+        return chat_services.ai_cache.get_ai_response(user_message, context, bypass_cache=bypass_cache)
+    return chat_services.ai.get_ai_response(user_message, context)
+
+
+def stream_ai_response(user_message: str, context: list[dict] | None = None,
+                       bypass_cache: bool = False) -> Iterator[str]:
+    """ Stream the AI response to a user message, through the AI response cache if it is enabled
+
+    :param user_message: The validated message from the user
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the cache lookup
+    :return:
+        The chunks of the AI response
+    """
+    chat_services = services()
+    if chat_services.ai_cache is not None:
+        return chat_services.ai_cache.stream_ai_response(user_message, context, bypass_cache=bypass_cache)
+    return chat_services.ai.stream_ai_response(user_message, context)
+
+
+def store_messages(user_msg: Message, ai_response: str) -> Message:
+    """ Store a user message and the AI response to it in one write, publish both and enforce the message limit of
+    their conversation (or leave it to the retention scheduler)
+
+    Both messages are stamped as they are written rather than when the request arrived, so that every conversation is
+    stored in timestamp order, which the history cache, cursors and context window rely on.
+
+    :param user_msg: The user message (stamped when the request arrived)
+    :param ai_response: The complete AI response
+    :return:
+        The stored AI message
+    """
+    chat_services = services()
+    received = user_msg.timestamp
+    user_msg = user_msg.model_copy(update={Constants.TIMESTAMP_FIELD: chat_services.clock.now()})
+    ai_msg = create_message("AI", ai_response, user_msg.conversation_id)
+    with stage(MetricStages.INSERT):
+        chat_services.db.insert_messages([user_msg, ai_msg])
+    chat_services.broadcaster.publish(dict(user_msg))
+    chat_services.broadcaster.publish(dict(ai_msg))
+    log_ai_response(received, ai_msg)
+
+    # Maintain message limit
+    if chat_services.retention_scheduler is not None:
+        chat_services.retention_scheduler.record_writes(user_msg.conversation_id, 2)
+    else:
+        with stage(MetricStages.TRIM):
+            chat_services.db.enforce_retention(current_app.config[Constants.MAX_MESSAGES_FIELD],
+                                               user_msg.conversation_id)
+    return ai_msg
+
+
+def log_ai_response(received: datetime, ai_msg: Message):
+    """ Log a stored AI response (a hot path event, see utils/log_utils.py)
+
+    :param received: When the user message it responds to was received
+    :param ai_msg: The AI message
+    """
+    logger.info('AI response generated', extra={
+        'event_type': 'ai_response',
+        'conversation_id': ai_msg.conversation_id,
+        'body': ai_msg.message,
+        'response_length': len(ai_msg.message),
+        'processing_time': (datetime.now(tz=timezone.utc) - received).total_seconds()
+    })
+
+
+def stream_ai_message(user_msg: Message, user_message: str, context: list[dict] | None = None,
+                      bypass_cache: bool = False) -> Iterator[str]:
+    """ Stream an AI response as Server-Sent Events and store it once complete
+
+    Each `chunk` event carries a piece of the raw response as it is generated. The assembled response is sanitized and
+    stored as a single message (together with the user message), which is sent in a final `done` event. If the model
+    fails mid-stream, the partial response is discarded: the model's error response is stored instead and sent in an
+    `error` event. If the client disconnects mid-stream, the rest of the response is read and the turn is still stored.
+
+    :param user_msg: The sanitized user message
+    :param user_message: The message from the user
+    :param context: The earlier messages of the conversation (see build_context)
+    :param bypass_cache: Whether to skip the AI response cache lookup
+    :return:
+        The Server-Sent Events
+    """
+    return ai_message_events(current_app._get_current_object(), user_msg, user_message, context, bypass_cache)
+
+
+def ai_message_events(app: Flask, user_msg: Message, user_message: str, context: list[dict] | None,
+                      bypass_cache: bool) -> Iterator[str]:
+    """ Generate the events of stream_ai_message
+
+    The events are generated after the request context is gone, so the app is passed in and its context is pushed
+    around the calls that need it (never across a yield).
+
+    :param app: The app handling the request
+    :param user_msg: The sanitized user message
+    :param user_message: The message from the user
+    :param context: The earlier messages of the conversation
+    :param bypass_cache: Whether to skip the AI response cache lookup
+    :return:
+        The Server-Sent Events
+    """
+    ai_chunks, chunks, ai_msg = iter(()), [], None
+    try:
+        with app.app_context():
+            ai_chunks = stream_ai_response(user_message, context, bypass_cache)
+
+        try:
+            for chunk in ai_chunks:
+                chunks.append(chunk)
+                yield f"event: chunk\ndata: {app.json.dumps({Constants.CONTENT_FIELD: chunk})}\n\n"
+        except AIStreamError as e:
+            with app.app_context():
+                ai_msg = store_messages(user_msg, e.error_response)
+            yield f"event: error\ndata: {app.json.dumps({Constants.ERROR_FIELD: e.error_response})}\n\n"
+            return
+
+        with app.app_context():
+            ai_msg = store_messages(user_msg, ''.join(chunks))
+        yield f"event: done\ndata: {app.json.dumps(dict(ai_msg))}\n\n"
+    except GeneratorExit:
+        # The client disconnected mid-stream; the turn is still stored, as it would have been without streaming
+        if ai_msg is None:
+            with app.app_context():
+                store_abandoned_stream(user_msg, ai_chunks, chunks)
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming message: {str(e)}")
+        yield f"event: error\ndata: {app.json.dumps({Constants.ERROR_FIELD: 'Internal server error'})}\n\n"
+
+
+def store_abandoned_stream(user_msg: Message, ai_chunks: Iterator[str], chunks: list[str]):
+    """ Store a streamed turn whose client disconnected before it was stored
+
+    The rest of the AI response is read first, so the stored reply is the one the client would have received.
+
+    :param user_msg: The sanitized user message
+    :param ai_chunks: The chunks of the AI response that have not been streamed yet
+    :param chunks: The chunks of the AI response already streamed
+    """
+    try:
+        try:
+            chunks.extend(ai_chunks)
+            ai_response = ''.join(chunks)
+        except AIStreamError as e:
+            ai_response = e.error_response
+        store_messages(user_msg, ai_response)
+    except Exception as e:
+        logger.error(f"Error storing abandoned stream: {str(e)}")
+
+
+@chat.route('/chat/history', methods=['GET'])
 def get_history() -> (Response, int):
-    """ Retrieve chat history
+    """ Retrieve the chat history of the conversation named by the optional `conversation_id` query parameter
+
+    Supports incremental retrieval via the optional `after` (cursor from a previous response's X-Next-Cursor header)
+    and `limit` query parameters, and conditional requests via ETag/If-None-Match.
 
     :return:
         The response containing the chat history
     """
     try:
-        messages = db.retrieve_messages()
-        cleaned_messages = remove_mongo_id(messages)
-        # Splunk logging:
-        # logger.info('Chat history retrieved', extra={
-        #     'event_type': 'history_retrieval',
-        #     'component': 'flask',
-        #     'endpoint': '/chat/history',
-        #     'message_count': len(cleaned_messages),
-        #     'client_ip': request.remote_addr
-        # })
-        logger.info(f"Retrieved {len(cleaned_messages)} chat messages from history")
-        return jsonify(cleaned_messages), StatusCodes.SUCCESS_CODE
+        chat_services = services()
+        after = request.args.get(Constants.AFTER_FIELD)
+        limit = request.args.get(Constants.LIMIT_FIELD)
+        try:
+            conversation_id = parse_conversation_id(request.args.get(Constants.CONVERSATION_ID_FIELD))
+            position = decode_cursor(after) if after else None
+            limit = int(limit) if limit is not None else None
+            if limit is not None and limit <= 0:
+                raise ValueError(f"Invalid limit: {limit}")
+            if chat_services.history_cache is not None and position is None and limit is None:
+                # The full history is encoded (and compressed) once per change instead of once per request, so
+                # history_read includes the encoding only when it changed
+                with stage(MetricStages.HISTORY_READ):
+                    history = chat_services.history_cache.snapshot(encode_snapshot, conversation_id=conversation_id)
+            else:
+                with stage(MetricStages.HISTORY_READ):
+                    messages = chat_services.db.retrieve_messages(after=position, limit=limit,
+                                                                  conversation_id=conversation_id)
+                with stage(MetricStages.HISTORY_ENCODE):
+                    history = encode_history(current_app.json, messages, position)
+        except ValueError as e:
+            logger.warning(f"Invalid history request: {str(e)}")
+            return jsonify({Constants.ERROR_FIELD: 'Invalid history request'}), StatusCodes.BAD_REQUEST_ERROR_CODE
+
+        logger.info('Chat history retrieved', extra={
+            'event_type': 'history_retrieval',
+            'endpoint': '/chat/history',
+            'conversation_id': conversation_id,
+            'message_count': history.message_count,
+            'client_ip': request.remote_addr
+        })
+        return history_response(history)
     except Exception as e:
         # Splunk logging:
         # logger.error('Chat history retrieval error', extra={
@@ -195,9 +790,158 @@ def get_history() -> (Response, int):
         return jsonify({Constants.ERROR_FIELD: 'Error retrieving chat history'}), StatusCodes.INTERNAL_SERVER_ERROR_CODE
 
 
+def encode_snapshot(messages: list) -> EncodedHistory:
+    """ Encode (and compress) the full history of a conversation for the history cache
+
+    :param messages: The messages of the conversation
+    :return:
+        The encoded history
+    """
+    with stage(MetricStages.HISTORY_ENCODE):
+        return encode_history(current_app.json, messages, compress=True)
+
+
+def history_response(history: EncodedHistory) -> Response:
+    """ Build a conditional /chat/history response from an encoded history
+
+    :param history: The encoded history
+    :return:
+        The response, brotli or gzip encoded if the client accepts it and the body is compressed or large enough
+    """
+    # Clients must revalidate every time, which turns unchanged polls into bodiless 304s
+    response = conditional_response(history.body, history.etag, current_app.json.mimetype, 'no-cache',
+                                    history.encoded_bodies())
+    if history.next_cursor:
+        response.headers[Constants.NEXT_CURSOR_HEADER] = history.next_cursor
+    return response
+
+
+def conditional_response(body: bytes, etag: str, mimetype: str, cache_control: str,
+                         encoded_bodies: dict[str, bytes] | None = None) -> Response:
+    """ Build a conditional response in the content coding the client prefers
+
+    The prepared encoded bodies are used when given; otherwise bodies of at least COMPRESS_MIN_SIZE bytes are compressed
+    once the request is known not to be answered with a 304. The headers are built in one go rather than through the
+    response's header accessors, which cost more than the rest of serving a prepared body.
+
+    :param body: The unencoded body
+    :param etag: The validator of the unencoded body
+    :param mimetype: The body's media type
+    :param cache_control: The Cache-Control header
+    :param encoded_bodies: The body compressed in advance, by content coding
+    :return:
+        The response, or a 304 if the client's copy is current
+    """
+    compressible = bool(encoded_bodies) or len(body) >= current_app.config[Constants.COMPRESS_MIN_SIZE_FIELD]
+    encoding = negotiate_encoding(request.accept_encodings, encoded_bodies or ENCODINGS) if compressible else None
+    # Each content coding is a different representation, so it needs its own strong validator
+    tag = f"{etag}-{encoding}" if encoding else etag
+    headers = {'ETag': f'"{tag}"', 'Cache-Control': cache_control}
+    if compressible:
+        headers['Vary'] = 'Accept-Encoding'
+    if request.if_none_match.contains_weak(tag):
+        return current_app.response_class(status=StatusCodes.NOT_MODIFIED_CODE, headers=headers)
+    if encoding:
+        body = encoded_bodies[encoding] if encoded_bodies else compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return current_app.response_class(body, mimetype=mimetype, headers=headers)
+
+
+@chat.after_app_request
+def compress_json(response: Response) -> Response:
+    """ Compress the other JSON responses (e.g. long AI responses) of at least COMPRESS_MIN_SIZE bytes, if the client
+    accepts it; responses with an ETag were already encoded by conditional_response
+
+    :param response: The response
+    :return:
+        The response
+    """
+    if response.status_code != StatusCodes.SUCCESS_CODE or response.mimetype != current_app.json.mimetype \
+            or response.is_streamed or response.content_encoding or 'ETag' in response.headers:
+        return response
+    body = response.get_data()
+    if len(body) < current_app.config[Constants.COMPRESS_MIN_SIZE_FIELD]:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.content_encoding = encoding
+    return response
+
+
+@chat.route('/metrics', methods=['GET'])
+def metrics() -> Response:
+    """ Expose the metrics (e.g. AI saturation, see ai/bulkhead.py, and the duration of each request stage and store
+    call, see utils/metrics_utils.py) in the Prometheus text format
+
+    :return:
+        The metrics response
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@chat.route('/chat/stream', methods=['GET'])
+def stream_messages() -> (Response, int):
+    """ Push new chat messages of the conversation named by the optional `conversation_id` query parameter to the
+    client as Server-Sent Events
+
+    Each event's data is a JSON message shaped like the entries of /chat/history. Comment lines are sent periodically
+    to keep idle connections open through proxies. The stream ends when the server starts shutting down (see drain),
+    and the browser's EventSource reconnects. Once STREAM_MAX_SUBSCRIBERS clients are connected to a worker, further
+    clients are turned away with 503 so that streams cannot take every request thread.
+
+    :return:
+        The streaming event response
+    """
+    try:
+        conversation_id = parse_conversation_id(request.args.get(Constants.CONVERSATION_ID_FIELD))
+    except ValueError as e:
+        logger.warning(str(e))
+        return jsonify({Constants.ERROR_FIELD: 'Invalid conversation id'}), StatusCodes.BAD_REQUEST_ERROR_CODE
+
+    stream_slots = services().stream_slots
+    if not stream_slots.acquire(blocking=False):
+        logger.warning("Refusing chat stream client, too many streams are open")
+        response = jsonify({Constants.ERROR_FIELD: 'Service is busy, please retry later'})
+        response.retry_after = current_app.config[Constants.AI_RETRY_AFTER_FIELD]
+        return response, StatusCodes.SERVICE_UNAVAILABLE_CODE
+
+    # The events are generated after the request context is gone
+    broadcaster = services().broadcaster
+    json = current_app.json
+    subscription = broadcaster.subscribe(conversation_id)
+    logger.info(f"Chat stream client connected to conversation {conversation_id}")
+
+    def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = subscription.get(timeout=AppConfig.STREAM_KEEPALIVE_SECONDS.value)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is CLOSED:
+                    # The server is shutting down; the client reconnects to another worker
+                    return
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+            logger.info("Chat stream client disconnected")
+
+    response = Response(event_stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The slot is held until the stream is closed, even if the client disconnects before it starts
+    response.call_on_close(stream_slots.release)
+    return response
+
+
 if __name__ == '__main__':
+    # Development server only; production runs several worker processes with gunicorn (see gunicorn.conf.py)
     # Retrieve the app host and port from: (1) environment variables; (2) the app config in constants.py
     host = os.getenv(EnvironmentVariables.APP_HOST_VARIABLE, AppConfig.APP_HOST.value)
     port = int(os.getenv(EnvironmentVariables.PORT_VARIABLE, AppConfig.APP_PORT.value))
 
-    app.run(host=host, port=port)
+    create_app().run(host=host, port=port)
@@ -0,0 +1,131 @@
+"""Measures the bytes on the wire and the CPU time per request of GET / and GET /chat/history in each content coding.
+
+Requests go through the real Flask routes with a test client and the in-memory database holding one conversation of
+--messages messages. Each path is requested with Accept-Encoding identity, gzip and br, and again with the ETag of the
+previous response (a revalidation, answered with a bodiless 304). Paths:
+
+- render:   the chat page rendered by render_template on every request (the original behaviour), for comparison
+- page:     the chat page, rendered and compressed once at startup
+- history:  the uncached history, compressed per request once it reaches COMPRESS_MIN_SIZE
+- snapshot: the history served from the history cache, encoded and compressed once per change
+
+Bytes are the status line, headers and body of the response. CPU time is the process time of the whole request:
+
+    python -m benchmarks.bench_compression --requests 2000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.bench_utils import summarize
+from config.constants import AppConfig, Constants, DbBackends, EnvironmentVariables
+from models.message import Message
+
+ENCODINGS = ("identity", "gzip", "br")
+# Message text is drawn from these words, so that the history compresses like conversation rather than like a repeated
+# string
+WORDS = ("the quick brown fox jumps over lazy dog I understand what you are saying please tell me more about your "
+         "question answer model response conversation history message time today weather python code error "
+         "function value list because could would should maybe yes no thanks hello").split()
+
+
+def wire_bytes(response) -> int:
+    """Counts the bytes of an HTTP/1.1 response: status line, headers and body.
+
+    Args:
+        response: The test client response
+
+    Returns:
+        The response size in bytes
+    """
+    head = f"HTTP/1.1 {response.status}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in response.headers)
+    return len(head.encode()) + 2 + len(response.data)
+
+
+def measure(request, requests: int) -> tuple[list[float], int]:
+    """Measures the CPU time of a request.
+
+    Args:
+        request: Sends one request and returns the response
+        requests: The number of requests to send
+
+    Returns:
+        The per-request process times in milliseconds and the size of the last response in bytes
+    """
+    cpu_times = []
+    for _ in range(requests):
+        start = time.process_time()
+        response = request()
+        cpu_times.append((time.process_time() - start) * 1000)
+    return cpu_times, wire_bytes(response)
+
+
+def make_history(count: int) -> list[Message]:
+    """Creates a conversation of alternating user and AI messages.
+
+    Args:
+        count: The number of messages
+
+    Returns:
+        The messages, oldest first
+    """
+    words = random.Random(0)
+    start = datetime.now(tz=timezone.utc) - timedelta(seconds=count)
+    return [Message(user="User" if i % 2 == 0 else "AI",
+                    message=" ".join(words.choices(WORDS, k=words.randint(5, 40))).capitalize() + ".",
+                    timestamp=start + timedelta(seconds=i)) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=int(AppConfig.MAX_MESSAGES.value), help="history length")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per path, coding and revalidation")
+    args = parser.parse_args()
+
+    os.environ[EnvironmentVariables.DB_BACKEND_VARIABLE] = DbBackends.MEMORY
+    os.environ[EnvironmentVariables.LOG_FILE_VARIABLE] = ""
+    os.environ[EnvironmentVariables.MAX_MESSAGES_VARIABLE] = str(args.messages)
+    from app import EXTENSION_NAME, create_app
+    from db.cached_db import CachedDb
+    from flask import render_template
+
+    chat_app = create_app()
+    services = chat_app.extensions[EXTENSION_NAME]
+    chat_app.add_url_rule("/bench/render", "bench_render", lambda: render_template("index.html"))
+    services.db.insert_messages(make_history(args.messages))
+    client = chat_app.test_client()
+    history_cache = CachedDb(services.db, args.messages, ttl=float("inf"))
+
+    def get(path: str, headers: dict, cached: bool = False):
+        services.history_cache = history_cache if cached else None
+        return client.get(path, headers=headers)
+
+    paths = {
+        "render": lambda headers: get("/bench/render", headers),
+        "page": lambda headers: get("/", headers),
+        "history": lambda headers: get("/chat/history", headers),
+        "snapshot": lambda headers: get("/chat/history", headers, cached=True),
+    }
+
+    min_size = chat_app.config[Constants.COMPRESS_MIN_SIZE_FIELD]
+    print(f"{args.messages} messages in the history, COMPRESS_MIN_SIZE={min_size}")
+    print(f"{'path':<9} {'coding':<9} {'bytes':>7} {'cpu ms':>8} {'304 bytes':>10} {'304 cpu ms':>11}")
+    for name, request in paths.items():
+        # The rendered page has no validator or compression, so it is only requested once per coding
+        for encoding in ENCODINGS if name != "render" else ENCODINGS[:1]:
+            headers = {"Accept-Encoding": encoding}
+            cpu_times, size = measure(lambda: request(headers), args.requests)
+            etag = request(headers).headers.get("ETag")
+            if etag is None:
+                print(f"{name:<9} {encoding:<9} {size:>7} {summarize(cpu_times)['mean']:>8.4f} {'-':>10} {'-':>11}")
+                continue
+            revalidation = {**headers, "If-None-Match": etag}
+            cpu_times_304, size_304 = measure(lambda: request(revalidation), args.requests)
+            print(f"{name:<9} {encoding:<9} {size:>7} {summarize(cpu_times)['mean']:>8.4f} {size_304:>10} "
+                  f"{summarize(cpu_times_304)['mean']:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
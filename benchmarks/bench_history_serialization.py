@@ -0,0 +1,95 @@
+"""Compares the serialization cost per /chat/history request of the available encoding paths.
+
+- default:  Flask's default JSON provider plus the ETag hash, on every request (the original behaviour)
+- orjson:   encode_history with the orjson provider, on every request (uncached or paginated reads)
+- snapshot: the pre-encoded snapshot memoized by CachedDb, which is only rebuilt after a write
+
+No database is needed:
+
+    python -m benchmarks.bench_history_serialization
+"""
+import argparse
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+
+from benchmarks.bench_utils import summarize
+from config.constants import AppConfig
+from db.cached_db import CachedDb
+from db.in_memory_db import InMemoryDb
+from models.message import Message
+from utils.json_utils import OrjsonProvider, encode_history
+
+
+def make_history(count: int) -> InMemoryDb:
+    """Creates a store holding a history of messages.
+
+    Args:
+        count: The number of messages
+
+    Returns:
+        The store, with the messages in the default conversation
+    """
+    start = datetime(2025, 1, 12, 14, 30, tzinfo=timezone.utc)
+    db = InMemoryDb(count)
+    db.insert_messages([Message(
+        user="User" if i % 2 == 0 else "AI",
+        message=f"Message {i}: I understand what you're saying. Please tell me more!",
+        timestamp=start + timedelta(seconds=i),
+    ) for i in range(count)])
+    return db
+
+
+def measure(encode, requests: int) -> list[float]:
+    """Measures the latency of an encoding path.
+
+    Args:
+        encode: Produces the response body for one request
+        requests: The number of requests to simulate
+
+    Returns:
+        The per-request latencies in milliseconds
+    """
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        encode()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=int(AppConfig.MAX_MESSAGES.value), help="history length")
+    parser.add_argument("--requests", type=int, default=2000, help="requests simulated per path")
+    args = parser.parse_args()
+
+    db = make_history(args.messages)
+    messages = db.retrieve_messages()
+    default_app = Flask(__name__)
+    orjson_app = Flask(__name__)
+    orjson_app.json = OrjsonProvider(orjson_app)
+    history_cache = CachedDb(db, args.messages, ttl=float("inf"))
+
+    def default():
+        body = default_app.json.dumps(messages).encode()
+        return body, hashlib.sha1(body).hexdigest()
+
+    paths = {
+        "default": default,
+        "orjson": lambda: encode_history(orjson_app.json, messages),
+        "snapshot": lambda: history_cache.snapshot(
+            lambda history: encode_history(orjson_app.json, history, compress=True)),
+    }
+
+    print(f"{args.messages} messages per response")
+    print(f"{'path':<10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, encode in paths.items():
+        stats = summarize(measure(encode, args.requests))
+        print(f"{name:<10} {stats['mean']:>9.4f} {stats['p50']:>9.4f} {stats['p99']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
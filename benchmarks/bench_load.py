@@ -0,0 +1,225 @@
+"""Load-tests POST /chat/message and GET /chat/history and reports throughput and latency per endpoint and per stage.
+
+Worker threads drive the real Flask routes through test clients, so the whole request path is measured without
+network noise. The app runs against a DummyAI with configurable latency and jitter and, by default, the in-memory
+database, which keeps runs comparable between releases; --db-backend sqlite runs it against a fresh SQLite file instead
+(and mongo against MONGO_URI), so that stores can be compared. Feature flags (HISTORY_CACHE, WRITE_BEHIND,
+AI_SINGLE_FLIGHT, ...) are read from the environment as usual. Stage timings are per call: sanitize (create_message,
+twice per message), insert, AI and trim (enforce_retention, called by the retention scheduler unless
+RETENTION_SCHEDULE=inline).
+
+Results can be saved as JSON and compared with an earlier run:
+
+    python -m benchmarks.bench_load --concurrency 16 --requests 2000 --output before.json
+    python -m benchmarks.bench_load --concurrency 16 --requests 2000 --compare before.json
+    python -m benchmarks.bench_load --concurrency 16 --requests 2000 --db-backend sqlite --compare before.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from ai.dummy_ai import DummyAI
+from benchmarks.bench_utils import summarize
+from config.constants import Constants, DbBackends, EnvironmentVariables, StatusCodes
+from db.in_memory_db import InMemoryDb
+from db.mongo_db import MongoDb
+from db.sqlite_db import SqliteDb
+
+MESSAGE_ENDPOINT = "POST /chat/message"
+HISTORY_ENDPOINT = "GET /chat/history"
+STAGES = ["sanitize", "insert", "ai", "trim"]
+STORES = {DbBackends.MEMORY: InMemoryDb, DbBackends.SQLITE: SqliteDb, DbBackends.MONGO: MongoDb}
+
+
+class StageTimer:
+    """Collects the duration of each call to instrumented functions, by stage"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+
+    def wrap(self, stage: str, function):
+        """Returns function, recording the duration of each call in milliseconds under stage."""
+        samples = self.samples[stage]
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                samples.append((time.perf_counter() - start) * 1000)
+
+        return timed
+
+    def reset(self):
+        """Drops the samples collected so far."""
+        for samples in self.samples.values():
+            samples.clear()
+
+
+def load_app(db_backend: str, latency: float, jitter: float, timer: StageTimer):
+    """Builds the app wired to the given database and a DummyAI, with every stage instrumented.
+
+    Args:
+        db_backend: The DB_BACKEND to run against
+        latency: The mean DummyAI latency in seconds
+        jitter: The maximum deviation in seconds of the DummyAI latency
+        timer: Collects the stage timings
+
+    Returns:
+        The Flask app
+    """
+    os.environ[EnvironmentVariables.DB_BACKEND_VARIABLE] = db_backend
+    # Decorators such as CachedDb and WriteBehindDb delegate to the store, so the store's own calls are timed
+    store = STORES[DbBackends(db_backend)]
+    store.insert_messages = timer.wrap("insert", store.insert_messages)
+    store.enforce_retention = timer.wrap("trim", store.enforce_retention)
+    import app as chat_app
+
+    flask_app = chat_app.create_app()
+    services = flask_app.extensions[chat_app.EXTENSION_NAME]
+    ai = DummyAI(latency=latency, jitter=jitter)
+    ai.get_ai_response = timer.wrap("ai", ai.get_ai_response)
+    if hasattr(services.ai, "ai"):
+        services.ai.ai = ai
+    else:
+        services.ai = ai
+    if services.ai_cache is not None:
+        services.ai_cache.ai = services.ai
+    chat_app.create_message = timer.wrap("sanitize", chat_app.create_message)
+    return flask_app
+
+
+def run_worker(chat_app, requests: int, read_ratio: float, conversations: int, seed: int) -> list[tuple]:
+    """Sends a mix of message and history requests from one client.
+
+    Args:
+        chat_app: The Flask app
+        requests: The number of requests to send
+        read_ratio: The fraction of requests that read the history
+        conversations: The number of conversations the requests are spread over
+        seed: Seeds the request mix
+
+    Returns:
+        (endpoint, status code, latency in milliseconds) for each request
+    """
+    rng = random.Random(seed)
+    results = []
+    with chat_app.test_client() as client:
+        for i in range(requests):
+            query = f"?{Constants.CONVERSATION_ID_FIELD}=load-{rng.randrange(conversations)}"
+            start = time.perf_counter()
+            if rng.random() < read_ratio:
+                endpoint = HISTORY_ENDPOINT
+                response = client.get(f"/chat/history{query}")
+            else:
+                endpoint = MESSAGE_ENDPOINT
+                response = client.post(f"/chat/message{query}", json={Constants.MESSAGE_FIELD: f"Load message {i}"})
+            results.append((endpoint, response.status_code, (time.perf_counter() - start) * 1000))
+    return results
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Runs the load test.
+
+    Args:
+        args: The parsed command line arguments
+
+    Returns:
+        The configuration, the per-endpoint and the per-stage results
+    """
+    timer = StageTimer()
+    if args.db_backend == DbBackends.SQLITE:
+        # A fresh file per run, so that earlier runs do not change the results
+        os.environ[EnvironmentVariables.SQLITE_PATH_VARIABLE] = os.path.join(tempfile.mkdtemp(), "bench_load.db")
+    chat_app = load_app(args.db_backend, args.latency, args.jitter, timer)
+
+    run_worker(chat_app, args.warmup, args.read_ratio, args.conversations, seed=-1)
+    timer.reset()
+
+    shares = [args.requests // args.concurrency + (worker < args.requests % args.concurrency)
+              for worker in range(args.concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run_worker, chat_app, share, args.read_ratio, args.conversations, seed)
+                   for seed, share in enumerate(shares)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for endpoint in [MESSAGE_ENDPOINT, HISTORY_ENDPOINT]:
+        latencies = [latency for name, _, latency in results if name == endpoint]
+        if not latencies:
+            continue
+        errors = sum(1 for name, status, _ in results if name == endpoint and status != StatusCodes.SUCCESS_CODE)
+        endpoints[endpoint] = {"requests": len(latencies), "errors": errors, "rps": len(latencies) / elapsed,
+                               **summarize(latencies)}
+    stages = {stage: {"calls": len(samples), **summarize(samples)}
+              for stage, samples in timer.samples.items() if samples}
+
+    return {
+        "config": vars(args) | {"started_at": datetime.now().isoformat(timespec="seconds")},
+        "elapsed_s": elapsed,
+        "rps": len(results) / elapsed,
+        "endpoints": endpoints,
+        "stages": stages,
+    }
+
+
+def print_results(results: dict, baseline: dict | None):
+    """Prints the results, with the p50/p99 change against a baseline run if one is given."""
+    print(f"{results['rps']:.1f} requests/s over {results['elapsed_s']:.2f}s")
+    header = f"{'':<20} {'count':>7} {'errors':>7} {'rps':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header + (f" {'p50 Δ':>8} {'p99 Δ':>8}" if baseline else ""))
+
+    for section, count_key in [("endpoints", "requests"), ("stages", "calls")]:
+        for name, stats in results[section].items():
+            rps = f"{stats['rps']:.1f}" if "rps" in stats else ""
+            line = (f"{name:<20} {stats[count_key]:>7} {stats.get('errors', ''):>7} {rps:>9} "
+                    f"{stats['mean']:>9.3f} {stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['p99']:>9.3f}")
+            previous = (baseline or {}).get(section, {}).get(name)
+            if previous:
+                line += "".join(f" {(stats[key] / previous[key] - 1) * 100 if previous[key] else 0.0:>+7.1f}%"
+                                for key in ["p50", "p99"])
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=1000, help="total number of measured requests")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests sent first")
+    parser.add_argument("--read-ratio", type=float, default=0.5, help="fraction of requests reading the history")
+    parser.add_argument("--conversations", type=int, default=1, help="conversations the requests are spread over")
+    parser.add_argument("--db-backend", choices=list(DbBackends), default=DbBackends.MEMORY,
+                        help="message store to run against (mongo requires MONGO_URI)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean DummyAI latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum DummyAI latency deviation in seconds")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="show the change against the results saved in this JSON file")
+    parser.add_argument("--log", action="store_true", help="keep the app's INFO logging (off by default)")
+    args = parser.parse_args()
+
+    if not args.log:
+        logging.disable(logging.INFO)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    results = run(args)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
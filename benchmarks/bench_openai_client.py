@@ -0,0 +1,106 @@
+"""Measures the per-call overhead saved by reusing one pooled OpenAI client instead of creating one per request.
+
+A local HTTP server stands in for the OpenAI API and returns a canned chat completion, so the numbers isolate client
+construction and connection setup from model latency. Against the real API each new connection also pays a TLS
+handshake, so the savings there are larger than measured here.
+
+    python -m benchmarks.bench_openai_client --calls 500
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from ai.openai_client import get_openai_client
+from benchmarks.bench_utils import summarize
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "Hi there!"},
+        "finish_reason": "stop",
+    }],
+}).encode()
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """Serves a canned chat completion over keep-alive HTTP/1.1 connections"""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this Nagle's algorithm adds ~40ms per response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with CompletionHandler.connections_lock:
+            CompletionHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(create_client, calls: int) -> list[float]:
+    """Times chat completion calls made through the client returned by create_client.
+
+    Args:
+        create_client: Returns the client to use for a call
+        calls: The number of calls to make
+
+    Returns:
+        The per-call latencies in milliseconds
+    """
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client = create_client()
+        client.chat.completions.create(messages=[{"role": "user", "content": "Hello"}], model="gpt-4o-mini")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="calls per strategy")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Both strategies pick the stand-in up through the environment, as the app would pick up a proxy or gateway
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    strategies = {
+        "per-call": lambda: OpenAI(api_key="bench"),
+        "pooled": lambda: get_openai_client("bench"),
+    }
+
+    print(f"{'client':<10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'connections':>12}")
+    for name, create_client in strategies.items():
+        measure(create_client, 10)
+        CompletionHandler.connections = 0
+        stats = summarize(measure(create_client, args.calls))
+        print(f"{name:<10} {stats['mean']:>9.3f} {stats['p50']:>9.3f} {stats['p99']:>9.3f} "
+              f"{CompletionHandler.connections:>12}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compares the per-message write latency of MongoDb's retention against the timestamp trim it replaced.
+
+Messages are inserted into a dedicated database and MAX_MESSAGES is enforced after every write, which mirrors the
+work done by POST /chat/message with RETENTION_SCHEDULE=inline. Writes are spread round-robin over --conversations
+conversations, each trimmed to its own limit. Each strategy runs against the same workload:
+
+    timestamp  count the conversation, find its nth newest message and delete every message at or before its timestamp
+               (BaseDb.enforce_retention, which also over-deletes messages tied with that timestamp)
+    sequence   read the conversation's sequence counter and delete its range below the limit (MongoDb.enforce_retention)
+
+Requires a reachable MongoDB instance:
+
+    MONGO_URI=mongodb://localhost:27017/chat_app_bench python -m benchmarks.bench_retention
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+
+from benchmarks.bench_utils import summarize
+from config.constants import AppConfig, Constants, EnvironmentVariables
+from db.base_db import BaseDb
+from db.mongo_db import MongoDb
+from models.message import Message
+
+STRATEGIES = {
+    "timestamp": BaseDb.enforce_retention,
+    "sequence": MongoDb.enforce_retention,
+}
+
+
+def run(mongo_uri: str, strategy: str, messages: int, max_messages: int, conversations: int) -> list[float]:
+    """Measures insert + retention latency for a single retention strategy.
+
+    Args:
+        mongo_uri: The MongoDB connection string
+        strategy: The name of the retention strategy to measure (see STRATEGIES)
+        messages: The number of messages to write
+        max_messages: The retention limit
+        conversations: The number of conversations the messages are spread over
+
+    Returns:
+        The per-message latencies in milliseconds
+    """
+    app = Flask(__name__)
+    app.config[Constants.MONGO_URI_FIELD] = mongo_uri
+    app.config[Constants.MAX_MESSAGES_FIELD] = max_messages
+
+    db = MongoDb(app)
+    db.clear_messages()
+    db.db[Constants.COUNTERS_COLLECTION].drop()
+    enforce_retention = STRATEGIES[strategy]
+
+    latencies = []
+    for i in range(messages):
+        conversation_id = f"conversation-{i % conversations}"
+        message = Message(user="User", message=f"Benchmark message {i}", timestamp=datetime.now(tz=timezone.utc),
+                          conversation_id=conversation_id)
+        start = time.perf_counter()
+        db.insert_message(message)
+        enforce_retention(db, max_messages, conversation_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    assert all(db.count_messages(f"conversation-{i}") <= max_messages for i in range(conversations))
+    db.db.messages.drop()
+    db.db[Constants.COUNTERS_COLLECTION].drop()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000, help="messages written per strategy")
+    parser.add_argument("--max-messages", type=int, default=int(AppConfig.MAX_MESSAGES.value))
+    parser.add_argument("--conversations", type=int, default=1, help="conversations the writes are spread over")
+    args = parser.parse_args()
+
+    mongo_uri = os.environ.get(EnvironmentVariables.MONGO_URI_VARIABLE)
+    if not mongo_uri:
+        raise SystemExit("Set MONGO_URI to run the retention benchmark")
+
+    print(f"{'strategy':<10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for strategy in STRATEGIES:
+        stats = summarize(run(mongo_uri, strategy, args.messages, args.max_messages, args.conversations))
+        print(f"{strategy:<10} {stats['mean']:>9.3f} {stats['p50']:>9.3f} {stats['p99']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
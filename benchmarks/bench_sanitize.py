@@ -0,0 +1,72 @@
+"""Compares the throughput of bleach.clean with utils.sanitize_utils.sanitize on typical chat traffic.
+
+- plain:   user messages without markup (the fast path)
+- markup:  distinct messages containing markup (a reused Cleaner, memo misses)
+- repeated: a few AI responses containing markup, sent over and over (memo hits)
+
+No database is needed:
+
+    python -m benchmarks.bench_sanitize
+"""
+import argparse
+import time
+
+import bleach
+
+from benchmarks.bench_utils import summarize
+from utils.sanitize_utils import sanitize
+
+
+def make_corpora(count: int) -> dict[str, list[str]]:
+    """Creates the message corpora.
+
+    Args:
+        count: The number of messages per corpus
+
+    Returns:
+        The messages of each corpus
+    """
+    return {
+        "plain": [f"Message {i}: I understand what you're saying. Please tell me more!" for i in range(count)],
+        "markup": [f"Message {i}: use <b>bold</b> & <script>alert({i})</script> carefully" for i in range(count)],
+        "repeated": [f"Try <code>pip install flask</code> & restart (tip {i % 5})" for i in range(count)],
+    }
+
+
+def measure(clean, messages: list[str]) -> tuple[float, list[float]]:
+    """Measures the cost of sanitizing each message.
+
+    Args:
+        clean: The sanitizer
+        messages: The messages to sanitize, in order
+
+    Returns:
+        The throughput in messages per second, and the per-message latencies in microseconds
+    """
+    latencies = []
+    start = time.perf_counter()
+    for message in messages:
+        begin = time.perf_counter()
+        clean(message)
+        latencies.append((time.perf_counter() - begin) * 1_000_000)
+    return len(messages) / (time.perf_counter() - start), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000, help="messages sanitized per corpus")
+    args = parser.parse_args()
+
+    print(f"{'corpus':<10} {'sanitizer':<14} {'msgs/s':>11} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'speedup':>8}")
+    for corpus, messages in make_corpora(args.messages).items():
+        baseline = None
+        for name, clean in [("bleach.clean", bleach.clean), ("sanitize", sanitize)]:
+            throughput, latencies = measure(clean, messages)
+            stats = summarize(latencies)
+            baseline = baseline or throughput
+            print(f"{corpus:<10} {name:<14} {throughput:>11.0f} {stats['mean']:>9.2f} {stats['p50']:>9.2f} "
+                  f"{stats['p99']:>9.2f} {throughput / baseline:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
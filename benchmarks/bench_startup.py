@@ -0,0 +1,97 @@
+"""Measures how long a new worker process takes to become useful: the time to import app.py and build the app (see
+app.create_app) and the latency of its first and second POST /chat/message requests.
+
+Each run starts a fresh interpreter, as a new pod or gunicorn worker would, with the in-memory store. The gpt-4o-mini
+backend talks to a local stand-in for the OpenAI API (see bench_openai_client), so model latency is excluded. Modes:
+
+- eager: every backend module is imported up front, as when app.py imported the AI classes directly
+- cold:  only the selected backend is imported, but its API client is discarded after startup (no warm-up)
+- lazy:  only the selected backend is imported and its API client is created at startup (the default)
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+from ai.registry import AI_BACKENDS
+from benchmarks.bench_openai_client import CompletionHandler
+from benchmarks.bench_utils import summarize
+from config.constants import AIBackends, EnvironmentVariables
+
+# Runs in the child process: argv[1] lists the modules to import first, argv[2] is the mode
+CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for module in filter(None, sys.argv[1].split(",")):
+    importlib.import_module(module)
+import app
+chat_app = app.create_app()
+imported = time.perf_counter()
+if sys.argv[2] == "cold":
+    from ai.openai_client import reset_openai_client
+    reset_openai_client()
+timings = {"import": imported - start}
+with chat_app.test_client() as client:
+    for request in ("first", "second"):
+        request_start = time.perf_counter()
+        assert client.post("/chat/message", json={"message": "Hello"}).status_code == 200
+        timings[request] = time.perf_counter() - request_start
+print(json.dumps({name: seconds * 1000 for name, seconds in timings.items()}))
+"""
+
+MODES = ("eager", "cold", "lazy")
+
+
+def run_worker(backend: str, mode: str, env: dict) -> dict:
+    """Starts a fresh interpreter that imports the app and sends it two messages.
+
+    Args:
+        backend: The AI_BACKEND to select
+        mode: One of MODES
+        env: The environment of the child process
+
+    Returns:
+        The import, first request and second request times in milliseconds
+    """
+    preload = ",".join(AI_BACKENDS[name].module for name in AI_BACKENDS) if mode == "eager" else ""
+    result = subprocess.run([sys.executable, "-c", CHILD, preload, mode], env={**env, "AI_BACKEND": backend},
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per backend and mode")
+    parser.add_argument("--backends", nargs="+", default=list(AIBackends), choices=list(AI_BACKENDS),
+                        help="AI backends to start")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+        EnvironmentVariables.OPENAI_API_KEY_VARIABLE: "bench",
+        EnvironmentVariables.DB_BACKEND_VARIABLE: "memory",
+        EnvironmentVariables.LOG_FILE_VARIABLE: "",
+    }
+
+    print(f"{'backend':<12} {'mode':<6} {'import ms':>10} {'first ms':>10} {'second ms':>10} {'ready ms':>10}")
+    for backend in args.backends:
+        for mode in MODES:
+            runs = [run_worker(backend, mode, env) for _ in range(args.runs)]
+            stats = {name: summarize([run[name] for run in runs])["p50"] for name in ("import", "first", "second")}
+            print(f"{backend:<12} {mode:<6} {stats['import']:>10.1f} {stats['first']:>10.1f} "
+                  f"{stats['second']:>10.1f} {stats['import'] + stats['first']:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
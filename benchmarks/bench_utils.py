@@ -0,0 +1,34 @@
+"""Shared helpers for the benchmark scripts."""
+import statistics
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Returns the given percentile of a list of samples (nearest rank).
+
+    Args:
+        samples: The measured samples
+        pct: The percentile to compute (0-100)
+
+    Returns:
+        The percentile value
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summarizes latency samples.
+
+    Args:
+        samples: The measured samples in milliseconds
+
+    Returns:
+        The mean, p50, p95 and p99 of the samples
+    """
+    return {
+        "mean": statistics.mean(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
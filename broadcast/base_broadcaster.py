@@ -0,0 +1,46 @@
+from abc import ABC, abstractmethod
+from queue import Queue
+
+from models.message import DEFAULT_CONVERSATION_ID
+
+# Delivered to every subscriber once the broadcaster is closed; nothing else follows it
+CLOSED = object()
+
+
+class BaseBroadcaster(ABC):
+    """Class that defines an interface for pushing new messages to connected clients"""
+
+    @abstractmethod
+    def publish(self, message: dict):  # pragma: no cover
+        """Publish a newly inserted message to the subscribers of its conversation.
+
+        Args:
+            message: The message that was inserted
+        """
+        pass
+
+    @abstractmethod
+    def subscribe(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> Queue:  # pragma: no cover
+        """Register a new subscriber to a conversation.
+
+        Args:
+            conversation_id: The conversation whose messages are delivered
+
+        Returns:
+            The queue that published messages are delivered to
+        """
+        pass
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Queue):  # pragma: no cover
+        """Remove a subscriber.
+
+        Args:
+            subscription: The queue returned by subscribe
+        """
+        pass
+
+    def close(self):
+        """Release any background resources held by the broadcaster and wake every subscriber with CLOSED, so that
+        streams end instead of waiting for messages that will not come."""
+        pass
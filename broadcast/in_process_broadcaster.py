@@ -0,0 +1,116 @@
+import logging
+import threading
+from queue import Empty, Full, Queue
+
+from broadcast.base_broadcaster import CLOSED, BaseBroadcaster
+from config.constants import Constants
+from models.message import DEFAULT_CONVERSATION_ID
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class InProcessBroadcaster(BaseBroadcaster):
+    """Broadcaster that fans messages out to the subscribers of the current process.
+
+    Subscribers are grouped by conversation, so delivering a message only touches the subscribers of its conversation.
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE):
+        """Initializes an in-process broadcaster
+
+        Args:
+            queue_size: The maximum number of undelivered messages buffered per subscriber
+        """
+        self.queue_size = queue_size
+        # conversation id -> subscriber queues
+        self._subscribers: dict[str, set[Queue]] = {}
+        # subscriber queue -> conversation id
+        self._conversations: dict[Queue, str] = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def publish(self, message: dict):
+        """Publish a newly inserted message to the subscribers of its conversation.
+
+        Args:
+            message: The message that was inserted
+        """
+        self._fan_out(message)
+
+    def subscribe(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> Queue:
+        """Register a new subscriber to a conversation.
+
+        Args:
+            conversation_id: The conversation whose messages are delivered
+
+        Returns:
+            The queue that published messages are delivered to (holding only CLOSED once the broadcaster is closed)
+        """
+        subscription = Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self._closed:
+                subscription.put_nowait(CLOSED)
+                return subscription
+            self._subscribers.setdefault(conversation_id, set()).add(subscription)
+            self._conversations[subscription] = conversation_id
+        return subscription
+
+    def unsubscribe(self, subscription: Queue):
+        """Remove a subscriber.
+
+        Args:
+            subscription: The queue returned by subscribe
+        """
+        with self._lock:
+            conversation_id = self._conversations.pop(subscription, None)
+            if conversation_id is None:
+                return
+            subscribers = self._subscribers[conversation_id]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[conversation_id]
+
+    def close(self):
+        """Wakes every subscriber with CLOSED, so that streams end instead of waiting for messages.
+
+        A subscriber whose queue is full loses its oldest undelivered messages to make room, as its stream is ending.
+        """
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._conversations)
+        for subscription in subscribers:
+            while True:
+                try:
+                    subscription.put_nowait(CLOSED)
+                    break
+                except Full:
+                    try:
+                        subscription.get_nowait()
+                    except Empty:
+                        pass
+
+    def subscriber_count(self) -> int:
+        """Counts the connected subscribers.
+
+        Returns:
+            The number of subscribers
+        """
+        with self._lock:
+            return len(self._conversations)
+
+    def _fan_out(self, message: dict):
+        """Delivers a message to the local subscribers of its conversation without blocking on slow consumers.
+
+        Args:
+            message: The message to deliver (without a conversation id, it belongs to the default conversation)
+        """
+        conversation_id = message.get(Constants.CONVERSATION_ID_FIELD) or DEFAULT_CONVERSATION_ID
+        with self._lock:
+            subscribers = list(self._subscribers.get(conversation_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except Full:
+                logger.warning("Dropping message for slow stream subscriber")
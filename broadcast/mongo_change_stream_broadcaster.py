@@ -0,0 +1,96 @@
+import logging
+import threading
+from queue import Queue
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from broadcast.in_process_broadcaster import DEFAULT_SUBSCRIBER_QUEUE_SIZE, InProcessBroadcaster
+from config.constants import Constants
+from models.message import DEFAULT_CONVERSATION_ID
+
+logger = logging.getLogger(__name__)
+
+# The projection is applied by the server, so inserted documents arrive without their _id
+INSERT_PIPELINE = [
+    {"$match": {"operationType": "insert"}},
+    {"$project": {f"fullDocument.{Constants.ID_FIELD}": 0}},
+]
+MAX_AWAIT_TIME_MS = 1000
+RETRY_DELAY_SECONDS = 1.0
+
+
+class MongoChangeStreamBroadcaster(InProcessBroadcaster):
+    """Broadcaster that follows a MongoDB change stream, so inserts made by any replica reach every subscriber.
+
+    Change streams require MongoDB to run as a replica set (a single-node replica set is enough).
+    """
+
+    def __init__(self, collection: Collection, queue_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE):
+        """Initializes a change stream broadcaster
+
+        Args:
+            collection: The messages collection to watch
+            queue_size: The maximum number of undelivered messages buffered per subscriber
+        """
+        super().__init__(queue_size)
+        self.collection = collection
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def publish(self, message: dict):
+        """No-op: the insert itself is delivered through the change stream.
+
+        Args:
+            message: The message that was inserted
+        """
+        pass
+
+    def subscribe(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> Queue:
+        """Register a new subscriber to a conversation, starting the change stream watcher on first use.
+
+        Args:
+            conversation_id: The conversation whose messages are delivered
+
+        Returns:
+            The queue that published messages are delivered to
+        """
+        subscription = super().subscribe(conversation_id)
+        self._ensure_watcher()
+        return subscription
+
+    def close(self):
+        """Wakes every subscriber with CLOSED and stops the change stream watcher."""
+        super().close()
+        with self._watcher_lock:
+            self._stop_event.set()
+            watcher = self._watcher
+        if watcher is not None:
+            watcher.join()
+
+    def _ensure_watcher(self):
+        """Starts the background watcher thread if it is not already running and the broadcaster is not closed."""
+        with self._watcher_lock:
+            if self._closed:
+                return
+            if self._watcher is None or not self._watcher.is_alive():
+                self._stop_event.clear()
+                self._watcher = threading.Thread(target=self._watch, name="mongo-change-stream", daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        """Follows inserts on the collection and fans them out, resuming after errors."""
+        resume_token = None
+        while not self._stop_event.is_set():
+            try:
+                with self.collection.watch(INSERT_PIPELINE, resume_after=resume_token,
+                                           max_await_time_ms=MAX_AWAIT_TIME_MS) as stream:
+                    while not self._stop_event.is_set() and stream.alive:
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is not None:
+                            self._fan_out(change["fullDocument"])
+            except PyMongoError as e:
+                logger.error(f"Error following message change stream: {str(e)}")
+                self._stop_event.wait(RETRY_DELAY_SECONDS)
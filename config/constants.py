@@ -3,41 +3,219 @@ from enum import Enum, IntEnum, StrEnum
 
 class AppConfig(Enum):
     """Defines Flask application related configuration constants"""
+    AI_BACKEND = "dummy"
+    AI_CACHE_MAX_BYTES = "10485760"
+    AI_CACHE_MAX_ENTRIES = "1000"
+    AI_CACHE_TTL = "3600"
+    AI_CONTEXT_TOKENS = "2000"
+    AI_MAX_CONCURRENCY = "16"
+    AI_MAX_QUEUE = "16"
+    AI_QUEUE_TIMEOUT = "30"
+    AI_RETRY_AFTER = "5"
     APP_HOST = "127.0.0.1"
     APP_PORT = 5000
+    BROADCASTER = "in_process"
+    COMPRESS_MIN_SIZE = "1024"
+    DB_BACKEND = "mongo"
+    DEFAULT_CONVERSATION_ID = "default"
+    GRACEFUL_TIMEOUT = "30"
+    HISTORY_CACHE_MAX_CONVERSATIONS = "1000"
+    HISTORY_CACHE_TTL = "5"
+    LOG_BACKUP_COUNT = "5"
+    LOG_FILE = "chat_app.log"
+    LOG_MAX_BODY_CHARS = "200"
+    LOG_MAX_BYTES = "10485760"
+    LOG_QUEUE_SIZE = "10000"
+    LOG_SAMPLE_RATE = "1.0"
     MAX_MESSAGES = "100"
+    OPENAI_CONNECT_TIMEOUT = "5"
+    OPENAI_KEEPALIVE_EXPIRY = "60"
+    OPENAI_MAX_CONNECTIONS = "20"
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = "10"
+    OPENAI_TIMEOUT = "60"
+    PAGE_MAX_AGE = "300"
+    RETENTION_INTERVAL = "5"
+    RETENTION_MAX_OVERSHOOT = "10"
+    RETENTION_SCHEDULE = "background"
+    SQLITE_PATH = "chat_app.db"
+    STREAM_KEEPALIVE_SECONDS = 15
+    STREAM_MAX_SUBSCRIBERS = "24"
+    WORKERS = "0"
+    WORKER_THREADS = "64"
+    WRITE_BEHIND_BATCH_SIZE = "100"
+    WRITE_BEHIND_FLUSH_INTERVAL = "0.05"
 
 
 class Constants(StrEnum):
     """Defines field constants"""
+    AFTER_FIELD = "after"
+    AI_BACKEND_FIELD = "AI_BACKEND"
+    AI_CACHE_COLLECTION = "ai_responses"
+    AI_CACHE_FIELD = "AI_CACHE"
+    AI_CACHE_MAX_BYTES_FIELD = "AI_CACHE_MAX_BYTES"
+    AI_CACHE_MAX_ENTRIES_FIELD = "AI_CACHE_MAX_ENTRIES"
+    AI_CACHE_SHARED_FIELD = "AI_CACHE_SHARED"
+    AI_CACHE_TTL_FIELD = "AI_CACHE_TTL"
+    AI_CONTEXT_TOKENS_FIELD = "AI_CONTEXT_TOKENS"
+    AI_MAX_CONCURRENCY_FIELD = "AI_MAX_CONCURRENCY"
+    AI_MAX_QUEUE_FIELD = "AI_MAX_QUEUE"
+    AI_QUEUE_TIMEOUT_FIELD = "AI_QUEUE_TIMEOUT"
+    AI_RETRY_AFTER_FIELD = "AI_RETRY_AFTER"
+    AI_SINGLE_FLIGHT_FIELD = "AI_SINGLE_FLIGHT"
+    BROADCASTER_FIELD = "BROADCASTER"
+    COMPRESS_MIN_SIZE_FIELD = "COMPRESS_MIN_SIZE"
     CONTENT_FIELD = "content"
+    CONVERSATION_ID_FIELD = "conversation_id"
+    COUNTERS_COLLECTION = "counters"
+    DB_BACKEND_FIELD = "DB_BACKEND"
     DEBUG_FIELD = "DEBUG"
     ERROR_FIELD = "error"
+    EXPIRES_AT_FIELD = "expires_at"
+    HISTORY_CACHE_FIELD = "HISTORY_CACHE"
+    HISTORY_CACHE_MAX_CONVERSATIONS_FIELD = "HISTORY_CACHE_MAX_CONVERSATIONS"
+    HISTORY_CACHE_TTL_FIELD = "HISTORY_CACHE_TTL"
     ID_FIELD = "_id"
+    LIMIT_FIELD = "limit"
+    LOCKS_COLLECTION = "locks"
+    LOG_BACKUP_COUNT_FIELD = "LOG_BACKUP_COUNT"
+    LOG_FILE_FIELD = "LOG_FILE"
+    LOG_MAX_BODY_CHARS_FIELD = "LOG_MAX_BODY_CHARS"
+    LOG_MAX_BYTES_FIELD = "LOG_MAX_BYTES"
+    LOG_QUEUE_SIZE_FIELD = "LOG_QUEUE_SIZE"
+    LOG_REMOTE_AUTHORIZATION_FIELD = "LOG_REMOTE_AUTHORIZATION"
+    LOG_REMOTE_URL_FIELD = "LOG_REMOTE_URL"
+    LOG_SAMPLE_RATE_FIELD = "LOG_SAMPLE_RATE"
     MAX_MESSAGES_FIELD = "MAX_MESSAGES"
     MESSAGE_FIELD = "message"
+    MESSAGES_COLLECTION = "messages"
     MONGO_URI_FIELD = "MONGO_URI"
+    NEXT_CURSOR_HEADER = "X-Next-Cursor"
+    OWNER_FIELD = "owner"
+    PAGE_MAX_AGE_FIELD = "PAGE_MAX_AGE"
     PORT_FIELD = "PORT"
+    RESPONSE_FIELD = "response"
+    RETENTION_INTERVAL_FIELD = "RETENTION_INTERVAL"
+    RETENTION_MAX_OVERSHOOT_FIELD = "RETENTION_MAX_OVERSHOOT"
+    RETENTION_SCHEDULE_FIELD = "RETENTION_SCHEDULE"
     ROLE_FIELD = "role"
+    SEQ_FIELD = "seq"
+    SQLITE_PATH_FIELD = "SQLITE_PATH"
     STATUS_FIELD = "status"
+    STREAM_FIELD = "stream"
+    STREAM_MAX_SUBSCRIBERS_FIELD = "STREAM_MAX_SUBSCRIBERS"
     SUCCESS_FIELD = "success"
     TESTING_FIELD = "TESTING"
     TIMESTAMP_FIELD = "timestamp"
     USER_FIELD = "user"
+    WRITE_BEHIND_BATCH_SIZE_FIELD = "WRITE_BEHIND_BATCH_SIZE"
+    WRITE_BEHIND_FIELD = "WRITE_BEHIND"
+    WRITE_BEHIND_FLUSH_INTERVAL_FIELD = "WRITE_BEHIND_FLUSH_INTERVAL"
+
+
+class AIBackends(StrEnum):
+    """Defines the AI models that can be selected with AI_BACKEND (see ai/registry.py)"""
+    # Canned responses, for development, tests and benchmarks
+    DUMMY = "dummy"
+    # OpenAI's GPT-4o mini (requires OPEN_AI_API_KEY)
+    GPT_4O_MINI = "gpt-4o-mini"
+
+
+class BroadcasterTypes(StrEnum):
+    """Defines the supported new message broadcasters"""
+    # Pushes only to stream clients connected to the same process
+    IN_PROCESS = "in_process"
+    # Follows a MongoDB change stream so inserts from every replica are pushed
+    MONGO_CHANGE_STREAM = "mongo_change_stream"
+
+
+class DbBackends(StrEnum):
+    """Defines the supported message stores"""
+    # MongoDB, shared by every replica
+    MONGO = "mongo"
+    # Process-local ring buffers (single-node demos, tests and benchmarks)
+    MEMORY = "memory"
+    # A local SQLite file in WAL mode (single-box installs without a MongoDB server)
+    SQLITE = "sqlite"
 
 
 class EnvironmentVariables(StrEnum):
     """Defines environment variable name constants"""
+    AI_BACKEND_VARIABLE = "AI_BACKEND"
+    AI_CACHE_MAX_BYTES_VARIABLE = "AI_CACHE_MAX_BYTES"
+    AI_CACHE_MAX_ENTRIES_VARIABLE = "AI_CACHE_MAX_ENTRIES"
+    AI_CACHE_SHARED_VARIABLE = "AI_CACHE_SHARED"
+    AI_CACHE_TTL_VARIABLE = "AI_CACHE_TTL"
+    AI_CACHE_VARIABLE = "AI_CACHE"
+    AI_CONTEXT_TOKENS_VARIABLE = "AI_CONTEXT_TOKENS"
+    AI_MAX_CONCURRENCY_VARIABLE = "AI_MAX_CONCURRENCY"
+    AI_MAX_QUEUE_VARIABLE = "AI_MAX_QUEUE"
+    AI_QUEUE_TIMEOUT_VARIABLE = "AI_QUEUE_TIMEOUT"
+    AI_RETRY_AFTER_VARIABLE = "AI_RETRY_AFTER"
+    AI_SINGLE_FLIGHT_VARIABLE = "AI_SINGLE_FLIGHT"
     APP_HOST_VARIABLE = "APP_HOST"
+    BROADCASTER_VARIABLE = "BROADCASTER"
+    COMPRESS_MIN_SIZE_VARIABLE = "COMPRESS_MIN_SIZE"
+    DB_BACKEND_VARIABLE = "DB_BACKEND"
     DEBUG_VARIABLE = "DEBUG"
+    GRACEFUL_TIMEOUT_VARIABLE = "GRACEFUL_TIMEOUT"
+    HISTORY_CACHE_MAX_CONVERSATIONS_VARIABLE = "HISTORY_CACHE_MAX_CONVERSATIONS"
+    HISTORY_CACHE_TTL_VARIABLE = "HISTORY_CACHE_TTL"
+    HISTORY_CACHE_VARIABLE = "HISTORY_CACHE"
+    LOG_BACKUP_COUNT_VARIABLE = "LOG_BACKUP_COUNT"
+    LOG_FILE_VARIABLE = "LOG_FILE"
+    LOG_MAX_BODY_CHARS_VARIABLE = "LOG_MAX_BODY_CHARS"
+    LOG_MAX_BYTES_VARIABLE = "LOG_MAX_BYTES"
+    LOG_QUEUE_SIZE_VARIABLE = "LOG_QUEUE_SIZE"
+    LOG_REMOTE_AUTHORIZATION_VARIABLE = "LOG_REMOTE_AUTHORIZATION"
+    LOG_REMOTE_URL_VARIABLE = "LOG_REMOTE_URL"
+    LOG_SAMPLE_RATE_VARIABLE = "LOG_SAMPLE_RATE"
     MAX_MESSAGES_VARIABLE = "MAX_MESSAGES"
     MONGO_URI_VARIABLE = "MONGO_URI"
     OPENAI_API_KEY_VARIABLE = "OPEN_AI_API_KEY"
+    OPENAI_CONNECT_TIMEOUT_VARIABLE = "OPENAI_CONNECT_TIMEOUT"
+    OPENAI_KEEPALIVE_EXPIRY_VARIABLE = "OPENAI_KEEPALIVE_EXPIRY"
+    OPENAI_MAX_CONNECTIONS_VARIABLE = "OPENAI_MAX_CONNECTIONS"
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS_VARIABLE = "OPENAI_MAX_KEEPALIVE_CONNECTIONS"
+    OPENAI_TIMEOUT_VARIABLE = "OPENAI_TIMEOUT"
+    PAGE_MAX_AGE_VARIABLE = "PAGE_MAX_AGE"
     PORT_VARIABLE = "PORT"
+    PROMETHEUS_MULTIPROC_DIR_VARIABLE = "PROMETHEUS_MULTIPROC_DIR"
+    RETENTION_INTERVAL_VARIABLE = "RETENTION_INTERVAL"
+    RETENTION_MAX_OVERSHOOT_VARIABLE = "RETENTION_MAX_OVERSHOOT"
+    RETENTION_SCHEDULE_VARIABLE = "RETENTION_SCHEDULE"
+    SQLITE_PATH_VARIABLE = "SQLITE_PATH"
+    STREAM_MAX_SUBSCRIBERS_VARIABLE = "STREAM_MAX_SUBSCRIBERS"
+    WORKER_THREADS_VARIABLE = "WORKER_THREADS"
+    WORKERS_VARIABLE = "WORKERS"
+    WRITE_BEHIND_BATCH_SIZE_VARIABLE = "WRITE_BEHIND_BATCH_SIZE"
+    WRITE_BEHIND_FLUSH_INTERVAL_VARIABLE = "WRITE_BEHIND_FLUSH_INTERVAL"
+    WRITE_BEHIND_VARIABLE = "WRITE_BEHIND"
+
+
+class MetricStages(StrEnum):
+    """Defines the stages of handling a chat request whose durations are exposed on /metrics"""
+    VALIDATE = "validate"
+    SANITIZE = "sanitize"
+    CONTEXT = "context"
+    AI = "ai"
+    INSERT = "insert"
+    TRIM = "trim"
+    HISTORY_READ = "history_read"
+    HISTORY_ENCODE = "history_encode"
+
+
+class RetentionSchedules(StrEnum):
+    """Defines when the messages beyond MAX_MESSAGES of a conversation are deleted"""
+    # On the request thread, after every write
+    INLINE = "inline"
+    # From a background scheduler, periodically or once a conversation is RETENTION_MAX_OVERSHOOT writes over
+    BACKGROUND = "background"
 
 
 class StatusCodes(IntEnum):
     """Defines request status codes as constants"""
     SUCCESS_CODE = 200
+    NOT_MODIFIED_CODE = 304
     BAD_REQUEST_ERROR_CODE = 400
     INTERNAL_SERVER_ERROR_CODE = 500
+    SERVICE_UNAVAILABLE_CODE = 503
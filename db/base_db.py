@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 
-from models.message import Message
+from config.constants import Constants
+from models.message import DEFAULT_CONVERSATION_ID, Message
 
 
 class BaseDb(ABC):
@@ -17,12 +18,35 @@ class BaseDb(ABC):
         """
         pass
 
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Insert several messages into the database, in order.
+
+        The default implementation inserts them one at a time; backends with a bulk write should override it.
+
+        Args:
+            messages: The messages to be inserted
+
+        Returns:
+            Whether every insertion was successful
+        """
+        return all([self.insert_message(message) for message in messages])
+
     @abstractmethod
-    def retrieve_messages(self) -> list:  # pragma: no cover
-        """ Retrieve all messages from the database.
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list:  # pragma: no cover
+        """ Retrieve the messages of a conversation from the database.
+
+        Messages are returned oldest first, without their database id. When a position is given, only messages after
+        it are returned: those with a later timestamp, and those with the same timestamp beyond the first `seen`
+        (see utils.message_utils.history_position).
+
+        Args:
+            after: The (timestamp, seen) position to resume after
+            limit: The maximum number of messages to return
+            conversation_id: The conversation to read
 
         Returns:
-            A list of messages
+            A list of messages (dicts of the message fields)
         """
         pass
 
@@ -32,8 +56,11 @@ class BaseDb(ABC):
         pass
 
     @abstractmethod
-    def count_messages(self) -> int:  # pragma: no cover
-        """Counts the number of messages in the database.
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:  # pragma: no cover
+        """Counts the number of messages of a conversation.
+
+        Args:
+            conversation_id: The conversation to count
 
         Returns:
             The number of messages
@@ -41,8 +68,13 @@ class BaseDb(ABC):
         pass
 
     @abstractmethod
-    def get_nth_newest(self) -> list:  # pragma: no cover
-        """Get the nth newest message in the database.
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID,
+                       max_messages: int | None = None) -> list:  # pragma: no cover
+        """Get the nth newest message of a conversation.
+
+        Args:
+            conversation_id: The conversation to look in
+            max_messages: The number of newer messages (defaults to the configured MAX_MESSAGES)
 
         Returns:
             The nth newest message
@@ -50,10 +82,28 @@ class BaseDb(ABC):
         pass
 
     @abstractmethod
-    def delete_messages_by_timestamp(self, timestamp: datetime):  # pragma: no cover
-        """Delete all messages from the database before a given cutoff timestamp.
+    def delete_messages_by_timestamp(self, timestamp: datetime,
+                                     conversation_id: str = DEFAULT_CONVERSATION_ID):  # pragma: no cover
+        """Delete all messages of a conversation before a given cutoff timestamp.
 
         Args:
             timestamp: The cutoff timestamp
+            conversation_id: The conversation to delete from
         """
         pass
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete the oldest messages of a conversation so that at most max_messages remain in it.
+
+        The default implementation counts the messages, looks up the nth newest message and deletes everything at or
+        before its timestamp. Backends that can bound the conversation more cheaply should override this.
+
+        Args:
+            max_messages: The maximum number of messages to retain
+            conversation_id: The conversation to trim
+        """
+        if self.count_messages(conversation_id) > max_messages:
+            nth_newest = self.get_nth_newest(conversation_id, max_messages)
+            if nth_newest:
+                cutoff_timestamp = nth_newest[0][Constants.TIMESTAMP_FIELD]
+                self.delete_messages_by_timestamp(cutoff_timestamp, conversation_id)
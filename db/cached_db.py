@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from itertools import takewhile
+from typing import Callable, TypeVar
+
+from prometheus_client import Counter, Gauge
+
+from config.constants import Constants
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+from utils.message_utils import utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 5.0
+DEFAULT_MAX_CONVERSATIONS = 1000
+
+# Each worker process has its own cache; with several workers, /metrics adds them up
+HISTORY_CACHE_HITS = Counter("chat_history_cache_hits", "History reads answered from the history cache")
+HISTORY_CACHE_MISSES = Counter("chat_history_cache_misses",
+                               "History reads that reloaded the history cache or fell through to the message store")
+HISTORY_CACHE_CONVERSATIONS = Gauge("chat_history_cache_conversations", "Conversations held in the history cache",
+                                    multiprocess_mode="livesum")
+
+T = TypeVar("T")
+
+
+class _History:
+    """The cached newest messages of one conversation"""
+
+    def __init__(self):
+        self.entries: deque | None = None
+        self.loaded_at = 0.0
+        self.version = 0
+        self.snapshot: tuple[int, object] | None = None
+        # Held while the history is read or reloaded, so that conversations never wait on each other's reloads
+        self.lock = threading.Lock()
+
+
+class CachedDb(BaseDb):
+    """BaseDb decorator that serves each conversation's history from an in-process ring buffer of its newest messages.
+
+    Each buffer holds at most max_messages entries, so it never grows beyond the retained history, and only the
+    max_conversations most recently used conversations are kept. Messages written through this instance are appended
+    to their conversation's buffer directly. Writes made by other replicas are picked up by reloading a buffer from the
+    wrapped database once it is older than ttl seconds, which bounds staleness.
+
+    Derived views of a conversation's full history (e.g. its encoded HTTP response) can be memoized with snapshot();
+    they are only rebuilt when that history changes.
+    """
+
+    def __init__(self, db: BaseDb, max_messages: int, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        """Initializes an empty (cold) history cache
+
+        Args:
+            db: The database to cache
+            max_messages: The number of newest messages to keep per conversation
+            ttl: The maximum age in seconds of a cached history before it is reloaded
+            max_conversations: The number of conversations to keep
+        """
+        self.db = db
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.hits = 0
+        self.misses = 0
+        # conversation id -> cached history, least recently used first
+        self._histories: OrderedDict[str, _History] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def insert_message(self, message: Message) -> bool:
+        return self.insert_messages([message])
+
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Insert messages into the wrapped database and, if that succeeded, append them to the cached histories.
+
+        A history reloaded between the insert and the append already holds the messages, so messages at or before its
+        newest position are not appended again.
+
+        Args:
+            messages: The messages to be inserted
+
+        Returns:
+            Whether the insertion was successful
+        """
+        result = self.db.insert_messages(messages)
+        if not result:
+            return result
+        for conversation_id in dict.fromkeys(message.conversation_id for message in messages):
+            with self._lock:
+                history = self._histories.get(conversation_id)
+            if history is None:
+                continue
+            with history.lock:
+                if history.entries is not None:
+                    documents = self._unseen(history.entries, [dict(message) for message in messages
+                                                               if message.conversation_id == conversation_id])
+                    if documents:
+                        history.entries.extend(documents)
+                        history.version += 1
+        return result
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list:
+        """Retrieve the messages of a conversation, from the cache whenever it can answer the request.
+
+        Requests after a position that is no longer (or not yet) cached fall through to the wrapped database.
+
+        Args:
+            after: The (timestamp, seen) position to resume after
+            limit: The maximum number of messages to return
+            conversation_id: The conversation to read
+
+        Returns:
+            A list of messages
+        """
+        history = self._history(conversation_id)
+        with history.lock:
+            hit = self._refresh(history, conversation_id)
+            documents = list(history.entries)
+
+        if after is not None:
+            documents = self._after(documents, after)
+            if documents is None:
+                self._count(False)
+                return self.db.retrieve_messages(after=after, limit=limit, conversation_id=conversation_id)
+
+        self._count(hit)
+        return documents[:limit] if limit is not None else documents
+
+    def snapshot(self, build: Callable[[list], T], conversation_id: str = DEFAULT_CONVERSATION_ID) -> T:
+        """Returns a view of a conversation's full history, built only when that history has changed since the last
+        call.
+
+        Args:
+            build: Builds the view from the list of messages (called with the conversation's lock held)
+            conversation_id: The conversation to view
+
+        Returns:
+            The (possibly memoized) view
+        """
+        history = self._history(conversation_id)
+        with history.lock:
+            self._count(self._refresh(history, conversation_id))
+            if history.snapshot is None or history.snapshot[0] != history.version:
+                history.snapshot = (history.version, build(list(history.entries)))
+            return history.snapshot[1]
+
+    def clear_messages(self):
+        self.db.clear_messages()
+        self.invalidate()
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        return self.db.count_messages(conversation_id)
+
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID, max_messages: int | None = None) -> list:
+        return self.db.get_nth_newest(conversation_id, max_messages)
+
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        self.db.delete_messages_by_timestamp(timestamp, conversation_id)
+        self.invalidate(conversation_id)
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        # The ring buffers already drop anything older than the newest max_messages
+        self.db.enforce_retention(max_messages, conversation_id)
+
+    def invalidate(self, conversation_id: str | None = None):
+        """Drop cached histories so that the next read reloads them.
+
+        Args:
+            conversation_id: The conversation to drop, or None for every conversation
+        """
+        with self._lock:
+            if conversation_id is None:
+                self._histories.clear()
+            else:
+                self._histories.pop(conversation_id, None)
+            HISTORY_CACHE_CONVERSATIONS.set(len(self._histories))
+
+    def cache_stats(self) -> dict:
+        """Reports the cache hit/miss counters.
+
+        Returns:
+            The hits, misses and hit rate of history reads, and the number of cached conversations
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "conversations": len(self._histories)}
+
+    def _history(self, conversation_id: str) -> _History:
+        """Returns the cached history of a conversation, adding it (cold) and evicting the least recently used
+        conversations if needed."""
+        with self._lock:
+            history = self._histories.get(conversation_id)
+            if history is None:
+                history = self._histories[conversation_id] = _History()
+                while len(self._histories) > self.max_conversations:
+                    self._histories.popitem(last=False)
+                HISTORY_CACHE_CONVERSATIONS.set(len(self._histories))
+            else:
+                self._histories.move_to_end(conversation_id)
+            return history
+
+    def _refresh(self, history: _History, conversation_id: str) -> bool:
+        """Reloads a cached history if it is cold or expired (its lock must be held).
+
+        Returns:
+            Whether the cached history could be used as it was
+        """
+        if history.entries is not None and time.monotonic() - history.loaded_at <= self.ttl:
+            return True
+        messages = self.db.retrieve_messages(conversation_id=conversation_id)
+        history.entries = deque(messages[-self.max_messages:], maxlen=self.max_messages)
+        history.loaded_at = time.monotonic()
+        history.version += 1
+        logger.info(f"Loaded {len(history.entries)} messages of conversation {conversation_id} into the history cache")
+        return False
+
+    def _count(self, hit: bool):
+        """Records a cache hit or miss."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+                HISTORY_CACHE_HITS.inc()
+            else:
+                self.misses += 1
+                HISTORY_CACHE_MISSES.inc()
+
+    @staticmethod
+    def _unseen(entries: deque, documents: list[dict]) -> list[dict]:
+        """Returns the documents that are not in a cached history yet.
+
+        The history is newest last, so a document is already there if it is older than its newest entry, or stamped
+        like it and equal to one of the entries with that timestamp.
+        """
+        if not entries:
+            return documents
+        newest = utc_timestamp(entries[-1][Constants.TIMESTAMP_FIELD])
+        latest = [(entry[Constants.USER_FIELD], entry[Constants.MESSAGE_FIELD]) for entry in takewhile(
+            lambda entry: utc_timestamp(entry[Constants.TIMESTAMP_FIELD]) == newest, reversed(entries))]
+        unseen = []
+        for document in documents:
+            timestamp = utc_timestamp(document[Constants.TIMESTAMP_FIELD])
+            if timestamp < newest:
+                continue
+            if timestamp == newest:
+                key = (document[Constants.USER_FIELD], document[Constants.MESSAGE_FIELD])
+                if key in latest:
+                    latest.remove(key)
+                    continue
+            unseen.append(document)
+        return unseen
+
+    @staticmethod
+    def _after(documents: list[dict], after: tuple[datetime, int]) -> list[dict] | None:
+        """Returns the cached documents after a position, or None if the cache cannot tell what follows it.
+
+        The cache can only answer if it holds every message stamped with the position's timestamp, i.e. if its
+        oldest message is older than the position.
+        """
+        timestamp, seen = utc_timestamp(after[0]), after[1]
+        timestamps = [utc_timestamp(document[Constants.TIMESTAMP_FIELD]) for document in documents]
+        if not timestamps or timestamps[0] >= timestamp:
+            return None
+        start = next((index for index, value in enumerate(timestamps) if value >= timestamp), len(timestamps))
+        if seen > timestamps[start:].count(timestamp):
+            return None
+        return documents[start + seen:]
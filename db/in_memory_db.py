@@ -0,0 +1,163 @@
+import bisect
+import threading
+from collections import deque
+from datetime import datetime
+
+from config.constants import Constants
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+from utils.message_utils import utc_timestamp
+
+
+def _sort_key(document: dict) -> datetime:
+    """Returns the timestamp a stored document is ordered by."""
+    return document[Constants.TIMESTAMP_FIELD]
+
+
+class InMemoryDb(BaseDb):
+    """Process-local message store that keeps each conversation in a fixed-capacity ring buffer.
+
+    A buffer holds at most capacity messages: appending to a full buffer drops its oldest message, so inserts and
+    retention are O(1). Documents are returned the way MongoDb returns them: without an _id, oldest first, and
+    timestamped with naive UTC datetimes of millisecond precision. Nothing is shared between processes or kept across
+    restarts, which makes it suitable for single-node demos, tests and benchmarks.
+    """
+
+    def __init__(self, capacity: int):
+        """Initializes an empty in-memory store
+
+        Args:
+            capacity: The maximum number of messages kept per conversation
+        """
+        self.capacity = capacity
+        # conversation id -> ring buffer of message documents, ordered by timestamp
+        self._conversations: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def insert_message(self, message: Message) -> bool:
+        return self.insert_messages([message])
+
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Insert messages into their conversations, dropping the oldest messages of full buffers.
+
+        Args:
+            messages: The messages to be inserted
+
+        Returns:
+            Whether the insertion was successful
+        """
+        with self._lock:
+            for message in messages:
+                entries = self._conversations.setdefault(message.conversation_id, deque(maxlen=self.capacity))
+                self._insert(entries, self._document(message))
+        return True
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list[dict]:
+        """Retrieves the messages of a conversation, oldest first (see MongoDb.retrieve_messages).
+
+        Args:
+            after: The (timestamp, seen) position to resume after
+            limit: The maximum number of messages to return
+            conversation_id: The conversation to read
+
+        Returns:
+            A list of messages (copies, so callers cannot modify the store)
+        """
+        with self._lock:
+            entries = self._conversations.get(conversation_id, ())
+            start = 0
+            if after is not None:
+                timestamp, seen = after
+                start = bisect.bisect_left(entries, self._naive(timestamp), key=_sort_key) + seen
+            stop = len(entries) if limit is None else min(len(entries), start + limit)
+            return [dict(entries[index]) for index in range(start, stop)]
+
+    def clear_messages(self):
+        """Clears the messages of every conversation."""
+        with self._lock:
+            self._conversations.clear()
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        with self._lock:
+            return len(self._conversations.get(conversation_id, ()))
+
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID,
+                       max_messages: int | None = None) -> list[dict]:
+        """Get the message of a conversation that has max_messages newer messages.
+
+        A buffer never holds more than capacity messages, so there is no such message for max_messages >= capacity.
+
+        Args:
+            conversation_id: The conversation to look in
+            max_messages: The number of newer messages (defaults to capacity)
+
+        Returns:
+            The nth newest message (projected to its timestamp), or an empty list
+        """
+        if max_messages is None:
+            max_messages = self.capacity
+        with self._lock:
+            entries = self._conversations.get(conversation_id, ())
+            if len(entries) <= max_messages:
+                return []
+            return [{Constants.TIMESTAMP_FIELD: entries[-max_messages - 1][Constants.TIMESTAMP_FIELD]}]
+
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete all messages of a conversation at or before a given cutoff timestamp.
+
+        Args:
+            timestamp: The cutoff timestamp
+            conversation_id: The conversation to delete from
+        """
+        cutoff = self._naive(timestamp)
+        with self._lock:
+            entries = self._conversations.get(conversation_id)
+            while entries and entries[0][Constants.TIMESTAMP_FIELD] <= cutoff:
+                entries.popleft()
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete the oldest messages of a conversation so that at most max_messages remain in it.
+
+        The ring buffer already drops everything beyond capacity on insert, so this only does work for smaller limits.
+
+        Args:
+            max_messages: The maximum number of messages to retain
+            conversation_id: The conversation to trim
+        """
+        with self._lock:
+            entries = self._conversations.get(conversation_id)
+            while entries and len(entries) > max_messages:
+                entries.popleft()
+
+    @staticmethod
+    def _insert(entries: deque, document: dict):
+        """Inserts a document in timestamp order (lock must be held).
+
+        Messages almost always arrive in order and are appended in O(1). A late message is inserted after those with
+        the same timestamp, and dropped if the buffer is full and it would be its oldest message.
+        """
+        timestamp = document[Constants.TIMESTAMP_FIELD]
+        if not entries or entries[-1][Constants.TIMESTAMP_FIELD] <= timestamp:
+            entries.append(document)
+            return
+        index = bisect.bisect_right(entries, timestamp, key=_sort_key)
+        if len(entries) == entries.maxlen:
+            if index == 0:
+                return
+            entries.popleft()
+            index -= 1
+        entries.insert(index, document)
+
+    @classmethod
+    def _document(cls, message: Message) -> dict:
+        """Returns the document MongoDb would store and return for a message."""
+        document = dict(message)
+        document[Constants.TIMESTAMP_FIELD] = cls._naive(message.timestamp)
+        return document
+
+    @staticmethod
+    def _naive(timestamp: datetime) -> datetime:
+        """Returns a timestamp as a naive UTC datetime truncated to milliseconds, like MongoDB stores it."""
+        timestamp = utc_timestamp(timestamp).replace(tzinfo=None)
+        return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
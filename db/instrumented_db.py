@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+from utils.metrics_utils import DB_CALL_SECONDS, timed
+
+
+class InstrumentedDb(BaseDb):
+    """BaseDb decorator that records the duration of every call to the wrapped store in chat_db_call_seconds.
+
+    It wraps the store itself (MongoDb, SqliteDb, ...), below any CachedDb or WriteBehindDb, so that only calls that
+    reach the store are measured.
+    """
+
+    def __init__(self, db: BaseDb):
+        """Initializes the decorator
+
+        Args:
+            db: The database to instrument
+        """
+        self.db = db
+
+    def insert_message(self, message: Message) -> bool:
+        with timed(DB_CALL_SECONDS, "insert_message"):
+            return self.db.insert_message(message)
+
+    def insert_messages(self, messages: list[Message]) -> bool:
+        with timed(DB_CALL_SECONDS, "insert_messages"):
+            return self.db.insert_messages(messages)
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list:
+        with timed(DB_CALL_SECONDS, "retrieve_messages"):
+            return self.db.retrieve_messages(after=after, limit=limit, conversation_id=conversation_id)
+
+    def clear_messages(self):
+        with timed(DB_CALL_SECONDS, "clear_messages"):
+            self.db.clear_messages()
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        with timed(DB_CALL_SECONDS, "count_messages"):
+            return self.db.count_messages(conversation_id)
+
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID, max_messages: int | None = None) -> list:
+        with timed(DB_CALL_SECONDS, "get_nth_newest"):
+            return self.db.get_nth_newest(conversation_id, max_messages)
+
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        with timed(DB_CALL_SECONDS, "delete_messages_by_timestamp"):
+            self.db.delete_messages_by_timestamp(timestamp, conversation_id)
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        with timed(DB_CALL_SECONDS, "enforce_retention"):
+            self.db.enforce_retention(max_messages, conversation_id)
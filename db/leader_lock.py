@@ -0,0 +1,81 @@
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from config.constants import Constants
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 60.0
+
+
+class LeaderLock(ABC):
+    """Classes that defines an interface for a lock held by at most one replica at a time"""
+
+    @abstractmethod
+    def acquire(self) -> bool:  # pragma: no cover
+        """
+        Try to take the lock without waiting.
+
+        Returns:
+            Whether this replica now holds the lock
+        """
+        pass
+
+    @abstractmethod
+    def release(self):  # pragma: no cover
+        """
+        Give up the lock if this replica holds it.
+        """
+        pass
+
+
+class MongoLeaderLock(LeaderLock):
+    """Lock shared between replicas through a lease document in a MongoDB collection.
+
+    The document's _id is the lock name, so claiming it is a single upsert on the primary key: it succeeds if the lock
+    is free, its lease has expired or this replica already holds it, and fails with a duplicate key error otherwise.
+    The lease bounds how long a crashed holder keeps the lock. Backend errors are logged and treated as the lock being
+    held elsewhere, so a replica never acts as leader without knowing it holds the lock.
+    """
+
+    def __init__(self, collection: Collection, name: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """Initializes the lock with an owner id unique to this instance
+
+        Args:
+            collection: The collection holding the lease documents
+            name: The name of the lock
+            lease_seconds: The number of seconds a holder keeps the lock without releasing it
+        """
+        self.collection = collection
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+
+    def acquire(self) -> bool:
+        now = datetime.now(tz=timezone.utc)
+        try:
+            self.collection.update_one(
+                {Constants.ID_FIELD: self.name,
+                 "$or": [{Constants.EXPIRES_AT_FIELD: {"$lte": now}}, {Constants.OWNER_FIELD: self.owner}]},
+                {"$set": {Constants.OWNER_FIELD: self.owner,
+                          Constants.EXPIRES_AT_FIELD: now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True)
+        except DuplicateKeyError:
+            # Another replica holds an unexpired lease
+            return False
+        except PyMongoError as e:
+            logger.error(f"Error acquiring the {self.name} lock: {str(e)}")
+            return False
+        return True
+
+    def release(self):
+        try:
+            self.collection.delete_one({Constants.ID_FIELD: self.name, Constants.OWNER_FIELD: self.owner})
+        except PyMongoError as e:
+            # The lease expires on its own
+            logger.error(f"Error releasing the {self.name} lock: {str(e)}")
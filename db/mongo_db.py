@@ -1,11 +1,99 @@
+import logging
+import threading
+from collections import Counter
 from datetime import datetime
 
 from flask import Flask
 from flask_pymongo import PyMongo
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.collection import Collection
 
 from config.constants import Constants
 from db.base_db import BaseDb
-from models.message import Message
+from models.message import DEFAULT_CONVERSATION_ID, Message
+
+logger = logging.getLogger(__name__)
+
+# Every query is scoped to one conversation and sorts or filters on timestamp; _id breaks ties so that the order of
+# equal timestamps is stable
+HISTORY_SORT = [(Constants.TIMESTAMP_FIELD, ASCENDING), (Constants.ID_FIELD, ASCENDING)]
+# Retention deletes a conversation's range of sequence numbers, which the conversation_seq index answers directly
+INDEXES = [
+    IndexModel([(Constants.CONVERSATION_ID_FIELD, ASCENDING)] + HISTORY_SORT, name="conversation_timestamp_id"),
+    IndexModel([(Constants.CONVERSATION_ID_FIELD, ASCENDING), (Constants.SEQ_FIELD, ASCENDING)],
+               name="conversation_seq"),
+]
+
+# Reads return only the message fields, so _id never leaves the database
+MESSAGE_PROJECTION = {
+    Constants.ID_FIELD: 0,
+    Constants.USER_FIELD: 1,
+    Constants.MESSAGE_FIELD: 1,
+    Constants.TIMESTAMP_FIELD: 1,
+    Constants.CONVERSATION_ID_FIELD: 1,
+}
+TIMESTAMP_PROJECTION = {Constants.ID_FIELD: 0, Constants.TIMESTAMP_FIELD: 1}
+
+
+def conversation_filter(conversation_id: str) -> dict:
+    """Returns the query matching the messages of a conversation.
+
+    Messages stored before conversations existed have no conversation_id and belong to the default conversation.
+
+    Args:
+        conversation_id: The conversation
+
+    Returns:
+        The query, which the conversation_timestamp_id index can answer
+    """
+    if conversation_id == DEFAULT_CONVERSATION_ID:
+        return {Constants.CONVERSATION_ID_FIELD: {"$in": [conversation_id, None]}}
+    return {Constants.CONVERSATION_ID_FIELD: conversation_id}
+
+
+def sequence_counts(messages: list[Message]) -> Counter:
+    """Returns how many sequence numbers each conversation needs to store the given messages."""
+    return Counter(message.conversation_id for message in messages)
+
+
+def sequenced_documents(messages: list[Message], first_seqs: dict[str, int]) -> list[dict]:
+    """Returns the documents storing the given messages, numbered in order within their conversations.
+
+    Args:
+        messages: The messages to store
+        first_seqs: The first sequence number reserved for each conversation
+
+    Returns:
+        The documents, each with its seq
+    """
+    next_seqs = dict(first_seqs)
+    documents = []
+    for message in messages:
+        documents.append({**dict(message), Constants.SEQ_FIELD: next_seqs[message.conversation_id]})
+        next_seqs[message.conversation_id] += 1
+    return documents
+
+
+def retention_filter(conversation_id: str, last_seq: int, max_messages: int) -> dict | None:
+    """Returns the query matching the messages of a conversation that are past its retention limit.
+
+    Messages stored before sequence numbers existed have no seq; they are older than every numbered message, so they
+    are past the limit as soon as any numbered message is.
+
+    Args:
+        conversation_id: The conversation to trim
+        last_seq: The last sequence number reserved for the conversation
+        max_messages: The maximum number of messages to retain
+
+    Returns:
+        The query, which the conversation_seq index can answer, or None when nothing is past the limit
+    """
+    cutoff = last_seq - max_messages
+    if cutoff <= 0:
+        return None
+    query = conversation_filter(conversation_id)
+    query["$or"] = [{Constants.SEQ_FIELD: {"$lte": cutoff}}, {Constants.SEQ_FIELD: None}]
+    return query
 
 
 class MongoDb(BaseDb):
@@ -23,6 +111,51 @@ class MongoDb(BaseDb):
         self.app = app
         self.mongo = PyMongo(app)
         self.db = self.mongo.db
+        self._indexes_ready = False
+        self._indexes_lock = threading.Lock()
+
+    @property
+    def messages(self) -> Collection:
+        """The messages collection, with its indexes created on first use.
+
+        Creating the indexes is deferred until the collection is first read or written, so that constructing the
+        database (and the app) does not need MongoDB to be reachable.
+        """
+        if not self._indexes_ready:
+            with self._indexes_lock:
+                if not self._indexes_ready:
+                    self._ensure_indexes()
+                    self._indexes_ready = True
+        return self.db.messages
+
+    def _ensure_indexes(self):
+        """Creates the indexes declared in INDEXES that do not exist yet.
+
+        Creating an existing index is a no-op, so this is safe to run in every worker and from every replica.
+        """
+        existing = {index["name"] for index in self.db.messages.list_indexes()}
+        self.db.messages.create_indexes(INDEXES)
+        for index in INDEXES:
+            if index.document["name"] not in existing:
+                logger.info(f"Created index {index.document['name']} on the {Constants.MESSAGES_COLLECTION} collection")
+
+    def _reserve_seqs(self, conversation_id: str, count: int) -> int:
+        """Reserves count consecutive sequence numbers in a conversation.
+
+        The conversation's counter is incremented atomically, so concurrent writers (in any worker or replica) never
+        share a number.
+
+        Args:
+            conversation_id: The conversation the numbers belong to
+            count: The number of sequence numbers to reserve
+
+        Returns:
+            The first reserved sequence number
+        """
+        counter = self.db[Constants.COUNTERS_COLLECTION].find_one_and_update(
+            {Constants.ID_FIELD: conversation_id}, {"$inc": {Constants.SEQ_FIELD: count}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        return counter[Constants.SEQ_FIELD] - count + 1
 
     def insert_message(self, message: Message) -> bool:
         """Insert a message into the database.
@@ -33,45 +166,119 @@ class MongoDb(BaseDb):
         Returns:
             Whether the insertion was successful.
         """
-        result = self.db.messages.insert_one(dict(message))
+        seq = self._reserve_seqs(message.conversation_id, 1)
+        result = self.messages.insert_one({**dict(message), Constants.SEQ_FIELD: seq})
         return result.acknowledged
 
-    def retrieve_messages(self) -> list[dict]:
-        """Retrieves all messages from the database.
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Insert several messages into the database in a single round trip (plus one per conversation to number them).
+
+        Args:
+            messages: The messages to be inserted.
 
         Returns:
-            A list of messages retrieved.
+            Whether the insertion was successful.
         """
-        messages = list(self.db.messages.find())
-        return messages
+        first_seqs = {conversation_id: self._reserve_seqs(conversation_id, count)
+                      for conversation_id, count in sequence_counts(messages).items()}
+        result = self.messages.insert_many(sequenced_documents(messages, first_seqs), ordered=True)
+        return result.acknowledged
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list[dict]:
+        """Retrieves the messages of a conversation from the database, oldest first.
+
+        Pagination is keyset based: the conversation_timestamp_id index is walked from the given position, so each
+        page costs the same regardless of how far into the history it is, or how many other conversations there are.
+        Only messages sharing the position's timestamp are skipped.
+
+        Args:
+            after: The (timestamp, seen) position to resume after (see utils.message_utils.history_position)
+            limit: The maximum number of messages to return
+            conversation_id: The conversation to read
+
+        Returns:
+            A list of messages retrieved (without _id).
+        """
+        query = conversation_filter(conversation_id)
+        if after is not None:
+            timestamp, seen = after
+            query[Constants.TIMESTAMP_FIELD] = {"$gte": timestamp}
+
+        cursor = self._history_cursor(query)
+        if after is not None:
+            cursor = cursor.skip(seen)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def _history_cursor(self, query: dict):
+        """Returns a sorted, projected cursor over the messages matching a query."""
+        return self.messages.find(query, MESSAGE_PROJECTION).sort(HISTORY_SORT)
 
     def clear_messages(self):
-        """Clears all messages from the database."""
-        self.db.messages.drop()
+        """Clears the messages of every conversation from the database."""
+        with self._indexes_lock:
+            self.db.messages.drop()
+            self._indexes_ready = False
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        """Counts the number of messages of a conversation.
 
-    def count_messages(self) -> int:
-        """Counts the number of messages in the database.
+        Only the conversation's range of the conversation_timestamp_id index is scanned.
+
+        Args:
+            conversation_id: The conversation to count
 
         Returns:
             The number of messages
         """
-        return self.db.messages.count_documents({})
+        return self.messages.count_documents(conversation_filter(conversation_id))
 
-    def get_nth_newest(self) -> list[dict]:
-        """Get the nth newest message in the database.
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID,
+                       max_messages: int | None = None) -> list[dict]:
+        """Get the nth newest message of a conversation.
+
+        Args:
+            conversation_id: The conversation to look in
+            max_messages: The number of newer messages (defaults to MAX_MESSAGES)
 
         Returns:
-            The nth newest message
+            The nth newest message (projected to its timestamp, which the index covers)
         """
-        docs = self.db.messages.find().sort(Constants.TIMESTAMP_FIELD, -1).skip(
-            self.app.config[Constants.MAX_MESSAGES_FIELD]).limit(1)
+        if max_messages is None:
+            max_messages = self.app.config[Constants.MAX_MESSAGES_FIELD]
+        return self._nth_newest(max_messages, conversation_id)
 
+    def _nth_newest(self, n: int, conversation_id: str) -> list[dict]:
+        """Returns the timestamp of the message of a conversation that has n newer messages, if there is one."""
+        docs = self.messages.find(conversation_filter(conversation_id), TIMESTAMP_PROJECTION).sort(
+            Constants.TIMESTAMP_FIELD, DESCENDING).skip(n).limit(1)
         return list(docs)
 
-    def delete_messages_by_timestamp(self, timestamp: datetime):
-        """Delete all messages from the database before a given cutoff timestamp.
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete all messages of a conversation before a given cutoff timestamp.
 
         Args:
             timestamp: The cutoff timestamp
+            conversation_id: The conversation to delete from
+        """
+        query = conversation_filter(conversation_id)
+        query[Constants.TIMESTAMP_FIELD] = {"$lte": timestamp}
+        self.messages.delete_many(query)
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete the oldest messages of a conversation so that at most max_messages remain in it.
+
+        The conversation's counter gives the sequence number of its newest message, so the cost is one point read plus
+        one range delete on the conversation_seq index, however long the conversation is. Unlike a timestamp cutoff,
+        messages sharing a timestamp with the last one retained are never deleted with it.
+
+        Args:
+            max_messages: The maximum number of messages to retain
+            conversation_id: The conversation to trim
         """
-        self.db.messages.delete_many({Constants.TIMESTAMP_FIELD: {"$lte": timestamp}})
+        counter = self.db[Constants.COUNTERS_COLLECTION].find_one({Constants.ID_FIELD: conversation_id})
+        query = retention_filter(conversation_id, counter[Constants.SEQ_FIELD], max_messages) if counter else None
+        if query is not None:
+            self.messages.delete_many(query)
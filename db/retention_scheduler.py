@@ -0,0 +1,134 @@
+import logging
+import threading
+
+from config.constants import MetricStages
+from db.base_db import BaseDb
+from db.leader_lock import LeaderLock
+from utils.metrics_utils import stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 5.0
+DEFAULT_MAX_OVERSHOOT = 10
+
+
+class RetentionScheduler:
+    """Enforces the message limit of conversations from a background thread instead of on the request path.
+
+    Requests only count their writes to each conversation (record_writes). The scheduler trims every conversation
+    written to since its previous pass each interval seconds, and straight away once a conversation has max_overshoot
+    writes that were not trimmed yet, so a conversation holds at most about max_messages + max_overshoot messages
+    between passes. With a leader lock, a pass only runs while holding it, so that one replica trims at a time; a
+    replica that cannot get the lock keeps its conversations for its next pass.
+    """
+
+    def __init__(self, db: BaseDb, max_messages: int, interval: float = DEFAULT_INTERVAL_SECONDS,
+                 max_overshoot: int = DEFAULT_MAX_OVERSHOOT, lock: LeaderLock | None = None):
+        """Initializes the scheduler and starts its thread
+
+        Args:
+            db: The database to trim
+            max_messages: The maximum number of messages to retain per conversation
+            interval: The maximum number of seconds between passes
+            max_overshoot: The number of untrimmed writes to a conversation that triggers an immediate pass
+            lock: The lock shared by the replicas that trim the same database, if any
+        """
+        self.db = db
+        self.max_messages = max_messages
+        self.interval = interval
+        self.max_overshoot = max_overshoot
+        self.lock = lock
+        # conversation id -> writes since it was last trimmed
+        self._writes: dict[str, int] = {}
+        self._due = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._trim_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def record_writes(self, conversation_id: str, count: int = 1):
+        """Note messages written to a conversation, so that the next pass trims it.
+
+        Args:
+            conversation_id: The conversation written to
+            count: The number of messages written
+        """
+        with self._condition:
+            writes = self._writes[conversation_id] = self._writes.get(conversation_id, 0) + count
+            if writes >= self.max_overshoot and not self._due:
+                self._due = True
+                self._condition.notify_all()
+
+    def pending_count(self) -> int:
+        """Counts the conversations waiting to be trimmed.
+
+        Returns:
+            The number of conversations written to since their last trim
+        """
+        with self._condition:
+            return len(self._writes)
+
+    def trim(self) -> bool:
+        """Trim every conversation written to since the previous pass now.
+
+        Returns:
+            Whether the pass ran, False if another replica holds the leader lock
+
+        Raises:
+            Exception: If trimming fails (the conversations not trimmed yet are kept for the next pass)
+        """
+        with self._trim_lock:
+            with self._condition:
+                writes, self._writes = self._writes, {}
+                self._due = False
+            if not writes:
+                return True
+            if self.lock is not None and not self.lock.acquire():
+                self._requeue(writes)
+                return False
+
+            try:
+                for conversation_id in list(writes):
+                    with stage(MetricStages.TRIM):
+                        self.db.enforce_retention(self.max_messages, conversation_id)
+                    del writes[conversation_id]
+            finally:
+                self._requeue(writes)
+                if self.lock is not None:
+                    self.lock.release()
+        return True
+
+    def close(self):
+        """Stop the thread and trim the conversations written to since the last pass."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        try:
+            self.trim()
+        except Exception as e:
+            logger.error(f"Error enforcing message retention: {str(e)}")
+
+    def _requeue(self, writes: dict[str, int]):
+        """Put back conversations a pass did not trim, without triggering an immediate pass."""
+        if not writes:
+            return
+        with self._condition:
+            for conversation_id, count in writes.items():
+                self._writes[conversation_id] = self._writes.get(conversation_id, 0) + count
+
+    def _run(self):
+        """Background trimming loop."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._due or self._closed, timeout=self.interval)
+                if self._closed:
+                    return
+
+            try:
+                self.trim()
+            except Exception as e:
+                logger.error(f"Error enforcing message retention: {str(e)}")
@@ -0,0 +1,217 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from config.constants import Constants
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+from utils.message_utils import utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MILLISECOND = timedelta(milliseconds=1)
+# Lower bound for timestamp >= ? when a read starts at the beginning of a conversation
+MIN_TIMESTAMP = -(2 ** 63)
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# The rowid (id) breaks ties between equal timestamps, like _id does in MongoDb. Timestamps are stored as integer
+# milliseconds since the epoch, the precision MongoDB keeps.
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {Constants.MESSAGES_COLLECTION} (
+    id INTEGER PRIMARY KEY,
+    {Constants.CONVERSATION_ID_FIELD} TEXT NOT NULL,
+    {Constants.USER_FIELD} TEXT NOT NULL,
+    {Constants.MESSAGE_FIELD} TEXT NOT NULL,
+    {Constants.TIMESTAMP_FIELD} INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversation_timestamp
+    ON {Constants.MESSAGES_COLLECTION} ({Constants.CONVERSATION_ID_FIELD}, {Constants.TIMESTAMP_FIELD});
+"""
+
+# Every statement is a constant, so each connection prepares it once and reuses it from its statement cache. The
+# conversation_timestamp index ends with the implicit rowid, so it answers every query below, including the ORDER BYs.
+INSERT_SQL = (f"INSERT INTO {Constants.MESSAGES_COLLECTION} ({Constants.CONVERSATION_ID_FIELD}, "
+              f"{Constants.USER_FIELD}, {Constants.MESSAGE_FIELD}, {Constants.TIMESTAMP_FIELD}) VALUES (?, ?, ?, ?)")
+HISTORY_SQL = (f"SELECT {Constants.USER_FIELD}, {Constants.MESSAGE_FIELD}, {Constants.TIMESTAMP_FIELD}, "
+               f"{Constants.CONVERSATION_ID_FIELD} FROM {Constants.MESSAGES_COLLECTION} "
+               f"WHERE {Constants.CONVERSATION_ID_FIELD} = ? AND {Constants.TIMESTAMP_FIELD} >= ? "
+               f"ORDER BY {Constants.TIMESTAMP_FIELD}, id LIMIT ? OFFSET ?")
+COUNT_SQL = f"SELECT COUNT(*) FROM {Constants.MESSAGES_COLLECTION} WHERE {Constants.CONVERSATION_ID_FIELD} = ?"
+NTH_NEWEST_SQL = (f"SELECT {Constants.TIMESTAMP_FIELD} FROM {Constants.MESSAGES_COLLECTION} "
+                  f"WHERE {Constants.CONVERSATION_ID_FIELD} = ? "
+                  f"ORDER BY {Constants.TIMESTAMP_FIELD} DESC, id DESC LIMIT 1 OFFSET ?")
+DELETE_BEFORE_SQL = (f"DELETE FROM {Constants.MESSAGES_COLLECTION} "
+                     f"WHERE {Constants.CONVERSATION_ID_FIELD} = ? AND {Constants.TIMESTAMP_FIELD} <= ?")
+# Deletes everything up to the message that has max_messages newer messages, found through the index. When there is
+# no such message the subquery is NULL, the comparison is never true and nothing is deleted.
+RETENTION_SQL = (f"DELETE FROM {Constants.MESSAGES_COLLECTION} "
+                 f"WHERE {Constants.CONVERSATION_ID_FIELD} = ?1 AND ({Constants.TIMESTAMP_FIELD}, id) <= ("
+                 f"SELECT {Constants.TIMESTAMP_FIELD}, id FROM {Constants.MESSAGES_COLLECTION} "
+                 f"WHERE {Constants.CONVERSATION_ID_FIELD} = ?1 "
+                 f"ORDER BY {Constants.TIMESTAMP_FIELD} DESC, id DESC LIMIT 1 OFFSET ?2)")
+CLEAR_SQL = f"DELETE FROM {Constants.MESSAGES_COLLECTION}"
+
+
+def to_millis(timestamp: datetime) -> int:
+    """Returns a timestamp as integer milliseconds since the epoch (naive timestamps are taken as UTC)."""
+    return (utc_timestamp(timestamp) - EPOCH) // ONE_MILLISECOND
+
+
+def from_millis(millis: int) -> datetime:
+    """Returns milliseconds since the epoch as a naive UTC datetime, the way MongoDB returns timestamps."""
+    return datetime(1970, 1, 1) + millis * ONE_MILLISECOND
+
+
+class SqliteDb(BaseDb):
+    """Message store backed by a local SQLite file, for single-box installs that do not run a MongoDB server.
+
+    The database runs in WAL mode, so readers never block the writer and vice versa, with synchronous=NORMAL, which
+    only syncs at checkpoints. Each thread gets its own connection, opened on first use and reused afterwards, and
+    writers wait up to BUSY_TIMEOUT_SECONDS for each other. Documents are returned the way MongoDb returns them:
+    without an id, oldest first, and timestamped with naive UTC datetimes of millisecond precision.
+    """
+
+    def __init__(self, path: str, max_messages: int):
+        """Opens (and if needed creates) a SQLite message store
+
+        Args:
+            path: The database file; every connection opens it, so it cannot be ":memory:"
+            max_messages: The number of messages retained per conversation (see get_nth_newest)
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self._local = threading.local()
+        # thread id -> connection, so that close() can reach every thread's connection
+        self._connections: dict[int, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+        connection = self._connection()
+        journal_mode = connection.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if journal_mode != "wal":
+            logger.warning(f"SQLite database {path} is in {journal_mode} journal mode instead of WAL")
+        connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it on first use.
+
+        Connections left behind by threads that have exited are closed whenever a new one is opened.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self._local.connection = connection
+        with self._lock:
+            alive = {thread.ident for thread in threading.enumerate()}
+            for thread_id in [thread_id for thread_id in self._connections if thread_id not in alive]:
+                self._connections.pop(thread_id).close()
+            previous = self._connections.get(threading.get_ident())
+            if previous is not None:
+                previous.close()
+            self._connections[threading.get_ident()] = connection
+        return connection
+
+    def close(self):
+        """Closes the connection of every thread."""
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def insert_message(self, message: Message) -> bool:
+        return self.insert_messages([message])
+
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Insert several messages into the database in a single transaction.
+
+        Args:
+            messages: The messages to be inserted
+
+        Returns:
+            Whether the insertion was successful
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany(INSERT_SQL, [
+                (message.conversation_id, message.user, message.message, to_millis(message.timestamp))
+                for message in messages])
+        return True
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list[dict]:
+        """Retrieves the messages of a conversation, oldest first (see MongoDb.retrieve_messages).
+
+        Args:
+            after: The (timestamp, seen) position to resume after
+            limit: The maximum number of messages to return
+            conversation_id: The conversation to read
+
+        Returns:
+            A list of messages
+        """
+        timestamp, seen = (to_millis(after[0]), after[1]) if after is not None else (MIN_TIMESTAMP, 0)
+        # A negative LIMIT means no limit
+        rows = self._connection().execute(HISTORY_SQL, (conversation_id, timestamp, -1 if limit is None else limit,
+                                                        seen))
+        return [{
+            Constants.USER_FIELD: user,
+            Constants.MESSAGE_FIELD: text,
+            Constants.TIMESTAMP_FIELD: from_millis(millis),
+            Constants.CONVERSATION_ID_FIELD: conversation,
+        } for user, text, millis, conversation in rows]
+
+    def clear_messages(self):
+        """Clears the messages of every conversation."""
+        connection = self._connection()
+        with connection:
+            connection.execute(CLEAR_SQL)
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        return self._connection().execute(COUNT_SQL, (conversation_id,)).fetchone()[0]
+
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID,
+                       max_messages: int | None = None) -> list[dict]:
+        """Get the message of a conversation that has max_messages newer messages.
+
+        Args:
+            conversation_id: The conversation to look in
+            max_messages: The number of newer messages (defaults to the store's max_messages)
+
+        Returns:
+            The nth newest message (projected to its timestamp), or an empty list
+        """
+        if max_messages is None:
+            max_messages = self.max_messages
+        row = self._connection().execute(NTH_NEWEST_SQL, (conversation_id, max_messages)).fetchone()
+        return [{Constants.TIMESTAMP_FIELD: from_millis(row[0])}] if row else []
+
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete all messages of a conversation at or before a given cutoff timestamp.
+
+        Args:
+            timestamp: The cutoff timestamp
+            conversation_id: The conversation to delete from
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(DELETE_BEFORE_SQL, (conversation_id, to_millis(timestamp)))
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Delete the oldest messages of a conversation so that exactly max_messages remain in it (if it had more).
+
+        A single DELETE looks up the message just past the limit through the index and removes it and everything
+        older, ordered by (timestamp, rowid) so that late messages are trimmed in history order and equal timestamps
+        are split exactly at the limit. A conversation within its limit costs one index probe.
+
+        Args:
+            max_messages: The maximum number of messages to retain
+            conversation_id: The conversation to trim
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(RETENTION_SQL, (conversation_id, max_messages))
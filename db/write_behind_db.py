@@ -0,0 +1,175 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+from db.base_db import BaseDb
+from models.message import DEFAULT_CONVERSATION_ID, Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.05
+DEFAULT_MAX_QUEUE_SIZE = 10000
+RETRY_DELAY_SECONDS = 1.0
+
+
+class WriteBehindDb(BaseDb):
+    """BaseDb decorator that queues inserts and writes them to the wrapped database in batches.
+
+    A background writer flushes the queue with a single bulk insert once it holds batch_size messages or flush_interval
+    seconds after the first queued message, whichever comes first. Reads flush the queue first, so they always see
+    every accepted write, and so does retention, which is then applied by the wrapped database in the caller (the
+    retention scheduler, off the request path, unless RETENTION_SCHEDULE=inline). Queued messages are flushed when the
+    process exits.
+    """
+
+    def __init__(self, db: BaseDb, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        """Initializes the write-behind queue and starts its writer
+
+        Args:
+            db: The database to write to
+            batch_size: The number of queued messages that triggers an immediate flush
+            flush_interval: The maximum number of seconds a message waits in the queue
+            max_queue_size: The number of queued messages at which inserts block until the writer catches up
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._buffer: list[Message] = []
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def insert_message(self, message: Message) -> bool:
+        """Queue a message for insertion.
+
+        Args:
+            message: The message to be inserted
+
+        Returns:
+            Whether the message was accepted
+        """
+        return self.insert_messages([message])
+
+    def insert_messages(self, messages: list[Message]) -> bool:
+        """Queue several messages for insertion, blocking while the queue is full.
+
+        Args:
+            messages: The messages to be inserted
+
+        Returns:
+            Whether the messages were accepted
+        """
+        with self._condition:
+            while len(self._buffer) >= self.max_queue_size and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return self.db.insert_messages(messages)
+            self._buffer.extend(messages)
+            self._condition.notify_all()
+        return True
+
+    def retrieve_messages(self, after: tuple[datetime, int] | None = None, limit: int | None = None,
+                          conversation_id: str = DEFAULT_CONVERSATION_ID) -> list:
+        self.flush()
+        return self.db.retrieve_messages(after=after, limit=limit, conversation_id=conversation_id)
+
+    def clear_messages(self):
+        self.flush()
+        self.db.clear_messages()
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        self.flush()
+        return self.db.count_messages(conversation_id)
+
+    def get_nth_newest(self, conversation_id: str = DEFAULT_CONVERSATION_ID, max_messages: int | None = None) -> list:
+        self.flush()
+        return self.db.get_nth_newest(conversation_id, max_messages)
+
+    def delete_messages_by_timestamp(self, timestamp: datetime, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        self.flush()
+        self.db.delete_messages_by_timestamp(timestamp, conversation_id)
+
+    def enforce_retention(self, max_messages: int, conversation_id: str = DEFAULT_CONVERSATION_ID):
+        """Write the queued messages, then trim the conversation in the wrapped database.
+
+        Args:
+            max_messages: The maximum number of messages to retain
+            conversation_id: The conversation to trim
+        """
+        self.flush()
+        self.db.enforce_retention(max_messages, conversation_id)
+
+    def pending_count(self) -> int:
+        """Counts the messages waiting to be written.
+
+        Returns:
+            The number of queued messages
+        """
+        with self._condition:
+            return len(self._buffer)
+
+    def flush(self):
+        """Write every queued message to the wrapped database now.
+
+        Raises:
+            Exception: If the write fails or is not acknowledged (the messages are put back at the front of the queue)
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+                self._condition.notify_all()
+            if not batch:
+                return
+
+            try:
+                if not self.db.insert_messages(batch):
+                    raise RuntimeError(f"The write of {len(batch)} queued messages was not acknowledged")
+            except Exception:
+                with self._condition:
+                    self._buffer[:0] = batch
+                raise
+
+    def close(self):
+        """Stop the writer and flush any queued messages (messages that cannot be written then are logged as lost)."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        atexit.unregister(self.close)
+        self._writer.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error writing queued messages on close, {self.pending_count()} messages lost: {str(e)}")
+
+    def _run(self):
+        """Background writer loop."""
+        while True:
+            with self._condition:
+                while not self._buffer and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                # Give the batch up to flush_interval to fill before writing it
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._buffer) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing queued messages: {str(e)}")
+                time.sleep(RETRY_DELAY_SECONDS)
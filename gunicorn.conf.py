@@ -0,0 +1,103 @@
+"""Production server configuration, read by `gunicorn` from the working directory.
+
+The master process forks WORKERS worker processes (more than one needs BROADCASTER=mongo_change_stream), each serving
+requests on WORKER_THREADS threads. The app is not
+preloaded: every worker calls app.create_app() after the fork, so each one builds its own MongoDB connection pool, AI
+client and background threads, and the pod uses all of its cores rather than one GIL-bound process.
+
+On SIGTERM the master stops accepting connections and gives the workers GRACEFUL_TIMEOUT seconds to finish their
+in-flight requests. Each worker ends its /chat/stream responses and flushes its queued writes straight away (see
+app.drain), so that streams do not hold their threads until the deadline; once its requests have finished, it flushes
+the rest of its writes and log records (see app.shutdown) and exits.
+"""
+import os
+import shutil
+import signal
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+from config.constants import AppConfig, BroadcasterTypes, EnvironmentVariables
+
+load_dotenv()
+
+wsgi_app = "app:create_app()"
+preload_app = False
+
+bind = (f"{os.getenv(EnvironmentVariables.APP_HOST_VARIABLE, AppConfig.APP_HOST.value)}:"
+        f"{os.getenv(EnvironmentVariables.PORT_VARIABLE, AppConfig.APP_PORT.value)}")
+# The in-process broadcaster only reaches the /chat/stream clients of the worker that stored a message, so several
+# workers need the change stream broadcaster; 0 means one worker per CPU this process may run on if it is configured
+broadcaster = os.getenv(EnvironmentVariables.BROADCASTER_VARIABLE, AppConfig.BROADCASTER.value).lower()
+workers = int(os.getenv(EnvironmentVariables.WORKERS_VARIABLE, AppConfig.WORKERS.value)) or (
+    len(os.sched_getaffinity(0)) if broadcaster == BroadcasterTypes.MONGO_CHANGE_STREAM else 1)
+if workers > 1 and broadcaster != BroadcasterTypes.MONGO_CHANGE_STREAM:
+    raise ValueError(f"{EnvironmentVariables.WORKERS_VARIABLE}={workers} requires "
+                     f"{EnvironmentVariables.BROADCASTER_VARIABLE}={BroadcasterTypes.MONGO_CHANGE_STREAM}")
+# Threads let a worker overlap requests that wait on the AI or the database; each /chat/stream client holds one
+worker_class = "gthread"
+threads = int(os.getenv(EnvironmentVariables.WORKER_THREADS_VARIABLE, AppConfig.WORKER_THREADS.value))
+# Every request running or queued for an AI call, and every /chat/stream client, holds a thread, so the AI bulkhead
+# (see ai/bulkhead.py) and the stream limit only shed load if together they leave threads for the other requests
+ai_slots = (int(os.getenv(EnvironmentVariables.AI_MAX_CONCURRENCY_VARIABLE, AppConfig.AI_MAX_CONCURRENCY.value))
+            + int(os.getenv(EnvironmentVariables.AI_MAX_QUEUE_VARIABLE, AppConfig.AI_MAX_QUEUE.value)))
+stream_slots = int(os.getenv(EnvironmentVariables.STREAM_MAX_SUBSCRIBERS_VARIABLE,
+                             AppConfig.STREAM_MAX_SUBSCRIBERS.value))
+if ai_slots + stream_slots >= threads:
+    raise ValueError(f"{EnvironmentVariables.AI_MAX_CONCURRENCY_VARIABLE} + "
+                     f"{EnvironmentVariables.AI_MAX_QUEUE_VARIABLE} + "
+                     f"{EnvironmentVariables.STREAM_MAX_SUBSCRIBERS_VARIABLE} ({ai_slots + stream_slots}) must be "
+                     f"less than {EnvironmentVariables.WORKER_THREADS_VARIABLE} ({threads})")
+graceful_timeout = int(os.getenv(EnvironmentVariables.GRACEFUL_TIMEOUT_VARIABLE, AppConfig.GRACEFUL_TIMEOUT.value))
+
+# Several processes cannot rotate one log file safely, so workers only log to the console unless LOG_FILE is set
+os.environ.setdefault(EnvironmentVariables.LOG_FILE_VARIABLE, "")
+# Workers write their metrics to files in this directory, which /metrics aggregates (see utils/metrics_utils.py).
+# prometheus_client reads it on import, so it is set before anything imports prometheus_client.
+os.environ.setdefault(EnvironmentVariables.PROMETHEUS_MULTIPROC_DIR_VARIABLE,
+                      os.path.join(tempfile.gettempdir(), "chat_app_metrics"))
+
+
+def on_starting(server):
+    """Empties the metrics directory, which may hold the files of a previous run's workers."""
+    metrics_dir = os.environ[EnvironmentVariables.PROMETHEUS_MULTIPROC_DIR_VARIABLE]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    """Drains the app as soon as the worker is asked to stop (runs in the worker).
+
+    gunicorn has no hook for SIGTERM, so the worker's handler is wrapped: it stops the worker's accept loop, which then
+    waits up to GRACEFUL_TIMEOUT for the requests in flight, including every open /chat/stream response.
+    """
+    from flask import Flask
+
+    chat_app = sys.modules.get("app")
+    if chat_app is None or not isinstance(getattr(worker, "wsgi", None), Flask):
+        return
+    handle_exit = worker.handle_exit
+
+    def drain_and_exit(sig, frame):
+        handle_exit(sig, frame)
+        chat_app.drain(worker.wsgi)
+
+    signal.signal(signal.SIGTERM, drain_and_exit)
+
+
+def worker_exit(server, worker):
+    """Releases the worker's services once its in-flight requests have drained (runs in the worker)."""
+    from flask import Flask
+
+    chat_app = sys.modules.get("app")
+    # A worker that failed to build the app serves an error app instead, and has nothing to release
+    if chat_app is not None and isinstance(getattr(worker, "wsgi", None), Flask):
+        chat_app.shutdown(worker.wsgi)
+
+
+def child_exit(server, worker):
+    """Drops the live gauges of a worker that has exited (runs in the master)."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,9 +2,15 @@ from datetime import datetime
 
 from pydantic import BaseModel
 
+from config.constants import AppConfig
+
+# Messages stored before conversations existed, and requests that do not name one, belong to this conversation
+DEFAULT_CONVERSATION_ID = AppConfig.DEFAULT_CONVERSATION_ID.value
+
 
 class Message(BaseModel):
     """Defines a message data model"""
     user: str
     message: str
     timestamp: datetime
+    conversation_id: str = DEFAULT_CONVERSATION_ID
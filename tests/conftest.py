@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# The apps built by the tests configure logging; keep the test runs' log out of the working tree
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'chat_app_test.log'))
+
+
+def pytest_configure(config):
+    """Registers the marker of the tests that need a real MongoDB server"""
+    config.addinivalue_line("markers", "integration: needs a MongoDB server at MONGO_URI")
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from ai.ai_cache_backend import MongoAICacheBackend
+from config.constants import Constants
+
+
+@pytest.fixture
+def collection():
+    """Create a mock cache collection"""
+    return MagicMock(spec=Collection)
+
+
+def test_creates_ttl_index(collection):
+    """Test that the backend lets MongoDB expire entries, creating the index once when the first entry is stored"""
+    backend = MongoAICacheBackend(collection)
+    backend.get("key")
+    collection.create_index.assert_not_called()
+
+    backend.set("key", "response", 60)
+    backend.set("key", "response", 60)
+
+    collection.create_index.assert_called_once_with([(Constants.EXPIRES_AT_FIELD, 1)], expireAfterSeconds=0,
+                                                    name="expires_at_ttl")
+
+
+def test_ttl_index_retried_after_error(collection):
+    """Test that a failed index creation is logged like other backend errors and retried on the next write"""
+    collection.create_index.side_effect = [PyMongoError("down"), None]
+    backend = MongoAICacheBackend(collection)
+
+    backend.set("key", "response", 60)
+    collection.replace_one.assert_not_called()
+    backend.set("key", "response", 60)
+
+    assert collection.create_index.call_count == 2
+    collection.replace_one.assert_called_once()
+
+
+def test_get_live_entry(collection):
+    """Test that lookups are by key, exclude expired entries and project the response"""
+    collection.find_one.return_value = {Constants.RESPONSE_FIELD: "cached"}
+
+    assert MongoAICacheBackend(collection).get("key") == "cached"
+    query, projection = collection.find_one.call_args.args
+    assert query[Constants.ID_FIELD] == "key"
+    assert query[Constants.EXPIRES_AT_FIELD]["$gt"] <= datetime.now(tz=timezone.utc)
+    assert projection == {Constants.ID_FIELD: 0, Constants.RESPONSE_FIELD: 1}
+
+
+def test_set_upserts_entry(collection):
+    """Test that storing replaces the entry with a new expiry"""
+    MongoAICacheBackend(collection).set("key", "response", 60)
+
+    query, document = collection.replace_one.call_args.args
+    assert query == {Constants.ID_FIELD: "key"}
+    assert document[Constants.RESPONSE_FIELD] == "response"
+    assert document[Constants.EXPIRES_AT_FIELD] > datetime.now(tz=timezone.utc)
+    assert collection.replace_one.call_args.kwargs == {"upsert": True}
+
+
+def test_errors_are_misses(collection):
+    """Test that backend errors never fail a request"""
+    collection.find_one.side_effect = PyMongoError("down")
+    collection.replace_one.side_effect = PyMongoError("down")
+    backend = MongoAICacheBackend(collection)
+
+    assert backend.get("key") is None
+    backend.set("key", "response", 60)
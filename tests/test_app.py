@@ -1,9 +1,23 @@
+import gzip
 import json
+import threading
 
+import brotli
 import pytest
 
-from app import app, db
-from config.constants import StatusCodes, Constants
+from ai.base_ai import AIStreamError
+from ai.bulkhead import Bulkhead
+from ai.cached_ai import CachedAI
+from ai.context_builder import ContextBuilder
+from app import EXTENSION_NAME, create_app, drain, shutdown
+from config.constants import MetricStages, StatusCodes, Constants
+from db.cached_db import CachedDb
+from db.in_memory_db import InMemoryDb
+from models.message import Message
+
+app = create_app()
+services = app.extensions[EXTENSION_NAME]
+ai, broadcaster, db = services.ai, services.broadcaster, services.db
 
 
 @pytest.fixture
@@ -15,12 +29,66 @@ def client():
         yield client
 
 
+@pytest.fixture
+def app_factory(monkeypatch):
+    """Lets a test build a separate app with create_app (backed by an in-memory store with write-behind), releasing
+    its services afterwards"""
+    monkeypatch.setenv('DB_BACKEND', 'memory')
+    monkeypatch.setenv('LOG_FILE', '')
+    monkeypatch.setenv('WRITE_BEHIND', 'true')
+    monkeypatch.setenv('WRITE_BEHIND_FLUSH_INTERVAL', '60')
+    apps = []
+
+    def factory():
+        apps.append(create_app())
+        return apps[-1]
+
+    yield factory
+    for new_app in apps:
+        shutdown(new_app)
+
+
+@pytest.fixture
+def cached_client(client, mocker):
+    """Defines a Flask test client fixture with the history cache enabled"""
+    history_cache = CachedDb(db, app.config[Constants.MAX_MESSAGES_FIELD], ttl=60)
+    mocker.patch.object(services, 'db', history_cache)
+    mocker.patch.object(services, 'history_cache', history_cache)
+    yield client
+
+
 def test_home_page(client):
     """Test that home page loads successfully"""
     response = client.get('/')
     assert response.status_code == StatusCodes.SUCCESS_CODE
 
 
+def test_home_page_is_rendered_once_and_cacheable(client, mocker):
+    """Test that the page is served from the startup rendering with a strong ETag and Cache-Control"""
+    render_template = mocker.patch('app.render_template')
+
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == f"public, max-age={app.config[Constants.PAGE_MAX_AGE_FIELD]}"
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == StatusCodes.NOT_MODIFIED_CODE
+    render_template.assert_not_called()
+
+
+def test_home_page_is_precompressed(client):
+    """Test that the page is sent in the preferred accepted coding, each coding with its own ETag"""
+    plain = client.get('/')
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert compressed.headers['Content-Encoding'] == 'br'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert brotli.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/', headers={'Accept-Encoding': 'gzip, br', 'If-None-Match': plain.headers['ETag']}) \
+        .status_code == StatusCodes.SUCCESS_CODE
+
+
 def test_send_message(client):
     """Test sending a valid message"""
     response = client.post('/chat/message',
@@ -32,6 +100,25 @@ def test_send_message(client):
     assert data[Constants.STATUS_FIELD] == 'success'
 
 
+def test_send_message_stamps_messages_when_stored(client, mocker):
+    """Test that the user message is stamped when it is written, after any message stored while the AI responded"""
+    db.clear_messages()
+
+    def respond(user_message, context=None):
+        # Another request stores its messages while this one waits for the AI
+        db.insert_messages([Message(user='User', message='Concurrent message', timestamp=services.clock.now())])
+        return 'Slow response'
+
+    mocker.patch.object(ai, 'get_ai_response', side_effect=respond)
+    mocker.patch.object(services, 'ai_cache', None)
+    client.post('/chat/message', json={'message': 'Slow message'}, content_type='application/json')
+
+    messages = db.retrieve_messages()
+    assert [message[Constants.MESSAGE_FIELD] for message in messages][-2:] == ['Slow message', 'Slow response']
+    timestamps = [message[Constants.TIMESTAMP_FIELD] for message in messages]
+    assert timestamps == sorted(timestamps)
+
+
 def test_send_invalid_message(client):
     """Test sending an invalid message"""
     response = client.post('/chat/message',
@@ -59,6 +146,119 @@ def test_get_history(client):
     assert Constants.TIMESTAMP_FIELD in data[0]
 
 
+def test_get_history_after_cursor(client):
+    """Test that only messages after the returned cursor are retrieved"""
+    db.clear_messages()
+    client.post('/chat/message',
+                json={'message': 'First message'},
+                content_type='application/json')
+
+    first = client.get('/chat/history')
+    cursor = first.headers[Constants.NEXT_CURSOR_HEADER]
+    assert len(json.loads(first.data)) == 2
+
+    client.post('/chat/message',
+                json={'message': 'Second message'},
+                content_type='application/json')
+
+    response = client.get(f'/chat/history?after={cursor}')
+    assert response.status_code == StatusCodes.SUCCESS_CODE
+    data = json.loads(response.data)
+    assert [msg[Constants.USER_FIELD] for msg in data] == ['User', 'AI']
+    assert data[0][Constants.MESSAGE_FIELD] == 'Second message'
+    assert response.headers[Constants.NEXT_CURSOR_HEADER] != cursor
+
+
+def test_get_history_limit(client):
+    """Test that the limit parameter bounds the page size"""
+    db.clear_messages()
+    client.post('/chat/message',
+                json={'message': 'Test message'},
+                content_type='application/json')
+
+    response = client.get('/chat/history?limit=1')
+    data = json.loads(response.data)
+    assert len(data) == 1
+    assert data[0][Constants.MESSAGE_FIELD] == 'Test message'
+
+
+def test_get_history_not_modified(client):
+    """Test that an unchanged history returns 304 for a matching If-None-Match"""
+    client.post('/chat/message',
+                json={'message': 'Test message'},
+                content_type='application/json')
+
+    first = client.get('/chat/history')
+    etag = first.headers['ETag']
+
+    response = client.get('/chat/history', headers={'If-None-Match': etag})
+    assert response.status_code == StatusCodes.NOT_MODIFIED_CODE
+    assert response.data == b''
+
+
+@pytest.mark.parametrize("query", ["after=garbage", "limit=0", "limit=abc"])
+def test_get_history_invalid_query(client, query):
+    """Test that malformed cursors and limits are rejected"""
+    response = client.get(f'/chat/history?{query}')
+    assert response.status_code == StatusCodes.BAD_REQUEST_ERROR_CODE
+
+
+def test_send_message_stream(client):
+    """Test that ?stream=true streams the AI response and stores it as one message"""
+    db.clear_messages()
+    response = client.post('/chat/message?stream=true',
+                           json={'message': 'Hello AI!'},
+                           content_type='application/json')
+    assert response.status_code == StatusCodes.SUCCESS_CODE
+    assert response.mimetype == 'text/event-stream'
+
+    events = [event for event in response.get_data(as_text=True).split('\n\n') if event]
+    chunks = [json.loads(event.split('data: ', 1)[1])[Constants.CONTENT_FIELD]
+              for event in events if event.startswith('event: chunk')]
+    assert events[-1].startswith('event: done')
+    done = json.loads(events[-1].split('data: ', 1)[1])
+    assert done[Constants.USER_FIELD] == 'AI'
+    assert done[Constants.MESSAGE_FIELD] == ''.join(chunks)
+
+    history = json.loads(client.get('/chat/history').data)
+    assert [msg[Constants.USER_FIELD] for msg in history] == ['User', 'AI']
+    assert history[1][Constants.MESSAGE_FIELD] == ''.join(chunks)
+
+
+def test_send_message_stream_error(client, mocker):
+    """Test that a mid-stream AI failure sends an error event and stores only the error response"""
+    def fail_mid_stream(user_message, context=None):
+        yield 'Partial'
+        raise AIStreamError('Sorry, something went wrong.')
+
+    db.clear_messages()
+    mocker.patch.object(ai, 'stream_ai_response', side_effect=fail_mid_stream)
+    response = client.post('/chat/message?stream=true', json={'message': 'Hello AI!'})
+
+    events = [event for event in response.get_data(as_text=True).split('\n\n') if event]
+    assert [event.split('\n', 1)[0] for event in events] == ['event: chunk', 'event: error']
+    assert json.loads(events[-1].split('data: ', 1)[1]) == {Constants.ERROR_FIELD: 'Sorry, something went wrong.'}
+
+    history = json.loads(client.get('/chat/history').data)
+    assert [msg[Constants.MESSAGE_FIELD] for msg in history] == ['Hello AI!', 'Sorry, something went wrong.']
+
+
+def test_send_message_stream_client_disconnect(client, mocker):
+    """Test that a stream closed by the client mid-response still stores the prompt and the whole reply"""
+    def stream_chunks(user_message, context=None):
+        yield 'Hello'
+        yield ' there'
+
+    db.clear_messages()
+    mocker.patch.object(ai, 'stream_ai_response', side_effect=stream_chunks)
+    response = client.post('/chat/message?stream=true', json={'message': 'Hello AI!'}, buffered=False)
+    assert next(response.response).startswith(b'event: chunk')
+    response.close()
+
+    history = json.loads(client.get('/chat/history').data)
+    assert [msg[Constants.MESSAGE_FIELD] for msg in history] == ['Hello AI!', 'Hello there']
+
+
 def test_empty_message(client):
     """Test sending empty message"""
     response = client.post('/chat/message',
@@ -77,7 +277,294 @@ def test_message_limit(client):
         client.post('/chat/message',
                     json={'message': f'Test message {i}'},
                     content_type='application/json')
+    services.retention_scheduler.trim()
 
     response = client.get('/chat/history')
     data = json.loads(response.data)
     assert len(data) <= app.config[Constants.MAX_MESSAGES_FIELD]
+
+
+def test_message_limit_inline(client, mocker):
+    """Test that with RETENTION_SCHEDULE=inline each request trims its conversation"""
+    mocker.patch.object(services, 'retention_scheduler', None)
+    db.clear_messages()
+
+    for i in range(app.config[Constants.MAX_MESSAGES_FIELD] // 2 + 5):
+        client.post('/chat/message', json={'message': f'Test message {i}'})
+
+    assert db.count_messages() == app.config[Constants.MAX_MESSAGES_FIELD]
+
+
+def test_retention_is_scheduled_off_the_request_path(client, mocker):
+    """Test that a request only records its writes for the retention scheduler"""
+    enforce_retention = mocker.spy(db, 'enforce_retention')
+    record_writes = mocker.spy(services.retention_scheduler, 'record_writes')
+
+    client.post('/chat/message?conversation_id=scheduled', json={'message': 'Hello AI!'})
+
+    record_writes.assert_called_once_with('scheduled', 2)
+    assert ('scheduled',) not in [call.args[1:] for call in enforce_retention.call_args_list]
+
+
+def test_stream_pushes_new_messages(client):
+    """Test that messages inserted by /chat/message are pushed to /chat/stream clients"""
+    response = client.get('/chat/stream')
+    assert response.status_code == StatusCodes.SUCCESS_CODE
+    assert response.mimetype == 'text/event-stream'
+
+    events = (chunk.decode() for chunk in response.response)
+    assert next(events).startswith(': connected')
+
+    client.post('/chat/message',
+                json={'message': 'Streamed message'},
+                content_type='application/json')
+
+    user_event = next(events)
+    assert user_event.startswith('data: ')
+    data = json.loads(user_event[len('data: '):])
+    assert data[Constants.USER_FIELD] == 'User'
+    assert data[Constants.MESSAGE_FIELD] == 'Streamed message'
+    assert json.loads(next(events)[len('data: '):])[Constants.USER_FIELD] == 'AI'
+
+    response.close()
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_stream_subscribers_are_capped(client, mocker):
+    """Test that clients beyond STREAM_MAX_SUBSCRIBERS are turned away with 503, until an open stream is closed"""
+    mocker.patch.object(services, 'stream_slots', threading.BoundedSemaphore(1))
+    response = client.get('/chat/stream')
+    assert response.status_code == StatusCodes.SUCCESS_CODE
+
+    refused = client.get('/chat/stream')
+    assert refused.status_code == StatusCodes.SERVICE_UNAVAILABLE_CODE
+    assert refused.headers['Retry-After'] == str(app.config[Constants.AI_RETRY_AFTER_FIELD])
+
+    response.close()
+    reopened = client.get('/chat/stream')
+    assert reopened.status_code == StatusCodes.SUCCESS_CODE
+    reopened.close()
+
+
+def test_conversations_are_isolated(client):
+    """Test that history and retention are scoped to the conversation named in the request"""
+    db.clear_messages()
+    client.post('/chat/message?conversation_id=quiet', json={'message': 'Quiet message'},
+                content_type='application/json')
+    for i in range(app.config[Constants.MAX_MESSAGES_FIELD] + 5):
+        client.post('/chat/message?conversation_id=busy', json={'message': f'Busy message {i}'},
+                    content_type='application/json')
+    services.retention_scheduler.trim()
+
+    quiet = json.loads(client.get('/chat/history?conversation_id=quiet').data)
+    busy = json.loads(client.get('/chat/history?conversation_id=busy').data)
+    assert [msg[Constants.MESSAGE_FIELD] for msg in quiet][0] == 'Quiet message'
+    assert {msg[Constants.CONVERSATION_ID_FIELD] for msg in quiet} == {'quiet'}
+    assert len(busy) <= app.config[Constants.MAX_MESSAGES_FIELD]
+    assert json.loads(client.get('/chat/history').data) == []
+
+
+@pytest.mark.parametrize("method,path", [
+    ("post", "/chat/message"), ("get", "/chat/history"), ("get", "/chat/stream")])
+def test_invalid_conversation_id(client, method, path):
+    """Test that conversation ids outside the allowed alphabet are rejected"""
+    response = getattr(client, method)(f'{path}?conversation_id=not%20valid', json={'message': 'Hello AI!'})
+    assert response.status_code == StatusCodes.BAD_REQUEST_ERROR_CODE
+
+
+def test_stream_scoped_to_conversation(client):
+    """Test that /chat/stream only pushes the messages of its conversation"""
+    response = client.get('/chat/stream?conversation_id=watched')
+    events = (chunk.decode() for chunk in response.response)
+    assert next(events).startswith(': connected')
+
+    client.post('/chat/message?conversation_id=other', json={'message': 'Other message'},
+                content_type='application/json')
+    client.post('/chat/message?conversation_id=watched', json={'message': 'Watched message'},
+                content_type='application/json')
+
+    data = json.loads(next(events)[len('data: '):])
+    assert data[Constants.MESSAGE_FIELD] == 'Watched message'
+    assert data[Constants.CONVERSATION_ID_FIELD] == 'watched'
+    response.close()
+
+
+def test_cached_history_snapshot(cached_client):
+    """Test that the cached full history is served as a gzip snapshot that only changes after a write"""
+    db.clear_messages()
+    cached_client.post('/chat/message', json={'message': 'First message'}, content_type='application/json')
+
+    first = cached_client.get('/chat/history', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in first.headers['Vary']
+    data = json.loads(gzip.decompress(first.data))
+    assert [msg[Constants.MESSAGE_FIELD] for msg in data][0] == 'First message'
+
+    plain = cached_client.get('/chat/history')
+    assert 'Content-Encoding' not in plain.headers
+    assert json.loads(plain.data) == data
+    assert plain.headers['ETag'] != first.headers['ETag']
+
+    assert cached_client.get('/chat/history', headers={'Accept-Encoding': 'gzip'}).data == first.data
+    cached_client.post('/chat/message', json={'message': 'Second message'}, content_type='application/json')
+    second = cached_client.get('/chat/history', headers={'Accept-Encoding': 'gzip'})
+    assert len(json.loads(gzip.decompress(second.data))) == 4
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.headers[Constants.NEXT_CURSOR_HEADER] != first.headers[Constants.NEXT_CURSOR_HEADER]
+
+
+def test_history_compressed_above_threshold(client, mocker):
+    """Test that uncached histories from COMPRESS_MIN_SIZE bytes on are compressed and stay conditional"""
+    db.clear_messages()
+    client.post('/chat/message', json={'message': 'First message'})
+    headers = {'Accept-Encoding': 'br;q=0.5, gzip'}
+
+    small = client.get('/chat/history', headers=headers)
+    assert 'Content-Encoding' not in small.headers
+
+    mocker.patch.dict(app.config, {Constants.COMPRESS_MIN_SIZE_FIELD: 1})
+    compressed = client.get('/chat/history', headers=headers)
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == json.loads(small.data)
+    assert compressed.headers['ETag'] == small.headers['ETag'][:-1] + '-gzip"'
+    not_modified = client.get('/chat/history', headers={**headers, 'If-None-Match': compressed.headers['ETag']})
+    assert not_modified.status_code == StatusCodes.NOT_MODIFIED_CODE
+
+
+def test_large_json_responses_are_compressed(client, mocker):
+    """Test that other JSON responses from COMPRESS_MIN_SIZE bytes on are sent compressed to clients that accept it"""
+    mocker.patch.dict(app.config, {Constants.COMPRESS_MIN_SIZE_FIELD: 1})
+
+    compressed = client.post('/chat/message', json={'message': 'Hello AI!'}, headers={'Accept-Encoding': 'br'})
+    plain = client.post('/chat/message', json={'message': 'Hello AI!'})
+
+    assert compressed.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(compressed.data))[Constants.STATUS_FIELD] == 'success'
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+
+def test_ai_cache_bypass(client, mocker):
+    """Test that repeated prompts reuse the cached AI response unless the request sends Cache-Control: no-cache"""
+    ai_cache = CachedAI(ai)
+    mocker.patch.object(services, 'ai_cache', ai_cache)
+    get_ai_response = mocker.spy(ai, 'get_ai_response')
+
+    for headers in [{}, {}, {'Cache-Control': 'no-cache'}]:
+        response = client.post('/chat/message', json={'message': 'Hello AI!'}, headers=headers)
+        assert response.status_code == StatusCodes.SUCCESS_CODE
+
+    assert get_ai_response.call_count == 2
+    assert ai_cache.cache_stats()["hits"] == 1
+
+
+def test_conversation_context_is_sent(client, mocker):
+    """Test that the earlier turns of the conversation are sent to the AI with a new message"""
+    mocker.patch.object(services, 'context_builder', ContextBuilder(db))
+    get_ai_response = mocker.spy(ai, 'get_ai_response')
+
+    client.post('/chat/message?conversation_id=context-test', json={'message': 'My name is Ada'})
+    client.post('/chat/message?conversation_id=context-test', json={'message': 'What is my name?'})
+
+    first_context, second_context = [call.args[1] for call in get_ai_response.call_args_list]
+    assert first_context == []
+    assert [message['role'] for message in second_context] == ['user', 'assistant']
+    assert second_context[0]['content'] == 'My name is Ada'
+
+
+def test_send_message_shed_when_saturated(client, mocker):
+    """Test that messages are rejected with 503 and Retry-After when no AI slot is available"""
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=0)
+    mocker.patch.object(services, 'bulkhead', bulkhead)
+    bulkhead.acquire()
+
+    response = client.post('/chat/message', json={'message': 'Hello AI!'})
+    bulkhead.release()
+
+    assert response.status_code == StatusCodes.SERVICE_UNAVAILABLE_CODE
+    assert response.headers['Retry-After'] == str(app.config[Constants.AI_RETRY_AFTER_FIELD])
+
+
+def test_send_message_releases_ai_slot(client, mocker):
+    """Test that the AI slot is released after plain and streamed messages"""
+    bulkhead = Bulkhead(max_concurrency=1)
+    mocker.patch.object(services, 'bulkhead', bulkhead)
+
+    client.post('/chat/message', json={'message': 'Hello AI!'})
+    response = client.post('/chat/message?stream=true', json={'message': 'Hello AI!'})
+    response.get_data()
+    response.close()
+
+    assert bulkhead.in_flight == 0
+
+
+def test_metrics(client):
+    """Test that the AI saturation metrics are exposed for Prometheus"""
+    response = client.get('/metrics')
+
+    assert response.status_code == StatusCodes.SUCCESS_CODE
+    assert b'chat_ai_queue_depth' in response.data
+    assert b'chat_ai_queue_wait_seconds_bucket' in response.data
+
+
+def test_metrics_stages(client, mocker):
+    """Test that each stage of sending a message and reading the history, and each store call, is timed"""
+    mocker.patch.object(services, 'context_builder', ContextBuilder(db))
+    client.post('/chat/message', json={'message': 'Hello AI!'})
+    services.retention_scheduler.trim()
+    client.get('/chat/history')
+
+    data = client.get('/metrics').data.decode()
+
+    for stage in MetricStages:
+        assert f'chat_stage_seconds_count{{stage="{stage}"}}' in data
+    for operation in ['insert_messages', 'enforce_retention', 'retrieve_messages']:
+        assert f'chat_db_call_seconds_count{{operation="{operation}"}}' in data
+
+
+def test_create_app_builds_separate_app(app_factory):
+    """Test that create_app builds a new app with its own services, serving the same routes"""
+    new_app = app_factory()
+
+    assert new_app is not app
+    assert new_app.extensions[EXTENSION_NAME].db is not db
+    with new_app.test_client() as new_client:
+        assert new_client.get('/').status_code == StatusCodes.SUCCESS_CODE
+        response = new_client.post('/chat/message', json={'message': 'Hello AI!'})
+        assert response.status_code == StatusCodes.SUCCESS_CODE
+        history = new_client.get('/chat/history').get_json()
+    assert [message[Constants.USER_FIELD] for message in history] == ['User', 'AI']
+
+
+def test_shutdown_flushes_queued_writes(app_factory):
+    """Test that shutdown writes the messages still queued by the write-behind store"""
+    new_app = app_factory()
+    store = new_app.extensions[EXTENSION_NAME].db.db.db
+    assert isinstance(store, InMemoryDb)
+
+    with new_app.test_client() as new_client:
+        new_client.post('/chat/message', json={'message': 'Hello AI!'})
+    assert store.count_messages() == 0
+
+    shutdown(new_app)
+
+    assert store.count_messages() == 2
+
+
+def test_drain_ends_streams_and_flushes_queued_writes(app_factory):
+    """Test that draining ends the open /chat/stream responses and writes the queued messages"""
+    new_app = app_factory()
+    store = new_app.extensions[EXTENSION_NAME].db.db.db
+
+    with new_app.test_client() as new_client:
+        new_client.post('/chat/message', json={'message': 'Hello AI!'})
+        response = new_client.get('/chat/stream')
+        events = (chunk.decode() for chunk in response.response)
+        assert next(events).startswith(': connected')
+
+        drain(new_app)
+
+        assert list(events) == []
+        response.close()
+    assert store.count_messages() == 2
+    assert new_app.extensions[EXTENSION_NAME].broadcaster.subscriber_count() == 0
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ai.bulkhead import Bulkhead, BulkheadFullError
+from config.constants import AppConfig
+
+
+def metric(name: str, labels: dict | None = None) -> float:
+    """Read a sample from the default Prometheus registry"""
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+def hold_slots(bulkhead: Bulkhead, count: int) -> threading.Event:
+    """Occupy slots from background threads until the returned event is set"""
+    release = threading.Event()
+    acquired = threading.Barrier(count + 1)
+
+    def worker():
+        bulkhead.acquire()
+        try:
+            acquired.wait()
+            release.wait()
+        finally:
+            bulkhead.release()
+
+    for _ in range(count):
+        threading.Thread(target=worker, daemon=True).start()
+    acquired.wait(timeout=5)
+    return release
+
+
+def test_slot_tracks_in_flight_calls():
+    """Test that a slot is held from acquire until release"""
+    bulkhead = Bulkhead(max_concurrency=2)
+
+    bulkhead.acquire()
+    assert bulkhead.in_flight == 1
+    assert metric("chat_ai_in_flight") == 1
+    assert metric("chat_ai_saturation") == 0.5
+    bulkhead.release()
+
+    assert bulkhead.in_flight == 0
+
+
+@pytest.mark.parametrize("limits", [
+    {"max_concurrency": 0},
+    {"max_concurrency": -1},
+    {"max_queue": -1},
+    {"queue_timeout": -1},
+])
+def test_invalid_limits_are_refused(limits):
+    """Test that limits that could never admit a call (or would divide by zero) are refused up front"""
+    with pytest.raises(ValueError):
+        Bulkhead(**limits)
+
+
+def test_defaults_match_settings():
+    """Test that the bulkhead's defaults are the AI_MAX_CONCURRENCY, AI_MAX_QUEUE and AI_QUEUE_TIMEOUT defaults"""
+    bulkhead = Bulkhead()
+
+    assert bulkhead.max_concurrency == int(AppConfig.AI_MAX_CONCURRENCY.value)
+    assert bulkhead.max_queue == int(AppConfig.AI_MAX_QUEUE.value)
+    assert bulkhead.queue_timeout == float(AppConfig.AI_QUEUE_TIMEOUT.value)
+
+
+def test_queue_full_is_rejected():
+    """Test that callers are shed once every slot is taken and the queue is full"""
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=0)
+    rejected = metric("chat_ai_rejected_total", {"reason": "queue_full"})
+    release = hold_slots(bulkhead, 1)
+
+    with pytest.raises(BulkheadFullError) as error:
+        bulkhead.acquire()
+    release.set()
+
+    assert error.value.reason == "queue_full"
+    assert metric("chat_ai_rejected_total", {"reason": "queue_full"}) == rejected + 1
+
+
+def test_queue_timeout_is_rejected():
+    """Test that a queued caller is shed when no slot frees up in time"""
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    release = hold_slots(bulkhead, 1)
+
+    with pytest.raises(BulkheadFullError) as error:
+        bulkhead.acquire()
+    release.set()
+
+    assert error.value.reason == "timeout"
+    assert bulkhead.waiting == 0
+
+
+def test_queued_caller_gets_released_slot():
+    """Test that a queued caller runs as soon as a slot is released, and its wait is recorded"""
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=1, queue_timeout=5)
+    waited = metric("chat_ai_queue_wait_seconds_sum")
+    release = hold_slots(bulkhead, 1)
+
+    timer = threading.Timer(0.05, release.set)
+    timer.start()
+    bulkhead.acquire()
+    assert bulkhead.in_flight == 1
+    bulkhead.release()
+
+    assert metric("chat_ai_queue_wait_seconds_sum") >= waited + 0.04
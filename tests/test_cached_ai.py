@@ -0,0 +1,164 @@
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ai.ai_cache_backend import AICacheBackend
+from ai.base_ai import AIModel
+from ai.cached_ai import CachedAI, normalize_prompt, prompt_key
+
+
+class CountingAI(AIModel):
+    """AI model that numbers its responses"""
+
+    error_response = "error"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_ai_response(self, user_message: str, context: list[dict] | None = None) -> str:
+        self.calls += 1
+        return f"response {self.calls}"
+
+    def stream_ai_response(self, user_message: str, context: list[dict] | None = None):
+        self.calls += 1
+        yield "response "
+        yield str(self.calls)
+
+
+@pytest.fixture
+def model():
+    """Create a counting AI model"""
+    return CountingAI()
+
+
+@pytest.fixture
+def cached_ai(model):
+    """Create an AI response cache"""
+    return CachedAI(model, max_entries=2, ttl=60)
+
+
+def test_normalize_prompt():
+    """Test that case, whitespace and compatibility forms do not affect the cache key"""
+    assert normalize_prompt("  Hello\tＷorld\n") == "hello world"
+    assert prompt_key("HELLO   world") == prompt_key("hello world")
+    assert prompt_key("hello world") != prompt_key("hello world!")
+
+
+def test_repeated_prompt_is_cached(cached_ai, model):
+    """Test that a repeated (normalized) prompt is answered from the cache"""
+    assert cached_ai.get_ai_response("Hello") == "response 1"
+    assert cached_ai.get_ai_response(" hello ") == "response 1"
+
+    assert model.calls == 1
+    stats = cached_ai.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_cache_stats_exported_as_gauges(cached_ai):
+    """Test that hits, misses and the local cache size are published on /metrics"""
+    hits = REGISTRY.get_sample_value("chat_ai_cache_hits_total", {"source": "local"}) or 0.0
+    misses = REGISTRY.get_sample_value("chat_ai_cache_misses_total")
+
+    cached_ai.get_ai_response("Hello")
+    cached_ai.get_ai_response("Hello")
+
+    assert REGISTRY.get_sample_value("chat_ai_cache_hits_total", {"source": "local"}) == hits + 1
+    assert REGISTRY.get_sample_value("chat_ai_cache_misses_total") == misses + 1
+    assert REGISTRY.get_sample_value("chat_ai_cache_entries") == 1
+    assert REGISTRY.get_sample_value("chat_ai_cache_bytes") == cached_ai.cache_stats()["bytes"]
+
+
+def test_bypass_refreshes_entry(cached_ai, model):
+    """Test that bypassing the cache asks the model and replaces the cached response"""
+    cached_ai.get_ai_response("Hello")
+
+    assert cached_ai.get_ai_response("Hello", bypass_cache=True) == "response 2"
+    assert cached_ai.get_ai_response("Hello") == "response 2"
+    assert model.calls == 2
+
+
+def test_entries_expire(cached_ai, model, mocker):
+    """Test that an entry is not served once its TTL has passed"""
+    clock = mocker.patch('ai.cached_ai.time.monotonic', return_value=100.0)
+    cached_ai.get_ai_response("Hello")
+
+    clock.return_value = 161.0
+    assert cached_ai.get_ai_response("Hello") == "response 2"
+    assert cached_ai.cache_stats()["entries"] == 1
+
+
+def test_lru_eviction_by_entries(cached_ai, model):
+    """Test that the least recently used entry is evicted once max_entries is exceeded"""
+    cached_ai.get_ai_response("a")
+    cached_ai.get_ai_response("b")
+    cached_ai.get_ai_response("a")
+    cached_ai.get_ai_response("c")
+
+    assert cached_ai.get_ai_response("a") == "response 1"
+    assert cached_ai.get_ai_response("b") == "response 4"
+    assert cached_ai.cache_stats()["evictions"] == 2
+
+
+def test_lru_eviction_by_bytes(model):
+    """Test that entries are evicted to stay within max_bytes, and oversized responses are not cached"""
+    entry_size = len(prompt_key("a")) + len("response 1")
+    cached_ai = CachedAI(model, max_entries=10, max_bytes=entry_size + 5)
+
+    cached_ai.get_ai_response("a")
+    cached_ai.get_ai_response("b")
+
+    assert cached_ai.cache_stats()["entries"] == 1
+    assert cached_ai.cache_stats()["bytes"] <= entry_size + 5
+    assert CachedAI(model, max_bytes=10).get_ai_response("a") == "response 3"
+
+
+def test_error_responses_are_not_cached(model):
+    """Test that the model's error response is never cached"""
+    model.get_ai_response = MagicMock(return_value=model.error_response)
+    cached_ai = CachedAI(model)
+
+    cached_ai.get_ai_response("Hello")
+    cached_ai.get_ai_response("Hello")
+
+    assert model.get_ai_response.call_count == 2
+
+
+def test_stream_is_cached_once_complete(cached_ai, model):
+    """Test that a fully consumed stream is cached and replayed as a single chunk"""
+    partial = cached_ai.stream_ai_response("Hello")
+    next(partial)
+    partial.close()
+
+    assert list(cached_ai.stream_ai_response("Hello")) == ["response ", "2"]
+    assert list(cached_ai.stream_ai_response("Hello")) == ["response 2"]
+    assert model.calls == 2
+
+
+def test_prompts_are_cached_per_context(model):
+    """Test that a response is only reused for the same prompt following the same conversation context"""
+    cached_ai = CachedAI(model, ttl=60)
+    context = [{"role": "user", "content": "My name is Ada"}, {"role": "assistant", "content": "Hi Ada"}]
+    cached_ai.get_ai_response("Hello")
+
+    assert cached_ai.get_ai_response("Hello", context) == "response 2"
+    assert cached_ai.get_ai_response(" hello", list(context)) == "response 2"
+    assert list(cached_ai.stream_ai_response("Hello", context[:1])) == ["response ", "3"]
+    assert cached_ai.get_ai_response("Hello") == "response 1"
+    assert model.calls == 3
+    assert prompt_key("Hello", context) != prompt_key("Hello") != prompt_key("Hello", context[:1])
+
+
+def test_shared_backend(model):
+    """Test that local misses consult the shared backend and fresh responses are written to it"""
+    backend = MagicMock(spec=AICacheBackend)
+    backend.get.side_effect = [None, "shared response"]
+    cached_ai = CachedAI(model, ttl=30, backend=backend)
+
+    assert cached_ai.get_ai_response("Hello") == "response 1"
+    backend.set.assert_called_once_with(prompt_key("Hello"), "response 1", 30)
+
+    assert cached_ai.get_ai_response("Goodbye") == "shared response"
+    assert cached_ai.get_ai_response("Goodbye") == "shared response"
+    assert backend.get.call_count == 2
+    assert cached_ai.cache_stats()["backend_hits"] == 1
@@ -0,0 +1,176 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from config.constants import Constants
+from db.base_db import BaseDb
+from db.cached_db import CachedDb
+from models.message import Message
+
+
+def make_document(i: int) -> dict:
+    """Create a stored message document"""
+    return {
+        Constants.USER_FIELD: "User",
+        Constants.MESSAGE_FIELD: f"message {i}",
+        Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30, i),
+    }
+
+
+@pytest.fixture
+def wrapped_db():
+    """Create a mock database holding three messages"""
+    db = MagicMock(spec=BaseDb)
+    db.retrieve_messages.return_value = [make_document(i) for i in range(3)]
+    db.insert_messages.return_value = True
+    return db
+
+
+@pytest.fixture
+def cached_db(wrapped_db):
+    """Create a history cache with a long TTL"""
+    return CachedDb(wrapped_db, max_messages=3, ttl=60)
+
+
+def test_first_read_loads_then_hits(cached_db, wrapped_db):
+    """Test that only the first read touches the database"""
+    first = cached_db.retrieve_messages()
+    second = cached_db.retrieve_messages()
+
+    assert first == second == [make_document(i) for i in range(3)]
+    wrapped_db.retrieve_messages.assert_called_once_with(conversation_id="default")
+    assert cached_db.cache_stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "conversations": 1}
+
+
+def test_cache_stats_exported_as_gauges(cached_db):
+    """Test that hits, misses and cached conversations are published on /metrics"""
+    hits = REGISTRY.get_sample_value("chat_history_cache_hits_total")
+    misses = REGISTRY.get_sample_value("chat_history_cache_misses_total")
+
+    cached_db.retrieve_messages(conversation_id="a")
+    cached_db.retrieve_messages(conversation_id="a")
+    cached_db.retrieve_messages(conversation_id="b")
+
+    assert REGISTRY.get_sample_value("chat_history_cache_hits_total") == hits + 1
+    assert REGISTRY.get_sample_value("chat_history_cache_misses_total") == misses + 2
+    assert REGISTRY.get_sample_value("chat_history_cache_conversations") == 2
+
+
+def test_local_writes_update_the_cache(cached_db, wrapped_db):
+    """Test that local writes are appended without reloading, evicting the oldest message"""
+    cached_db.retrieve_messages()
+    message = Message(user="AI", message="new message", timestamp=datetime.now())
+
+    cached_db.insert_message(message)
+    messages = cached_db.retrieve_messages()
+
+    assert [msg[Constants.MESSAGE_FIELD] for msg in messages] == ["message 1", "message 2", "new message"]
+    wrapped_db.retrieve_messages.assert_called_once_with(conversation_id="default")
+
+
+def test_failed_write_not_cached(cached_db, wrapped_db):
+    """Test that messages the database did not accept are not appended to the cached history"""
+    cached_db.retrieve_messages()
+    wrapped_db.insert_messages.return_value = False
+
+    assert cached_db.insert_message(Message(user="AI", message="lost message", timestamp=datetime.now())) is False
+    assert cached_db.retrieve_messages() == [make_document(i) for i in range(3)]
+
+
+def test_write_after_concurrent_reload_not_duplicated(cached_db, wrapped_db):
+    """Test that a write already read by a reload racing the insert is not appended a second time"""
+    cached_db.retrieve_messages()
+    message = Message(user="AI", message="new message", timestamp=datetime(2025, 1, 12, 14, 30, 3))
+
+    def insert_and_reload(messages):
+        # Another request reloads the expired history between the insert and the append
+        wrapped_db.retrieve_messages.return_value = [make_document(i) for i in range(1, 3)] + [dict(message)]
+        cached_db.invalidate()
+        cached_db.retrieve_messages()
+        return True
+
+    wrapped_db.insert_messages.side_effect = insert_and_reload
+    cached_db.insert_message(message)
+
+    assert [msg[Constants.MESSAGE_FIELD] for msg in cached_db.retrieve_messages()] == [
+        "message 1", "message 2", "new message"]
+
+
+def test_ttl_expiry_reloads(wrapped_db, mocker):
+    """Test that the history is reloaded once it is older than the TTL"""
+    clock = mocker.patch('db.cached_db.time.monotonic', return_value=100.0)
+    cached_db = CachedDb(wrapped_db, max_messages=3, ttl=5)
+
+    cached_db.retrieve_messages()
+    clock.return_value = 106.0
+    cached_db.retrieve_messages()
+
+    assert wrapped_db.retrieve_messages.call_count == 2
+
+
+def test_after_cached_position(cached_db, wrapped_db):
+    """Test that reads after a cached position are served from the cache"""
+    after = (make_document(1)[Constants.TIMESTAMP_FIELD], 1)
+
+    messages = cached_db.retrieve_messages(after=after, limit=1)
+
+    assert messages == [make_document(2)]
+    wrapped_db.retrieve_messages.assert_called_once_with(conversation_id="default")
+
+
+def test_after_unknown_position_falls_through(cached_db, wrapped_db):
+    """Test that reads after a position older than the cached messages go to the database"""
+    after = (datetime(2024, 1, 1), 0)
+
+    cached_db.retrieve_messages(after=after, limit=10)
+
+    wrapped_db.retrieve_messages.assert_called_with(after=after, limit=10, conversation_id="default")
+    assert cached_db.cache_stats()["misses"] == 1
+
+
+def test_delete_invalidates_the_cache(cached_db, wrapped_db):
+    """Test that deleting messages forces the next read to reload"""
+    cached_db.retrieve_messages()
+    cached_db.delete_messages_by_timestamp(datetime.now())
+    cached_db.retrieve_messages()
+
+    assert wrapped_db.retrieve_messages.call_count == 2
+
+
+def test_snapshot_rebuilt_only_on_change(cached_db, wrapped_db):
+    """Test that a snapshot is memoized until the cached history changes"""
+    build = MagicMock(side_effect=len)
+
+    assert cached_db.snapshot(build) == 3
+    assert cached_db.snapshot(build) == 3
+    assert build.call_count == 1
+
+    cached_db.insert_message(Message(user="AI", message="new message", timestamp=datetime.now()))
+    assert cached_db.snapshot(build) == 3
+    assert build.call_count == 2
+    wrapped_db.retrieve_messages.assert_called_once_with(conversation_id="default")
+
+
+def test_conversations_are_cached_separately(cached_db, wrapped_db):
+    """Test that writes to one conversation leave the cached history of another untouched"""
+    cached_db.retrieve_messages(conversation_id="a")
+    cached_db.retrieve_messages(conversation_id="b")
+
+    cached_db.insert_message(Message(user="AI", message="new message", timestamp=datetime.now(), conversation_id="a"))
+
+    assert cached_db.retrieve_messages(conversation_id="a")[-1][Constants.MESSAGE_FIELD] == "new message"
+    assert cached_db.retrieve_messages(conversation_id="b") == [make_document(i) for i in range(3)]
+    assert wrapped_db.retrieve_messages.call_count == 2
+
+
+def test_least_recently_used_conversation_evicted(wrapped_db):
+    """Test that only max_conversations histories are kept"""
+    cached_db = CachedDb(wrapped_db, max_messages=3, ttl=60, max_conversations=2)
+
+    for conversation_id in ["a", "b", "a", "c", "a"]:
+        cached_db.retrieve_messages(conversation_id=conversation_id)
+
+    assert [call.kwargs["conversation_id"] for call in wrapped_db.retrieve_messages.call_args_list] == ["a", "b", "c"]
+    assert cached_db.cache_stats()["conversations"] == 2
@@ -0,0 +1,58 @@
+import gzip
+
+import brotli
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from utils.compression_utils import BROTLI, ENCODINGS, GZIP, compress, negotiate_encoding, precompress
+
+BODY = b'{"message": "Hello AI!"}' * 100
+
+
+def accept(header: str) -> Accept:
+    """Parse an Accept-Encoding header"""
+    return parse_accept_header(header)
+
+
+@pytest.mark.parametrize("encoding,decompress", [(GZIP, gzip.decompress), (BROTLI, brotli.decompress)])
+def test_compress_round_trips(encoding, decompress):
+    """Test that each supported coding compresses the body"""
+    encoded = compress(BODY, encoding)
+
+    assert decompress(encoded) == BODY
+    assert len(encoded) < len(BODY)
+
+
+def test_gzip_is_deterministic():
+    """Test that gzip output carries no timestamp, so that equal bodies have equal encodings"""
+    assert compress(BODY, GZIP) == compress(BODY, GZIP)
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("gzip, deflate, br", BROTLI),
+    ("gzip, deflate", GZIP),
+    ("br;q=0.5, gzip", GZIP),
+    ("*", BROTLI),
+    ("identity", None),
+    ("br;q=0, gzip;q=0", None),
+    ("", None),
+])
+def test_negotiate_encoding(header, expected):
+    """Test that the accepted coding with the highest quality wins, brotli on ties"""
+    assert negotiate_encoding(accept(header)) == expected
+
+
+def test_negotiate_among_available_encodings():
+    """Test that only the available codings are considered"""
+    assert negotiate_encoding(accept("br, gzip"), [GZIP]) == GZIP
+
+
+def test_precompress():
+    """Test that a static body is prepared in every coding with a validator of its content"""
+    page = precompress(BODY)
+
+    assert set(page.encoded_bodies) == set(ENCODINGS)
+    assert brotli.decompress(page.encoded_bodies[BROTLI]) == BODY
+    assert gzip.decompress(page.encoded_bodies[GZIP]) == BODY
+    assert page.etag == precompress(BODY).etag != precompress(BODY + b" ").etag
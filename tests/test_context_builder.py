@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ai.context_builder import MESSAGE_OVERHEAD_TOKENS, ContextBuilder, estimate_tokens
+from db.in_memory_db import InMemoryDb
+from models.message import Message
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class CountingTokenizer:
+    """Counts one token per word and records the texts it was asked to count"""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text: str) -> int:
+        self.texts.append(text)
+        return len(text.split())
+
+
+@pytest.fixture
+def db():
+    """Create an in-memory message store"""
+    return InMemoryDb(100)
+
+
+@pytest.fixture
+def tokenizer():
+    """Create a word counting tokenizer"""
+    return CountingTokenizer()
+
+
+def store(db: InMemoryDb, *texts: str, conversation_id: str = "default", offset: int = 0):
+    """Store alternating user and AI messages, one second apart"""
+    db.insert_messages([
+        Message(user="User" if (offset + i) % 2 == 0 else "AI", message=text,
+                timestamp=START + timedelta(seconds=offset + i), conversation_id=conversation_id)
+        for i, text in enumerate(texts)])
+
+
+def contents(context: list[dict]) -> list[str]:
+    """The texts of a context"""
+    return [message["content"] for message in context]
+
+
+def test_estimate_tokens():
+    """Test that tokens are estimated at four characters each, rounded up"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_context_holds_earlier_turns_with_roles(db, tokenizer):
+    """Test that stored messages become chat completion messages, oldest first"""
+    store(db, "My name is Ada", "Hello Ada")
+
+    context = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer).build("What is my name?")
+
+    assert context == [{"role": "user", "content": "My name is Ada"}, {"role": "assistant", "content": "Hello Ada"}]
+
+
+def test_context_fits_budget(db, tokenizer):
+    """Test that only the newest messages that fit in the budget, together with the new message, are sent"""
+    store(db, "one two three", "four five", "six", "seven eight")
+    per_message = MESSAGE_OVERHEAD_TOKENS
+    # The new message (1 word) and the two newest messages (1 and 2 words) fit, the third newest (2 words) does not
+    builder = ContextBuilder(db, max_tokens=1 + 1 + 2 + 4 * per_message, count_tokens=tokenizer)
+
+    context = builder.build("nine")
+
+    assert contents(context) == ["six", "seven eight"]
+    assert sum(builder.message_tokens(text) for text in ["nine", *contents(context)]) <= builder.max_tokens
+
+
+def test_message_over_budget_is_left_out(db, tokenizer):
+    """Test that a single message larger than the budget is never sent"""
+    store(db, "word " * 50)
+
+    assert ContextBuilder(db, max_tokens=20, count_tokens=tokenizer).build("Hello") == []
+
+
+def test_token_counts_are_cached(db, tokenizer):
+    """Test that each stored message is counted once however many times the context is built"""
+    store(db, "My name is Ada", "Hello Ada")
+    builder = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer)
+
+    builder.build("first")
+    builder.build("second")
+    store(db, "second", "Nice to meet you", offset=2)
+    context = builder.build("third")
+
+    assert contents(context) == ["My name is Ada", "Hello Ada", "second", "Nice to meet you"]
+    stored_counts = [text for text in tokenizer.texts if text not in ("first", "second", "third")]
+    assert sorted(stored_counts) == sorted(["My name is Ada", "Hello Ada", "Nice to meet you"])
+    assert tokenizer.texts.count("second") == 2
+
+
+def test_window_reads_only_new_messages(db, tokenizer, mocker):
+    """Test that later builds resume reading after the messages already in the window"""
+    store(db, "My name is Ada", "Hello Ada")
+    builder = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer)
+    builder.build("first")
+    retrieve = mocker.spy(db, "retrieve_messages")
+
+    store(db, "How are you?", "Fine", offset=2)
+    builder.build("second")
+
+    # The last message already in the window is read again, to check that it is still stored
+    assert [message["message"] for message in retrieve.spy_return] == ["Hello Ada", "How are you?", "Fine"]
+    assert tokenizer.texts.count("Hello Ada") == 1
+
+
+def test_window_is_rebuilt_after_clear(db, tokenizer):
+    """Test that a cleared conversation's window is dropped rather than sent as context"""
+    store(db, "My name is Ada", "Hello Ada")
+    builder = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer)
+    builder.build("first")
+
+    db.clear_messages()
+    assert builder.build("second") == []
+    store(db, "My name is Bob", "Hello Bob", offset=2)
+    assert contents(builder.build("third")) == ["My name is Bob", "Hello Bob"]
+
+
+def test_stored_text_is_unescaped(db, tokenizer):
+    """Test that the context carries the text the user wrote rather than its stored HTML-escaped form"""
+    store(db, "is 1 &lt; 2 &amp;&amp; 3 &gt; 2?", "Yes")
+    builder = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer)
+
+    assert contents(builder.build("next")) == ["is 1 < 2 && 3 > 2?", "Yes"]
+
+
+def test_window_evicts_oldest_messages(db, tokenizer):
+    """Test that the rolling window drops the oldest messages once the conversation exceeds the budget"""
+    builder = ContextBuilder(db, max_tokens=3 * (1 + MESSAGE_OVERHEAD_TOKENS), count_tokens=tokenizer)
+    for turn in range(5):
+        store(db, f"u{turn}", f"a{turn}", offset=2 * turn)
+        builder.build("next")
+
+    window = builder._windows["default"]
+    assert contents([message for message, _ in window.entries]) == ["a3", "u4", "a4"]
+    assert window.tokens == sum(tokens for _, tokens in window.entries)
+
+
+def test_conversations_are_isolated(db, tokenizer):
+    """Test that each conversation has its own context"""
+    store(db, "about cats", conversation_id="cats")
+    store(db, "about dogs", conversation_id="dogs")
+    builder = ContextBuilder(db, max_tokens=100, count_tokens=tokenizer)
+
+    assert contents(builder.build("Hello", "cats")) == ["about cats"]
+    assert contents(builder.build("Hello", "dogs")) == ["about dogs"]
+
+
+def test_least_recently_used_windows_are_dropped(db, tokenizer):
+    """Test that at most max_conversations windows are kept"""
+    builder = ContextBuilder(db, max_tokens=100, max_conversations=2, count_tokens=tokenizer)
+
+    for conversation_id in ["a", "b", "a", "c"]:
+        builder.build("Hello", conversation_id)
+
+    assert list(builder._windows) == ["a", "c"]
@@ -0,0 +1,126 @@
+"""Behaviour every message store must share, run against each backend.
+
+The MongoDb cases need a real MongoDB and are skipped unless MONGO_URI is set.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+from config.constants import Constants, EnvironmentVariables
+from db.in_memory_db import InMemoryDb
+from db.mongo_db import MongoDb
+from db.sqlite_db import SqliteDb
+from models.message import Message
+from utils.message_utils import history_position
+
+START = datetime(2025, 1, 12, 14, 30, tzinfo=timezone.utc)
+MAX_MESSAGES = 100
+
+
+def make_message(second: int, conversation_id: str = "default") -> Message:
+    """Create a message stamped at the given second"""
+    return Message(user="User", message=f"message {second}", timestamp=START + timedelta(seconds=second),
+                   conversation_id=conversation_id)
+
+
+def texts(documents: list[dict]) -> list[str]:
+    """Returns the text of each document"""
+    return [document[Constants.MESSAGE_FIELD] for document in documents]
+
+
+@pytest.fixture(params=["memory", "sqlite", pytest.param("mongo", marks=pytest.mark.integration)])
+def db(request, tmp_path):
+    """Create an empty store of each backend"""
+    if request.param == "memory":
+        yield InMemoryDb(capacity=MAX_MESSAGES)
+    elif request.param == "sqlite":
+        store = SqliteDb(str(tmp_path / "messages.db"), MAX_MESSAGES)
+        yield store
+        store.close()
+    else:
+        mongodb_uri = os.getenv(EnvironmentVariables.MONGO_URI_VARIABLE)
+        if not mongodb_uri:
+            pytest.skip("No MONGO_URI environment variable found")
+        app = Flask(__name__)
+        app.config[Constants.MONGO_URI_FIELD] = mongodb_uri
+        app.config[Constants.MAX_MESSAGES_FIELD] = MAX_MESSAGES
+        store = MongoDb(app)
+        store.clear_messages()
+        yield store
+        store.clear_messages()
+
+
+def test_documents_shaped_like_mongodb(db):
+    """Test that documents have no id and naive UTC timestamps truncated to milliseconds"""
+    timestamp = datetime(2025, 1, 12, 15, 30, 0, 123456, tzinfo=timezone(timedelta(hours=1)))
+    assert db.insert_message(Message(user="User", message="hello", timestamp=timestamp))
+
+    assert db.retrieve_messages() == [{
+        Constants.USER_FIELD: "User",
+        Constants.MESSAGE_FIELD: "hello",
+        Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30, 0, 123000),
+        Constants.CONVERSATION_ID_FIELD: "default",
+    }]
+
+
+def test_messages_ordered_by_timestamp(db):
+    """Test that history is oldest first, including messages inserted late"""
+    db.insert_messages([make_message(0), make_message(2)])
+    db.insert_message(make_message(1))
+
+    assert texts(db.retrieve_messages()) == ["message 0", "message 1", "message 2"]
+    assert texts(db.retrieve_messages(limit=2)) == ["message 0", "message 1"]
+
+
+def test_retrieve_after_position(db):
+    """Test that pages resume after a position, including within equal timestamps"""
+    db.insert_messages([make_message(0), make_message(1), make_message(1), make_message(2)])
+    first = db.retrieve_messages(limit=2)
+
+    rest = db.retrieve_messages(after=history_position(first), limit=10)
+
+    assert texts(first) + texts(rest) == ["message 0", "message 1", "message 1", "message 2"]
+    assert db.retrieve_messages(after=history_position(first), limit=1) == rest[:1]
+
+
+def test_conversations_are_separate(db):
+    """Test that reads, counts, deletes and retention only see their own conversation"""
+    db.insert_messages([make_message(0, "a"), make_message(1, "b"), make_message(2, "a")])
+
+    db.delete_messages_by_timestamp(START + timedelta(seconds=1), "b")
+    db.enforce_retention(1, "a")
+
+    assert texts(db.retrieve_messages(conversation_id="a")) == ["message 2"]
+    assert db.count_messages("b") == 0
+    assert db.retrieve_messages() == []
+
+
+def test_delete_messages_by_timestamp(db):
+    """Test that deleting removes messages at or before the cutoff"""
+    db.insert_messages([make_message(second) for second in range(4)])
+
+    db.delete_messages_by_timestamp(START + timedelta(seconds=1))
+
+    assert texts(db.retrieve_messages()) == ["message 2", "message 3"]
+
+
+def test_enforce_retention_keeps_newest(db):
+    """Test that retention keeps the newest messages and leaves conversations within the limit alone"""
+    db.insert_messages([make_message(second) for second in range(5)])
+
+    db.enforce_retention(5)
+    assert db.count_messages() == 5
+
+    db.enforce_retention(2)
+    assert texts(db.retrieve_messages()) == ["message 3", "message 4"]
+
+
+def test_clear_messages(db):
+    """Test clearing every conversation"""
+    db.insert_messages([make_message(0, "a"), make_message(1, "b")])
+
+    db.clear_messages()
+
+    assert db.count_messages("a") == db.count_messages("b") == 0
@@ -66,3 +66,41 @@ def test_get_ai_response_random_distribution(ai):
         count = responses.count(response)
         # Allow for 30% deviation from expected count
         assert expected_count * 0.7 <= count <= expected_count * 1.3
+
+
+def test_stream_ai_response_reassembles_response(ai):
+    """Test that the streamed chunks join back into one of the dummy responses."""
+    chunks = list(ai.stream_ai_response("Hello"))
+    assert len(chunks) > 1
+    assert "".join(chunks) in DUMMY_RESPONSES
+
+
+def test_get_ai_response_injects_latency(mocker):
+    """Test that the configured latency is applied before responding."""
+    mock_sleep = mocker.patch('ai.dummy_ai.time.sleep')
+    DummyAI(latency=0.5).get_ai_response("Hello")
+    mock_sleep.assert_called_once_with(0.5)
+
+
+def test_get_ai_response_injects_jitter(mocker):
+    """Test that the latency randomly deviates by at most the jitter, and never becomes negative."""
+    mock_sleep = mocker.patch('ai.dummy_ai.time.sleep')
+    mocker.patch('ai.dummy_ai.random.uniform', side_effect=[0.2, -0.2])
+    ai = DummyAI(latency=0.1, jitter=0.2)
+
+    ai.get_ai_response("Hello")
+    ai.get_ai_response("Hello")
+
+    assert mock_sleep.call_args_list[0].args[0] == pytest.approx(0.3)
+    assert len(mock_sleep.call_args_list) == 1
+
+
+def test_stream_ai_response_injects_chunk_latency(mocker):
+    """Test that the first chunk waits for the latency and later chunks for the chunk latency."""
+    mock_sleep = mocker.patch('ai.dummy_ai.time.sleep')
+    mocker.patch('ai.dummy_ai.random.choice', return_value="one two three")
+
+    chunks = list(DummyAI(latency=0.5, chunk_latency=0.1).stream_ai_response("Hello"))
+
+    assert chunks == ["one ", "two ", "three"]
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 0.1, 0.1]
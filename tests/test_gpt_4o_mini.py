@@ -3,21 +3,25 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from ai.gpt_4o_mini import GPT4oMini
+from ai.base_ai import AIStreamError
+from ai.gpt_4o_mini import ERROR_RESPONSE, GPT4oMini
+from ai.openai_client import reset_openai_client
 from config.constants import Constants
 
 
 @pytest.fixture
 def ai():
-    """Fixture to create a GPT4oMini instance for each test."""
-    return GPT4oMini()
+    """Fixture to create a GPT4oMini instance (with no shared OpenAI client yet) for each test."""
+    reset_openai_client()
+    yield GPT4oMini()
+    reset_openai_client()
 
 
 @pytest.fixture
 def mock_openai(mocker):
     """Fixture to mock OpenAI client and its responses."""
     mock_client = MagicMock()
-    mocker.patch('ai.gpt_4o_mini.OpenAI', return_value=mock_client)
+    mocker.patch('ai.openai_client.OpenAI', return_value=mock_client)
     return mock_client
 
 
@@ -88,6 +92,27 @@ def test_get_ai_response_missing_api_key(ai, mocker):
     assert response == "I apologize, but I'm having trouble processing your request."
 
 
+def test_warm_up_creates_client(ai, mock_openai, mocker):
+    """Test that warming up creates the shared client that the first request then reuses."""
+    openai_class = mocker.patch('ai.openai_client.OpenAI', return_value=mock_openai)
+
+    ai.warm_up()
+    ai.get_ai_response("Test message")
+
+    openai_class.assert_called_once()
+    mock_openai.chat.completions.create.assert_called_once()
+
+
+def test_warm_up_failure_is_logged(ai, mocker, caplog):
+    """Test that a client that cannot be created is reported without failing startup."""
+    mocker.patch('ai.openai_client.OpenAI', side_effect=Exception("Missing API key"))
+
+    with caplog.at_level(logging.WARNING):
+        ai.warm_up()
+
+    assert "Could not create the OpenAI client: Missing API key" in caplog.text
+
+
 def test_get_ai_response_logs_error(ai, mock_openai, caplog):
     """Test that errors are properly logged."""
     error_message = "API Error"
@@ -123,3 +148,72 @@ def test_get_ai_response_handles_various_inputs(ai, mock_openai, test_input):
     response = ai.get_ai_response(test_input)
     assert response == expected_response
     mock_openai.chat.completions.create.assert_called_once()
+
+
+def make_stream_chunk(content):
+    """Create a mock streamed completion chunk."""
+    mock_chunk = MagicMock()
+    mock_chunk.choices = [MagicMock()]
+    mock_chunk.choices[0].delta.content = content
+    return mock_chunk
+
+
+def test_stream_ai_response_success(ai, mock_openai):
+    """Test that streamed deltas are yielded as they arrive, skipping empty ones."""
+    mock_openai.chat.completions.create.return_value = iter([
+        make_stream_chunk("Hello"),
+        make_stream_chunk(None),
+        make_stream_chunk(" world"),
+    ])
+
+    chunks = list(ai.stream_ai_response("Test message"))
+
+    assert chunks == ["Hello", " world"]
+    mock_openai.chat.completions.create.assert_called_once_with(
+        messages=[
+            {
+                Constants.ROLE_FIELD: "user",
+                Constants.CONTENT_FIELD: "Test message"
+            }
+        ],
+        model="gpt-4o-mini",
+        stream=True,
+    )
+
+
+def test_get_ai_response_sends_context(ai, mock_openai):
+    """Test that the conversation context precedes the user message in the payload."""
+    context = [
+        {Constants.ROLE_FIELD: "user", Constants.CONTENT_FIELD: "My name is Ada"},
+        {Constants.ROLE_FIELD: "assistant", Constants.CONTENT_FIELD: "Hello Ada"},
+    ]
+
+    ai.get_ai_response("What is my name?", context)
+
+    mock_openai.chat.completions.create.assert_called_once_with(
+        messages=[*context, {Constants.ROLE_FIELD: "user", Constants.CONTENT_FIELD: "What is my name?"}],
+        model="gpt-4o-mini",
+    )
+
+
+def test_stream_ai_response_api_error(ai, mock_openai):
+    """Test that a streaming API error raises AIStreamError carrying the apology response."""
+    mock_openai.chat.completions.create.side_effect = Exception("API Error")
+
+    with pytest.raises(AIStreamError) as error:
+        list(ai.stream_ai_response("Test message"))
+    assert error.value.error_response == ERROR_RESPONSE
+
+
+def test_stream_ai_response_mid_stream_error(ai, mock_openai):
+    """Test that an error after some chunks were yielded is raised rather than appended to the response."""
+    def stream():
+        yield make_stream_chunk("Hello")
+        raise Exception("Connection reset")
+    mock_openai.chat.completions.create.return_value = stream()
+
+    chunks = []
+    with pytest.raises(AIStreamError):
+        for chunk in ai.stream_ai_response("Test message"):
+            chunks.append(chunk)
+    assert chunks == ["Hello"]
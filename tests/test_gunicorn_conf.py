@@ -0,0 +1,101 @@
+import os
+import runpy
+import signal
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+import app as chat_app
+
+CONFIG_PATH = Path(__file__).parent.parent / "gunicorn.conf.py"
+
+
+@pytest.fixture
+def load_config(monkeypatch, tmp_path):
+    """Load the server configuration under the given environment variables, restoring the environment afterwards"""
+    for name in ("WORKERS", "WORKER_THREADS", "GRACEFUL_TIMEOUT", "APP_HOST", "PORT", "LOG_FILE", "AI_MAX_CONCURRENCY",
+                 "AI_MAX_QUEUE", "STREAM_MAX_SUBSCRIBERS", "BROADCASTER"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path / "metrics"))
+
+    def load(**env) -> dict:
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return runpy.run_path(str(CONFIG_PATH))
+
+    return load
+
+
+def test_defaults(load_config):
+    """Test that there is one worker with several threads, and that logs go to the console"""
+    config = load_config()
+
+    assert config["wsgi_app"] == "app:create_app()"
+    assert not config["preload_app"]
+    assert config["bind"] == "127.0.0.1:5000"
+    assert config["workers"] == 1
+    assert config["worker_class"] == "gthread"
+    assert config["threads"] == 64
+    assert config["graceful_timeout"] == 30
+    assert os.environ["LOG_FILE"] == ""
+
+
+def test_environment_overrides(load_config):
+    """Test that the bind address and worker pool sizes are read from the environment"""
+    config = load_config(APP_HOST="0.0.0.0", PORT="8000", WORKERS="3", WORKER_THREADS="8", GRACEFUL_TIMEOUT="10",
+                         AI_MAX_CONCURRENCY="2", AI_MAX_QUEUE="4", STREAM_MAX_SUBSCRIBERS="1",
+                         BROADCASTER="mongo_change_stream")
+
+    assert config["bind"] == "0.0.0.0:8000"
+    assert config["workers"] == 3
+    assert config["threads"] == 8
+    assert config["graceful_timeout"] == 10
+
+
+def test_workers_per_cpu_need_change_stream_broadcaster(load_config):
+    """Test that several workers are only started with a broadcaster that reaches the clients of every worker"""
+    assert load_config(BROADCASTER="mongo_change_stream")["workers"] == len(os.sched_getaffinity(0))
+
+    with pytest.raises(ValueError, match="requires BROADCASTER=mongo_change_stream"):
+        load_config(WORKERS="2", BROADCASTER="in_process")
+
+
+def test_ai_and_stream_slots_must_leave_threads_free(load_config):
+    """Test that startup fails when requests running and queued for AI calls and /chat/stream clients could take
+    every thread, as the AI bulkhead and the stream limit could then never shed load"""
+    config = load_config(WORKER_THREADS="41", AI_MAX_CONCURRENCY="16", AI_MAX_QUEUE="16", STREAM_MAX_SUBSCRIBERS="8")
+    assert (config["ai_slots"], config["stream_slots"]) == (32, 8)
+
+    with pytest.raises(ValueError, match="must be less than WORKER_THREADS"):
+        load_config(WORKER_THREADS="40", AI_MAX_CONCURRENCY="16", AI_MAX_QUEUE="16", STREAM_MAX_SUBSCRIBERS="8")
+
+
+def test_on_starting_empties_metrics_directory(load_config, tmp_path):
+    """Test that metric files left by a previous run's workers are removed"""
+    config = load_config()
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "counter_1.db").write_bytes(b"stale")
+
+    config["on_starting"](None)
+
+    assert metrics_dir.is_dir()
+    assert list(metrics_dir.iterdir()) == []
+
+
+def test_sigterm_drains_the_app(load_config, monkeypatch):
+    """Test that the worker's SIGTERM handler still stops the worker, and also drains its app straight away"""
+    config = load_config()
+    handlers = {}
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: handlers.__setitem__(signum, handler))
+    drain = MagicMock()
+    monkeypatch.setattr(chat_app, "drain", drain)
+    worker = MagicMock(wsgi=Flask(__name__))
+
+    config["post_worker_init"](worker)
+    handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+    worker.handle_exit.assert_called_once_with(signal.SIGTERM, None)
+    drain.assert_called_once_with(worker.wsgi)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.constants import Constants
+from db.in_memory_db import InMemoryDb
+from models.message import Message
+from utils.message_utils import history_position
+
+START = datetime(2025, 1, 12, 14, 30, tzinfo=timezone.utc)
+
+
+def make_message(second: int, conversation_id: str = "default") -> Message:
+    """Create a message stamped at the given second"""
+    return Message(user="User", message=f"message {second}", timestamp=START + timedelta(seconds=second),
+                   conversation_id=conversation_id)
+
+
+def texts(documents: list[dict]) -> list[str]:
+    """Returns the text of each document"""
+    return [document[Constants.MESSAGE_FIELD] for document in documents]
+
+
+@pytest.fixture
+def db():
+    """Create an in-memory store keeping five messages per conversation"""
+    return InMemoryDb(capacity=5)
+
+
+def test_documents_shaped_like_mongodb(db):
+    """Test that documents have no _id and naive UTC timestamps truncated to milliseconds"""
+    timestamp = datetime(2025, 1, 12, 15, 30, 0, 123456, tzinfo=timezone(timedelta(hours=1)))
+    db.insert_message(Message(user="User", message="hello", timestamp=timestamp))
+
+    assert db.retrieve_messages() == [{
+        Constants.USER_FIELD: "User",
+        Constants.MESSAGE_FIELD: "hello",
+        Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30, 0, 123000),
+        Constants.CONVERSATION_ID_FIELD: "default",
+    }]
+
+
+def test_full_buffer_drops_oldest(db):
+    """Test that inserting beyond capacity drops the oldest messages"""
+    db.insert_messages([make_message(second) for second in range(7)])
+
+    assert texts(db.retrieve_messages()) == [f"message {second}" for second in range(2, 7)]
+    assert db.count_messages() == 5
+    assert db.get_nth_newest() == []
+    assert db.get_nth_newest(max_messages=2) == [{Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30, 4)}]
+
+
+def test_late_message_inserted_in_order(db):
+    """Test that a message older than the newest one is inserted in timestamp order"""
+    db.insert_messages([make_message(0), make_message(2)])
+    db.insert_message(make_message(1))
+
+    assert texts(db.retrieve_messages()) == ["message 0", "message 1", "message 2"]
+
+
+def test_late_message_older_than_full_buffer_dropped(db):
+    """Test that a late message older than everything in a full buffer is not kept"""
+    db.insert_messages([make_message(second) for second in range(1, 6)])
+    db.insert_message(make_message(0))
+
+    assert texts(db.retrieve_messages()) == [f"message {second}" for second in range(1, 6)]
+
+
+def test_retrieve_after_position(db):
+    """Test that pages resume after a position, including within equal timestamps"""
+    db.insert_messages([make_message(0), make_message(1), make_message(1), make_message(2)])
+    first = db.retrieve_messages(limit=2)
+
+    rest = db.retrieve_messages(after=history_position(first), limit=10)
+
+    assert texts(first) + texts(rest) == ["message 0", "message 1", "message 1", "message 2"]
+    assert db.retrieve_messages(after=history_position(first), limit=1) == rest[:1]
+
+
+def test_conversations_are_separate(db):
+    """Test that each conversation has its own buffer"""
+    db.insert_messages([make_message(0, "a"), make_message(1, "b")])
+
+    assert texts(db.retrieve_messages(conversation_id="a")) == ["message 0"]
+    assert db.count_messages("b") == 1
+    assert db.retrieve_messages() == []
+
+
+def test_delete_and_retention(db):
+    """Test deleting by timestamp and trimming to a limit below the capacity"""
+    db.insert_messages([make_message(second) for second in range(5)])
+
+    db.delete_messages_by_timestamp(START + timedelta(seconds=1))
+    assert texts(db.retrieve_messages()) == ["message 2", "message 3", "message 4"]
+
+    db.enforce_retention(2)
+    assert texts(db.retrieve_messages()) == ["message 3", "message 4"]
+
+
+def test_returned_documents_are_copies(db):
+    """Test that callers cannot modify stored messages"""
+    db.insert_message(make_message(0))
+
+    db.retrieve_messages()[0][Constants.MESSAGE_FIELD] = "changed"
+
+    assert texts(db.retrieve_messages()) == ["message 0"]
+
+
+def test_clear_messages(db):
+    """Test clearing every conversation"""
+    db.insert_messages([make_message(0, "a"), make_message(1, "b")])
+
+    db.clear_messages()
+
+    assert db.count_messages("a") == db.count_messages("b") == 0
@@ -0,0 +1,78 @@
+from queue import Empty
+
+import pytest
+
+from broadcast.base_broadcaster import CLOSED
+from broadcast.in_process_broadcaster import InProcessBroadcaster
+from config.constants import Constants
+
+
+@pytest.fixture
+def broadcaster():
+    """Fixture to create an InProcessBroadcaster instance for each test."""
+    return InProcessBroadcaster(queue_size=2)
+
+
+def test_publish_reaches_every_subscriber(broadcaster):
+    """Test that a published message is delivered to all subscribers."""
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+    message = {Constants.USER_FIELD: "User", Constants.MESSAGE_FIELD: "Hello"}
+
+    broadcaster.publish(message)
+
+    assert first.get_nowait() == message
+    assert second.get_nowait() == message
+
+
+def test_unsubscribe_stops_delivery(broadcaster):
+    """Test that unsubscribed queues no longer receive messages."""
+    subscription = broadcaster.subscribe()
+    broadcaster.unsubscribe(subscription)
+
+    broadcaster.publish({Constants.MESSAGE_FIELD: "Hello"})
+
+    assert broadcaster.subscriber_count() == 0
+    with pytest.raises(Empty):
+        subscription.get_nowait()
+
+
+def test_slow_subscriber_does_not_block(broadcaster):
+    """Test that a full subscriber queue drops messages instead of blocking the publisher."""
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+
+    for i in range(3):
+        broadcaster.publish({Constants.MESSAGE_FIELD: str(i)})
+        fast.get_nowait()
+
+    assert slow.qsize() == 2
+
+
+def test_publish_reaches_only_its_conversation(broadcaster):
+    """Test that a message is only delivered to the subscribers of its conversation."""
+    default = broadcaster.subscribe()
+    other = broadcaster.subscribe("other")
+    message = {Constants.MESSAGE_FIELD: "Hello", Constants.CONVERSATION_ID_FIELD: "other"}
+
+    broadcaster.publish(message)
+
+    assert other.get_nowait() == message
+    with pytest.raises(Empty):
+        default.get_nowait()
+
+
+def test_close_wakes_every_subscriber(broadcaster):
+    """Test that closing delivers CLOSED to every subscriber, making room in full queues, and to later subscribers."""
+    idle = broadcaster.subscribe()
+    full = broadcaster.subscribe("other")
+    for i in range(2):
+        broadcaster.publish({Constants.MESSAGE_FIELD: str(i), Constants.CONVERSATION_ID_FIELD: "other"})
+
+    broadcaster.close()
+
+    assert idle.get_nowait() is CLOSED
+    assert [full.get_nowait() for _ in range(2)][-1] is CLOSED
+    late = broadcaster.subscribe()
+    assert late.get_nowait() is CLOSED
+    assert broadcaster.subscriber_count() == 2
@@ -0,0 +1,39 @@
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+
+from db.base_db import BaseDb
+from db.instrumented_db import InstrumentedDb
+
+
+def call_count(operation: str) -> float:
+    """Read the number of store calls recorded for an operation"""
+    return REGISTRY.get_sample_value("chat_db_call_seconds_count", {"operation": operation}) or 0.0
+
+
+def test_calls_are_delegated_and_timed():
+    """Test that each call reaches the wrapped store and is recorded under its operation"""
+    wrapped_db = MagicMock(spec=BaseDb)
+    wrapped_db.count_messages.return_value = 3
+    db = InstrumentedDb(wrapped_db)
+    before = call_count("count_messages")
+
+    assert db.count_messages("a") == 3
+
+    wrapped_db.count_messages.assert_called_once_with("a")
+    assert call_count("count_messages") == before + 1
+
+
+def test_failed_calls_are_timed():
+    """Test that a call that raises is still recorded"""
+    wrapped_db = MagicMock(spec=BaseDb)
+    wrapped_db.enforce_retention.side_effect = RuntimeError("down")
+    db = InstrumentedDb(wrapped_db)
+    before = call_count("enforce_retention")
+
+    try:
+        db.enforce_retention(10)
+    except RuntimeError:
+        pass
+
+    assert call_count("enforce_retention") == before + 1
@@ -0,0 +1,89 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import brotli
+import pytest
+from flask import Flask
+from werkzeug import http
+
+from config.constants import Constants
+from utils.json_utils import OrjsonProvider, encode_history, http_date
+from utils.message_utils import decode_cursor
+
+
+@pytest.fixture
+def messages():
+    """Create a page of stored message documents"""
+    return [
+        {
+            Constants.USER_FIELD: "User",
+            Constants.MESSAGE_FIELD: "Héllo <b>",
+            Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30)
+        },
+        {
+            Constants.USER_FIELD: "AI",
+            Constants.MESSAGE_FIELD: "Hi",
+            Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 31)
+        },
+    ]
+
+
+@pytest.fixture
+def app():
+    """Create a Flask test app using the orjson provider"""
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    return app
+
+
+def test_orjson_matches_default_provider(app, messages):
+    """Test that the orjson provider produces the same documents (including HTTP dates) as Flask's default"""
+    payload = {Constants.STATUS_FIELD: "success", "messages": messages}
+
+    assert json.loads(app.json.dumps(payload)) == json.loads(Flask(__name__).json.dumps(payload))
+    assert app.json.loads(app.json.dumps(payload))["messages"][0][Constants.TIMESTAMP_FIELD] == \
+        "Sun, 12 Jan 2025 14:30:00 GMT"
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2025, 1, 12, 14, 30, 5, 123000),
+    datetime(2024, 2, 29, 23, 59, 59, tzinfo=timezone.utc),
+    datetime(2025, 1, 1, 1, 0, tzinfo=timezone(timedelta(hours=5))),
+])
+def test_http_date_matches_werkzeug(value):
+    """Test that the fast HTTP date formatter agrees with werkzeug's"""
+    assert http_date(value) == http.http_date(value)
+
+
+def test_orjson_response(app, messages):
+    """Test that jsonify-style responses are encoded with orjson"""
+    with app.app_context():
+        response = app.json.response(messages)
+
+    assert response.mimetype == "application/json"
+    assert response.get_data() == app.json.dumps_bytes(messages)
+
+
+def test_encode_history(app, messages):
+    """Test that an encoded history carries its cursor, validator and optional gzip and brotli bodies"""
+    history = encode_history(app.json, messages, compress=True)
+
+    assert json.loads(history.body) == json.loads(app.json.dumps(messages))
+    assert gzip.decompress(history.gzip_body) == history.body
+    assert brotli.decompress(history.br_body) == history.body
+    assert history.encoded_bodies() == {"br": history.br_body, "gzip": history.gzip_body}
+    assert decode_cursor(history.next_cursor) == (datetime(2025, 1, 12, 14, 31, tzinfo=timezone.utc), 1)
+    assert history.message_count == 2
+    assert encode_history(app.json, messages).gzip_body is None
+    assert encode_history(app.json, messages).encoded_bodies() == {}
+    assert encode_history(app.json, messages).etag == history.etag
+    assert encode_history(app.json, messages[:1]).etag != history.etag
+
+
+def test_encode_empty_history(app):
+    """Test that an empty history has no cursor"""
+    history = encode_history(app.json, [])
+
+    assert history.body == b"[]"
+    assert history.next_cursor is None
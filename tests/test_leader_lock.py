@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from config.constants import Constants
+from db.leader_lock import MongoLeaderLock
+
+
+@pytest.fixture
+def collection():
+    """Create a mock lock collection"""
+    return MagicMock(spec=Collection)
+
+
+def test_acquire_claims_free_or_expired_lease(collection):
+    """Test that acquiring upserts the lease, matching only a lease that has expired or is already held"""
+    lock = MongoLeaderLock(collection, "retention", lease_seconds=30)
+
+    assert lock.acquire() is True
+    query, update = collection.update_one.call_args.args
+    now = datetime.now(tz=timezone.utc)
+    assert query[Constants.ID_FIELD] == "retention"
+    assert query["$or"][0][Constants.EXPIRES_AT_FIELD]["$lte"] <= now
+    assert query["$or"][1] == {Constants.OWNER_FIELD: lock.owner}
+    assert update["$set"][Constants.OWNER_FIELD] == lock.owner
+    assert update["$set"][Constants.EXPIRES_AT_FIELD] > now
+    assert collection.update_one.call_args.kwargs == {"upsert": True}
+
+
+def test_acquire_fails_while_held_elsewhere(collection):
+    """Test that a live lease of another owner makes the upsert collide, so the lock is not taken"""
+    collection.update_one.side_effect = DuplicateKeyError("duplicate key")
+
+    assert MongoLeaderLock(collection, "retention").acquire() is False
+
+
+def test_backend_errors_are_not_leadership(collection):
+    """Test that a lock that cannot be read is treated as held elsewhere"""
+    collection.update_one.side_effect = PyMongoError("unavailable")
+
+    assert MongoLeaderLock(collection, "retention").acquire() is False
+
+
+def test_release_deletes_own_lease(collection):
+    """Test that releasing only removes a lease held by this owner"""
+    lock = MongoLeaderLock(collection, "retention")
+
+    lock.release()
+
+    collection.delete_one.assert_called_once_with({Constants.ID_FIELD: "retention", Constants.OWNER_FIELD: lock.owner})
+
+
+def test_owners_are_unique(collection):
+    """Test that two locks of the same name never share an owner id"""
+    assert MongoLeaderLock(collection, "retention").owner != MongoLeaderLock(collection, "retention").owner
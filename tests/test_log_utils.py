@@ -0,0 +1,128 @@
+import json
+import logging
+import queue
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from utils import log_utils
+from utils.log_utils import DroppingQueueHandler, JsonFormatter, RemoteLogHandler, SamplingFilter, configure_logger, \
+    stop_logging
+
+
+def make_record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    """Create a log record carrying the given extra fields"""
+    record = logging.LogRecord("test", level, __file__, 1, "Something happened", None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def dropped(reason: str) -> float:
+    """Read the number of log records dropped for a reason"""
+    return REGISTRY.get_sample_value("chat_log_records_dropped_total", {"reason": reason}) or 0.0
+
+
+def test_json_formatter_includes_extra_fields():
+    """Test that a record is formatted as one JSON object with its extra fields"""
+    document = json.loads(JsonFormatter().format(make_record(event_type="user_message", message_length=5)))
+
+    assert document["level"] == "INFO"
+    assert document["logger"] == "test"
+    assert document["message"] == "Something happened"
+    assert document["event_type"] == "user_message"
+    assert document["message_length"] == 5
+    assert "levelno" not in document
+
+
+def test_sampling_filter_drops_only_hot_path_events():
+    """Test that hot path events are sampled while warnings and other records are always kept"""
+    sampling = SamplingFilter(sample_rate=0.0)
+
+    assert not sampling.filter(make_record(event_type="user_message"))
+    assert sampling.filter(make_record(logging.WARNING, event_type="user_message"))
+    assert sampling.filter(make_record(event_type="load_shedding"))
+    assert sampling.filter(make_record())
+
+
+def test_sampling_filter_truncates_bodies():
+    """Test that message text longer than max_body_chars is truncated"""
+    record = make_record(body="x" * 50)
+
+    assert SamplingFilter(max_body_chars=10).filter(record)
+
+    assert record.body == "x" * 10 + "…"
+
+
+def test_full_queue_drops_records():
+    """Test that records are dropped rather than blocking when the queue is full"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    before = dropped("queue_full")
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    assert handler.queue.qsize() == 1
+    assert dropped("queue_full") == before + 1
+
+
+def test_remote_handler_posts_batches():
+    """Test that records are posted as newline-delimited JSON once a batch is full"""
+    requests = []
+
+    def collector(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200)
+
+    handler = RemoteLogHandler("http://collector/logs", authorization="Splunk token", batch_size=2,
+                               flush_interval=60, client=httpx.Client(transport=httpx.MockTransport(collector)))
+
+    handler.handle(make_record(event_type="a"))
+    assert not requests
+    handler.handle(make_record(event_type="b"))
+
+    assert len(requests) == 1
+    assert requests[0].headers["Authorization"] == "Splunk token"
+    assert [json.loads(line)["event_type"] for line in requests[0].content.splitlines()] == ["a", "b"]
+
+
+def test_remote_handler_drops_rejected_batches():
+    """Test that a batch the collector rejects is dropped and counted"""
+    handler = RemoteLogHandler("http://collector/logs", batch_size=1, flush_interval=60,
+                               client=httpx.Client(transport=httpx.MockTransport(lambda _: httpx.Response(503))))
+    before = dropped("remote_error")
+
+    handler.handle(make_record())
+
+    assert dropped("remote_error") == before + 1
+    assert handler.buffer == []
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Route logging to a temporary file for the duration of a test"""
+    path = tmp_path / "chat_app.log"
+    yield path
+    stop_logging()
+
+
+def test_configure_logger_writes_json_lines(log_file):
+    """Test that records logged through the queue end up in the log file as JSON"""
+    logger = configure_logger(log_file=str(log_file), max_body_chars=5)
+
+    logger.info("User message received", extra={"event_type": "user_message", "body": "Hello world"})
+    stop_logging()
+
+    documents = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert documents[-1]["message"] == "User message received"
+    assert documents[-1]["body"] == "Hello…"
+
+
+def test_configure_logger_without_log_file(tmp_path, monkeypatch):
+    """Test that an empty log_file only logs to the console"""
+    monkeypatch.chdir(tmp_path)
+    configure_logger(log_file="")
+    try:
+        assert [type(handler) for handler in log_utils._listener.handlers] == [logging.StreamHandler]
+    finally:
+        stop_logging()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.constants import Constants
+from utils.message_utils import (MessageClock, decode_cursor, encode_cursor, history_position, parse_conversation_id,
+                                 utc_timestamp)
+
+
+def make_message(second: int) -> dict:
+    """Create a stored message document stamped at the given second"""
+    return {Constants.MESSAGE_FIELD: "hello", Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30, second)}
+
+
+def test_utc_timestamp_treats_naive_as_utc():
+    """Test that naive (MongoDB) and aware timestamps of the same instant compare equal once normalized"""
+    naive = datetime(2025, 1, 12, 14, 30)
+
+    assert utc_timestamp(naive) == utc_timestamp(naive.replace(tzinfo=timezone.utc))
+    assert utc_timestamp(naive).tzinfo == timezone.utc
+
+
+def test_history_position_counts_trailing_ties():
+    """Test that the position counts the messages sharing the last timestamp"""
+    messages = [make_message(1), make_message(2), make_message(2)]
+
+    assert history_position(messages) == (utc_timestamp(datetime(2025, 1, 12, 14, 30, 2)), 2)
+
+
+def test_history_position_continues_previous_group():
+    """Test that a page made only of ties continues counting from the previous position"""
+    timestamp = utc_timestamp(datetime(2025, 1, 12, 14, 30, 2))
+
+    assert history_position([make_message(2)], after=(timestamp, 2)) == (timestamp, 3)
+    assert history_position([], after=(timestamp, 2)) == (timestamp, 2)
+    assert history_position([]) is None
+
+
+def test_cursor_round_trip():
+    """Test that a cursor decodes back to the position it was created from"""
+    position = (datetime(2025, 1, 12, 14, 30, 0, 123000, tzinfo=timezone.utc), 2)
+
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "bm8tc2VwYXJhdG9y",  # "no-separator"
+    "bm90LWEtZGF0ZXwx",  # "not-a-date|1"
+    "MjAyNS0wMS0xMlQxNDozMDowMHwtMQ==",  # "2025-01-12T14:30:00|-1"
+])
+def test_decode_cursor_invalid(cursor):
+    """Test that malformed cursors raise ValueError"""
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_parse_conversation_id():
+    """Test that a missing conversation id selects the default conversation and unsafe ids are rejected"""
+    assert parse_conversation_id(None) == "default"
+    assert parse_conversation_id("0f8e-4c1a_b") == "0f8e-4c1a_b"
+    for conversation_id in ["", "a b", "a/b", "x" * 65]:
+        with pytest.raises(ValueError):
+            parse_conversation_id(conversation_id)
+
+
+def test_message_clock_never_goes_backwards(mocker):
+    """Test that message timestamps are truncated to milliseconds and survive the wall clock stepping back"""
+    clock = MessageClock()
+    now = datetime(2025, 1, 12, 14, 30, 5, 123456, tzinfo=timezone.utc)
+    mock_datetime = mocker.patch('utils.message_utils.datetime')
+    mock_datetime.now.side_effect = [now, now - timedelta(seconds=1)]
+
+    assert clock.now() == now.replace(microsecond=123000)
+    assert clock.now() == now.replace(microsecond=123000)
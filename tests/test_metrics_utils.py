@@ -0,0 +1,24 @@
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from utils.metrics_utils import MULTIPROCESS_DIR_VARIABLE, render_metrics, stage
+
+
+def test_stage_is_rendered():
+    """Test that a timed stage shows up in the rendered metrics"""
+    with stage("test_stage"):
+        pass
+
+    body, content_type = render_metrics()
+
+    assert content_type == CONTENT_TYPE_LATEST
+    assert b'chat_stage_seconds_count{stage="test_stage"} 1.0' in body
+
+
+def test_multiprocess_mode(tmp_path, monkeypatch):
+    """Test that metrics are aggregated from the shared directory when several worker processes are used"""
+    monkeypatch.setenv(MULTIPROCESS_DIR_VARIABLE, str(tmp_path))
+
+    body, _ = render_metrics()
+
+    # Only metrics written to the directory are reported; this process has written none
+    assert b"chat_stage_seconds" not in body
@@ -0,0 +1,92 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from broadcast.base_broadcaster import CLOSED
+from broadcast.mongo_change_stream_broadcaster import INSERT_PIPELINE, MongoChangeStreamBroadcaster
+from config.constants import Constants
+
+
+@pytest.fixture
+def collection():
+    """Create a mock messages collection"""
+    return MagicMock(spec=Collection)
+
+
+def make_stream(changes: list, delivered: threading.Event):
+    """Create a mock change stream that yields the given changes and then idles"""
+    stream = MagicMock()
+    stream.__enter__.return_value = stream
+    stream.alive = True
+    stream.resume_token = {"_data": "token"}
+    pending = list(changes)
+
+    def try_next():
+        if pending:
+            return pending.pop(0)
+        delivered.set()
+        return None
+
+    stream.try_next.side_effect = try_next
+    return stream
+
+
+def test_publish_is_a_no_op(collection):
+    """Test that publishing does not deliver anything directly (the change stream does)"""
+    broadcaster = MongoChangeStreamBroadcaster(collection)
+    subscription = super(MongoChangeStreamBroadcaster, broadcaster).subscribe()
+
+    broadcaster.publish({Constants.MESSAGE_FIELD: "Hello"})
+
+    assert subscription.empty()
+
+
+def test_inserts_are_fanned_out(collection):
+    """Test that inserted documents are delivered to subscribers, with _id projected out by the server"""
+    delivered = threading.Event()
+    document = {Constants.USER_FIELD: "User", Constants.MESSAGE_FIELD: "Hello"}
+    collection.watch.return_value = make_stream([{"fullDocument": document}], delivered)
+    broadcaster = MongoChangeStreamBroadcaster(collection)
+
+    subscription = broadcaster.subscribe()
+    assert delivered.wait(timeout=5)
+    broadcaster.close()
+
+    assert subscription.get_nowait() == document
+    assert collection.watch.call_args.args[0] == INSERT_PIPELINE
+    assert {"$project": {f"fullDocument.{Constants.ID_FIELD}": 0}} in INSERT_PIPELINE
+
+
+def test_watch_resumes_after_error(collection, mocker):
+    """Test that the watcher reconnects with the last resume token after an error"""
+    mocker.patch('broadcast.mongo_change_stream_broadcaster.RETRY_DELAY_SECONDS', 0)
+    delivered = threading.Event()
+    failing = make_stream([], threading.Event())
+    failing.try_next.side_effect = PyMongoError("connection lost")
+    collection.watch.side_effect = [failing, make_stream([], delivered)]
+    broadcaster = MongoChangeStreamBroadcaster(collection)
+
+    broadcaster.subscribe()
+    assert delivered.wait(timeout=5)
+    broadcaster.close()
+
+    assert collection.watch.call_count == 2
+
+
+def test_close_wakes_subscribers_and_stops_watching(collection):
+    """Test that closing ends the subscriptions and that later subscribers do not restart the watcher"""
+    delivered = threading.Event()
+    collection.watch.return_value = make_stream([], delivered)
+    broadcaster = MongoChangeStreamBroadcaster(collection)
+    subscription = broadcaster.subscribe()
+    assert delivered.wait(timeout=5)
+
+    broadcaster.close()
+
+    assert subscription.get_nowait() is CLOSED
+    assert broadcaster.subscribe().get_nowait() is CLOSED
+    assert not broadcaster._watcher.is_alive()
+    assert collection.watch.call_count == 1
@@ -3,13 +3,17 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 from flask import Flask
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
-from pymongo.results import InsertOneResult
+from pymongo.results import InsertManyResult, InsertOneResult
 
 from config.constants import Constants, EnvironmentVariables
-from db.mongo_db import MongoDb
+from db.mongo_db import (HISTORY_SORT, INDEXES, MESSAGE_PROJECTION, TIMESTAMP_PROJECTION, MongoDb, conversation_filter,
+                         retention_filter, sequence_counts, sequenced_documents)
 from models.message import Message
 
+DEFAULT_FILTER = {Constants.CONVERSATION_ID_FIELD: {"$in": ["default", None]}}
+
 
 @pytest.fixture
 def app():
@@ -49,10 +53,15 @@ def test_insert_message_success(mock_mongo):
         acknowledged=True
     )
 
+    db.db[Constants.COUNTERS_COLLECTION].find_one_and_update.return_value = {Constants.SEQ_FIELD: 7}
+
     result = db.insert_message(test_message)
 
     assert result is True
-    mock_collection.insert_one.assert_called_once_with(dict(test_message))
+    mock_collection.insert_one.assert_called_once_with({**dict(test_message), Constants.SEQ_FIELD: 7})
+    db.db[Constants.COUNTERS_COLLECTION].find_one_and_update.assert_called_once_with(
+        {Constants.ID_FIELD: "default"}, {"$inc": {Constants.SEQ_FIELD: 1}}, upsert=True,
+        return_document=ReturnDocument.AFTER)
 
 
 def test_insert_message_failure(mock_mongo):
@@ -71,9 +80,77 @@ def test_insert_message_failure(mock_mongo):
         acknowledged=False
     )
 
+    db.db[Constants.COUNTERS_COLLECTION].find_one_and_update.return_value = {Constants.SEQ_FIELD: 1}
+
     result = db.insert_message(test_message)
     assert result is False
-    mock_collection.insert_one.assert_called_once_with(dict(test_message))
+    mock_collection.insert_one.assert_called_once_with({**dict(test_message), Constants.SEQ_FIELD: 1})
+
+
+def test_insert_messages(mock_mongo):
+    """Test that several messages are numbered with one counter update and inserted with a single ordered insert_many"""
+    db, mock_collection = mock_mongo
+
+    messages = [
+        Message(user="User", message="question", timestamp=datetime.now()),
+        Message(user="AI", message="answer", timestamp=datetime.now()),
+    ]
+    mock_collection.insert_many.return_value = InsertManyResult(inserted_ids=['1', '2'], acknowledged=True)
+    counters = db.db[Constants.COUNTERS_COLLECTION]
+    counters.find_one_and_update.return_value = {Constants.SEQ_FIELD: 5}
+
+    assert db.insert_messages(messages) is True
+    counters.find_one_and_update.assert_called_once_with(
+        {Constants.ID_FIELD: "default"}, {"$inc": {Constants.SEQ_FIELD: 2}}, upsert=True,
+        return_document=ReturnDocument.AFTER)
+    mock_collection.insert_many.assert_called_once_with(
+        [{**dict(messages[0]), Constants.SEQ_FIELD: 4}, {**dict(messages[1]), Constants.SEQ_FIELD: 5}], ordered=True)
+    mock_collection.insert_one.assert_not_called()
+
+
+def test_sequenced_documents_numbers_each_conversation():
+    """Test that messages are numbered consecutively within their own conversation"""
+    messages = [Message(user="User", message=str(i), timestamp=datetime.now(), conversation_id=conversation_id)
+                for i, conversation_id in enumerate(["a", "b", "a"])]
+
+    assert sequence_counts(messages) == {"a": 2, "b": 1}
+    assert [document[Constants.SEQ_FIELD] for document in sequenced_documents(messages, {"a": 3, "b": 1})] == [3, 1, 4]
+
+
+def test_ensure_indexes(app, caplog):
+    """Test that missing indexes are created (and logged) on first use rather than when the database is built"""
+    with patch('db.mongo_db.PyMongo') as mock_pymongo:
+        mock_collection = mock_pymongo.return_value.db.messages
+        mock_collection.list_indexes.return_value = [{"name": "_id_"}]
+
+        with caplog.at_level("INFO", logger="db.mongo_db"):
+            db = MongoDb(app)
+            mock_collection.create_indexes.assert_not_called()
+            db.count_messages()
+            db.count_messages()
+
+        mock_collection.create_indexes.assert_called_once_with(INDEXES)
+        assert "Created index conversation_timestamp_id" in caplog.text
+        assert "Created index conversation_seq" in caplog.text
+
+
+def test_ensure_indexes_existing(app, caplog):
+    """Test that existing indexes are not reported as created"""
+    with patch('db.mongo_db.PyMongo') as mock_pymongo:
+        mock_collection = mock_pymongo.return_value.db.messages
+        mock_collection.list_indexes.return_value = [
+            {"name": "_id_"}, {"name": "conversation_timestamp_id"}, {"name": "conversation_seq"}]
+
+        with caplog.at_level("INFO", logger="db.mongo_db"):
+            MongoDb(app).count_messages()
+
+        assert "Created index" not in caplog.text
+
+
+def test_conversation_filter():
+    """Test that only the default conversation also matches messages stored without a conversation id"""
+    assert conversation_filter("default") == DEFAULT_FILTER
+    assert conversation_filter("other") == {Constants.CONVERSATION_ID_FIELD: "other"}
 
 
 def test_retrieve_messages_empty(mock_mongo):
@@ -81,12 +158,13 @@ def test_retrieve_messages_empty(mock_mongo):
     db, mock_collection = mock_mongo
 
     # Setup mock return value
-    mock_collection.find.return_value = []
+    mock_collection.find.return_value.sort.return_value = []
 
     messages = db.retrieve_messages()
 
     assert messages == []
-    mock_collection.find.assert_called_once_with()
+    mock_collection.find.assert_called_once_with(DEFAULT_FILTER, MESSAGE_PROJECTION)
+    mock_collection.find.return_value.sort.assert_called_once_with(HISTORY_SORT)
 
 
 def test_retrieve_messages_with_data(mock_mongo):
@@ -107,22 +185,94 @@ def test_retrieve_messages_with_data(mock_mongo):
     ]
 
     # Setup mock return value
-    mock_collection.find.return_value = test_messages
+    mock_collection.find.return_value.sort.return_value = test_messages
 
     messages = db.retrieve_messages()
 
     assert messages == test_messages
     assert len(messages) == 2
-    mock_collection.find.assert_called_once_with()
+    mock_collection.find.assert_called_once_with(DEFAULT_FILTER, MESSAGE_PROJECTION)
+
+
+def test_retrieve_messages_after_cursor(mock_mongo):
+    """Test that retrieving after a position walks the index from its timestamp and skips the messages seen"""
+    db, mock_collection = mock_mongo
+    timestamp = datetime.now()
+
+    sorted_cursor = mock_collection.find.return_value.sort.return_value
+    sorted_cursor.skip.return_value.limit.return_value = []
+
+    messages = db.retrieve_messages(after=(timestamp, 2), limit=10, conversation_id="other")
+
+    assert messages == []
+    mock_collection.find.assert_called_once_with(
+        {Constants.CONVERSATION_ID_FIELD: "other", Constants.TIMESTAMP_FIELD: {"$gte": timestamp}}, MESSAGE_PROJECTION)
+    mock_collection.find.return_value.sort.assert_called_once_with(HISTORY_SORT)
+    sorted_cursor.skip.assert_called_once_with(2)
+    sorted_cursor.skip.return_value.limit.assert_called_once_with(10)
 
 
 def test_clear_messages(mock_mongo):
-    """Test clearing all messages"""
+    """Test clearing all messages, after which the indexes are created again on next use"""
     db, mock_collection = mock_mongo
+    db.count_messages()
 
     db.clear_messages()
 
     mock_collection.drop.assert_called_once_with()
+    assert mock_collection.create_indexes.call_count == 1
+    db.count_messages()
+    assert mock_collection.create_indexes.call_count == 2
+
+
+def test_enforce_retention_under_limit(mock_mongo):
+    """Test that nothing is deleted while the conversation is within the limit, without counting or scanning it"""
+    db, mock_collection = mock_mongo
+    db.db[Constants.COUNTERS_COLLECTION].find_one.return_value = {Constants.SEQ_FIELD: 10}
+
+    db.enforce_retention(10)
+
+    db.db[Constants.COUNTERS_COLLECTION].find_one.assert_called_once_with({Constants.ID_FIELD: "default"})
+    mock_collection.count_documents.assert_not_called()
+    mock_collection.find.assert_not_called()
+    mock_collection.delete_many.assert_not_called()
+
+
+def test_enforce_retention_over_limit(mock_mongo):
+    """Test that the messages numbered at or before the last sequence number minus the limit are deleted at once"""
+    db, mock_collection = mock_mongo
+    db.db[Constants.COUNTERS_COLLECTION].find_one.return_value = {Constants.SEQ_FIELD: 25}
+
+    db.enforce_retention(10, "other")
+
+    mock_collection.find.assert_not_called()
+    mock_collection.delete_many.assert_called_once_with({
+        Constants.CONVERSATION_ID_FIELD: "other",
+        "$or": [{Constants.SEQ_FIELD: {"$lte": 15}}, {Constants.SEQ_FIELD: None}],
+    })
+
+
+def test_enforce_retention_no_counter(mock_mongo):
+    """Test that nothing is deleted from a conversation that has never been written to"""
+    db, mock_collection = mock_mongo
+    db.db[Constants.COUNTERS_COLLECTION].find_one.return_value = None
+
+    db.enforce_retention(10)
+
+    mock_collection.delete_many.assert_not_called()
+
+
+def test_get_nth_newest_uses_max_messages(app, mock_mongo):
+    """Test that the nth newest message is looked up with the given limit, falling back to MAX_MESSAGES"""
+    db, mock_collection = mock_mongo
+    app.config[Constants.MAX_MESSAGES_FIELD] = 100
+    skip = mock_collection.find.return_value.sort.return_value.skip
+    skip.return_value.limit.return_value = []
+
+    db.get_nth_newest("other", 10)
+    db.get_nth_newest("other")
+
+    assert [call.args for call in skip.call_args_list] == [(10,), (100,)]
 
 
 @pytest.mark.integration
@@ -163,3 +313,57 @@ def test_mongodb_integration(app):
     db.clear_messages()
     messages = db.retrieve_messages()
     assert len(messages) == 0
+
+
+def find_collection_scans(plan: dict) -> list[str]:
+    """Collects the COLLSCAN stages of an explained query plan"""
+    scans = ["COLLSCAN"] if plan.get("stage") == "COLLSCAN" else []
+    # Servers using the slot-based engine nest the classic plan under queryPlan
+    for child in [plan.get("queryPlan"), plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            scans += find_collection_scans(child)
+    return scans
+
+
+@pytest.mark.integration
+def test_mongodb_queries_use_indexes(app):
+    """Test that no query issued by MongoDb scans the whole collection (requires a real MongoDB)"""
+    import os
+
+    mongodb_uri = os.getenv(EnvironmentVariables.MONGO_URI_VARIABLE)
+    if not mongodb_uri:
+        pytest.skip("No MONGO_URI environment variable found")
+
+    app.config[Constants.MONGO_URI_FIELD] = mongodb_uri
+    app.config[Constants.MAX_MESSAGES_FIELD] = 5
+    db = MongoDb(app)
+    db.clear_messages()
+    db.insert_messages([Message(user="User", message=f"message {i}", timestamp=datetime(2025, 1, 12, 14, 30, i),
+                                conversation_id=conversation_id)
+                        for i in range(10) for conversation_id in ["default", "other"]])
+
+    cutoff = datetime(2025, 1, 12, 14, 30, 4)
+    explained = {}
+    for conversation_id in ["default", "other"]:
+        query = conversation_filter(conversation_id)
+        explained.update({
+            f"history {conversation_id}": db._history_cursor(query).explain(),
+            f"history_after {conversation_id}": db._history_cursor(
+                {**query, Constants.TIMESTAMP_FIELD: {"$gte": cutoff}}).skip(1).limit(5).explain(),
+            f"count {conversation_id}": db.db.command("explain", {
+                "count": Constants.MESSAGES_COLLECTION, "query": query}),
+            f"nth_newest {conversation_id}": db.db.messages.find(query, TIMESTAMP_PROJECTION)
+            .sort(Constants.TIMESTAMP_FIELD, -1).skip(5).limit(1).explain(),
+            f"delete {conversation_id}": db.db.command("explain", {
+                "delete": Constants.MESSAGES_COLLECTION,
+                "deletes": [{"q": {**query, Constants.TIMESTAMP_FIELD: {"$lte": cutoff}}, "limit": 0}],
+            }),
+            f"retention {conversation_id}": db.db.command("explain", {
+                "delete": Constants.MESSAGES_COLLECTION,
+                "deletes": [{"q": retention_filter(conversation_id, 10, 5), "limit": 0}],
+            }),
+        })
+    db.clear_messages()
+
+    for name, explanation in explained.items():
+        assert find_collection_scans(explanation["queryPlanner"]["winningPlan"]) == [], name
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from ai import openai_client
+from ai.openai_client import create_http_client, get_openai_client, reset_openai_client
+from config.constants import EnvironmentVariables
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    """Fixture to discard the shared OpenAI client around each test."""
+    reset_openai_client()
+    yield
+    reset_openai_client()
+
+
+@pytest.fixture
+def mock_openai(mocker):
+    """Fixture to mock the OpenAI client class."""
+    return mocker.patch('ai.openai_client.OpenAI', side_effect=lambda **kwargs: object())
+
+
+def test_client_is_reused(mock_openai):
+    """Test that repeated calls return the same client."""
+    assert get_openai_client("key") is get_openai_client("key")
+    mock_openai.assert_called_once()
+
+
+def test_client_is_shared_across_threads(mock_openai):
+    """Test that concurrent first calls create a single client."""
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(get_openai_client("key"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    mock_openai.assert_called_once()
+
+
+def test_client_is_recreated_in_new_process(mock_openai, mocker):
+    """Test that a process with a different pid (e.g. a forked worker) gets its own client."""
+    parent_client = get_openai_client("key")
+    mocker.patch('ai.openai_client.os.getpid', return_value=openai_client._client_pid + 1)
+
+    assert get_openai_client("key") is not parent_client
+    assert mock_openai.call_count == 2
+
+
+def test_http_client_uses_environment_settings(monkeypatch):
+    """Test that pool size, keep-alive and timeouts are read from the environment."""
+    monkeypatch.setenv(EnvironmentVariables.OPENAI_MAX_CONNECTIONS_VARIABLE, "7")
+    monkeypatch.setenv(EnvironmentVariables.OPENAI_MAX_KEEPALIVE_CONNECTIONS_VARIABLE, "3")
+    monkeypatch.setenv(EnvironmentVariables.OPENAI_KEEPALIVE_EXPIRY_VARIABLE, "12.5")
+    monkeypatch.setenv(EnvironmentVariables.OPENAI_TIMEOUT_VARIABLE, "30")
+    monkeypatch.setenv(EnvironmentVariables.OPENAI_CONNECT_TIMEOUT_VARIABLE, "2")
+
+    http_client = create_http_client()
+
+    pool = http_client._transport._pool
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+    assert pool._keepalive_expiry == 12.5
+    assert http_client.timeout.read == 30
+    assert http_client.timeout.connect == 2
+    http_client.close()
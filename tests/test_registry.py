@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ai.base_ai import AIModel
+from ai.dummy_ai import DummyAI
+from ai.registry import AI_BACKENDS, create_ai, register_ai_backend
+from config.constants import AIBackends
+
+
+def test_create_dummy_ai():
+    """Test that the dummy backend creates the dummy model"""
+    assert isinstance(create_ai(AIBackends.DUMMY), DummyAI)
+
+
+def test_unknown_backend():
+    """Test that selecting an unregistered backend fails with the known names"""
+    with pytest.raises(ValueError, match="dummy, gpt-4o-mini"):
+        create_ai("gpt-99")
+
+
+def test_register_backend(monkeypatch):
+    """Test that a registered backend can be selected by name"""
+    monkeypatch.setattr("ai.registry.AI_BACKENDS", dict(AI_BACKENDS))
+    register_ai_backend("quiet", "ai.dummy_ai", "DummyAI")
+
+    assert isinstance(create_ai("quiet"), AIModel)
+
+
+def test_unselected_backends_are_not_imported():
+    """Test that starting the app with the dummy backend does not load the OpenAI SDK"""
+    env = {**os.environ, "AI_BACKEND": AIBackends.DUMMY, "DB_BACKEND": "memory", "LOG_FILE": ""}
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print('openai' in sys.modules, 'ai.gpt_4o_mini' in sys.modules)"],
+        cwd=Path(__file__).parent.parent, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        check=True)
+
+    assert result.stdout.split() == ["False", "False"]
@@ -0,0 +1,105 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from db.base_db import BaseDb
+from db.leader_lock import LeaderLock
+from db.retention_scheduler import RetentionScheduler
+
+
+@pytest.fixture
+def db():
+    """Create a mock database that signals each trim"""
+    db = MagicMock(spec=BaseDb)
+    db.trimmed = threading.Event()
+    db.enforce_retention.side_effect = lambda *args: db.trimmed.set()
+    return db
+
+
+@pytest.fixture
+def scheduler(db):
+    """Create a scheduler with a long interval so that only the overshoot or the test triggers a pass"""
+    scheduler = RetentionScheduler(db, 100, interval=60, max_overshoot=10)
+    yield scheduler
+    scheduler.close()
+
+
+def test_writes_are_not_trimmed_inline(scheduler, db):
+    """Test that recording writes returns without touching the database"""
+    scheduler.record_writes("a", 2)
+
+    assert scheduler.pending_count() == 1
+    db.enforce_retention.assert_not_called()
+
+
+def test_trim_enforces_limit_of_written_conversations(scheduler, db):
+    """Test that a pass trims each conversation written to once, then forgets them"""
+    scheduler.record_writes("a", 2)
+    scheduler.record_writes("b", 2)
+    scheduler.record_writes("a", 2)
+
+    assert scheduler.trim() is True
+
+    assert [call.args for call in db.enforce_retention.call_args_list] == [(100, "a"), (100, "b")]
+    assert scheduler.pending_count() == 0
+
+
+def test_overshoot_triggers_pass(scheduler, db):
+    """Test that a conversation reaching max_overshoot writes is trimmed without waiting for the interval"""
+    for _ in range(4):
+        scheduler.record_writes("a", 2)
+    assert not db.trimmed.wait(timeout=0.1)
+
+    scheduler.record_writes("a", 2)
+
+    assert db.trimmed.wait(timeout=5)
+    db.enforce_retention.assert_called_once_with(100, "a")
+
+
+def test_interval_bounds_untrimmed_time(db):
+    """Test that conversations below the overshoot are trimmed once the interval elapses"""
+    scheduler = RetentionScheduler(db, 100, interval=0.01, max_overshoot=10)
+    scheduler.record_writes("a")
+
+    assert db.trimmed.wait(timeout=5)
+    scheduler.close()
+
+
+def test_pass_is_skipped_without_leader_lock(db):
+    """Test that another replica holding the lock defers trimming to a later pass"""
+    lock = MagicMock(spec=LeaderLock)
+    lock.acquire.return_value = False
+    scheduler = RetentionScheduler(db, 100, interval=60, lock=lock)
+    scheduler.record_writes("a", 2)
+
+    assert scheduler.trim() is False
+    db.enforce_retention.assert_not_called()
+    assert scheduler.pending_count() == 1
+
+    lock.acquire.return_value = True
+    assert scheduler.trim() is True
+    db.enforce_retention.assert_called_once_with(100, "a")
+    assert lock.release.call_count == 1
+    scheduler.close()
+
+
+def test_failed_conversations_are_kept(scheduler, db):
+    """Test that a failing trim keeps the conversation for the next pass"""
+    db.enforce_retention.side_effect = Exception("unavailable")
+    scheduler.record_writes("a", 2)
+
+    with pytest.raises(Exception, match="unavailable"):
+        scheduler.trim()
+
+    assert scheduler.pending_count() == 1
+
+
+def test_close_trims_pending_conversations(db):
+    """Test that closing runs a final pass"""
+    scheduler = RetentionScheduler(db, 100, interval=60)
+    scheduler.record_writes("a", 2)
+
+    scheduler.close()
+
+    db.enforce_retention.assert_called_once_with(100, "a")
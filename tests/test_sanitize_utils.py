@@ -0,0 +1,103 @@
+import random
+import threading
+
+import bleach
+import pytest
+
+from utils.sanitize_utils import MEMO_MAX_CHARS, sanitize
+
+CORPUS = [
+    "",
+    "Hello AI!",
+    "I'm just a dummy function pretending to be AI.",
+    "  leading and trailing spaces  ",
+    "tabs\tand\nnewlines\n",
+    "windows\r\nline endings\r",
+    "quotes \" and ' apostrophes",
+    "unicode: café, naïve, 日本語, emoji 🎉, rtl שלום",
+    "zero​width and   separators and ﻿ BOM",
+    "controls \x00 \x01 \x08 \x0b \x0c \x1b \x1f \x7f \x85",
+    "1 < 2 and 3 > 2",
+    "fish & chips",
+    "already escaped &amp; &lt;b&gt;",
+    "entities &copy; &#169; &#xA9; &nosuchentity; &",
+    "<b>bold</b> <i>italic</i> <strong>strong</strong> <em>em</em>",
+    "<a href=\"https://example.com\" title=\"t\">link</a>",
+    "<a href=\"javascript:alert(1)\">bad link</a>",
+    "<a href=\"https://example.com\" onclick=\"steal()\">link</a>",
+    "<script>alert('xss')</script>",
+    "<img src=x onerror=alert(1)>",
+    "<style>body { color: red }</style>",
+    "<!-- a comment --> after",
+    "<p>paragraph<br/>break</p>",
+    "<ul><li>one<li>two</ul>",
+    "<b>unclosed",
+    "</b>stray closing tag",
+    "<<double>>",
+    "<",
+    ">",
+    "a <b",
+    "<3 you",
+    "<code>x = y && z</code>",
+    "```html\n<div class=\"x\">code</div>\n```",
+    "<abbr title=\"HyperText\">HTML</abbr> <acronym>NASA</acronym> <blockquote>q</blockquote>",
+    "<svg><script>alert(1)</script></svg>",
+    "<math><mi>x</mi></math>",
+    "<textarea><b>not bold</b></textarea>",
+    "<noscript><p title=\"</noscript><img src=x onerror=alert(1)>\">",
+    "<![CDATA[ data ]]>",
+    "<!DOCTYPE html><html><body>doc</body></html>",
+    "x" * (MEMO_MAX_CHARS + 10) + "<b>long</b>",
+]
+
+
+def random_text(rng: random.Random) -> str:
+    """Builds a random text from an alphabet weighted towards markup"""
+    alphabet = ["<", ">", "&", "/", "=", "\"", "'", "b", "a", "script", "href", " ", "\n", "\r", "\x00", "é", "🎉",
+                "&amp;", "<b>", "</b>", "<a href=\"", "javascript:", "<!--", "-->", ";", "#", "x"]
+    return "".join(rng.choice(alphabet) for _ in range(rng.randrange(1, 40)))
+
+
+FUZZ_CORPUS = [random_text(random.Random(seed)) for seed in range(500)]
+
+
+@pytest.mark.parametrize("text", CORPUS + [chr(code) for code in range(128)])
+def test_matches_bleach(text):
+    """Test that the sanitized text is exactly what bleach.clean returns, also when it comes from the memo"""
+    expected = bleach.clean(text)
+
+    assert sanitize(text) == expected
+    assert sanitize(text) == expected
+
+
+def test_matches_bleach_on_fuzzed_text():
+    """Test that randomly generated markup-heavy texts are sanitized exactly like bleach.clean"""
+    mismatches = [text for text in FUZZ_CORPUS if sanitize(text) != bleach.clean(text)]
+
+    assert mismatches == []
+
+
+def test_plain_text_is_returned_as_is():
+    """Test that text without markup or control characters takes the fast path"""
+    text = "Hello, how are you today? 🎉"
+
+    assert sanitize(text) is text
+
+
+def test_threads_use_separate_cleaners():
+    """Test that concurrent callers get correct results (each thread has its own Cleaner)"""
+    texts = [f"<script>{i}</script><b>{i}</b>" for i in range(200)]
+    failures = []
+
+    def worker():
+        for text in texts:
+            if sanitize(text + " ") != bleach.clean(text + " "):
+                failures.append(text)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ai.base_ai import AIModel
+from ai.dummy_ai import DummyAI
+from ai.single_flight_ai import SingleFlightAI
+
+
+def run_concurrently(ai: AIModel, messages: list[str]) -> list:
+    """Send messages to the model from concurrent threads, returning each response or exception"""
+    start = threading.Barrier(len(messages))
+
+    def send(message):
+        start.wait()
+        try:
+            return ai.get_ai_response(message)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(messages)) as executor:
+        return list(executor.map(send, messages))
+
+
+@pytest.fixture
+def slow_ai(mocker):
+    """Create a latency-injected dummy model whose calls are counted"""
+    ai = DummyAI(latency=0.2)
+    mocker.spy(ai, 'get_ai_response')
+    return ai
+
+
+def test_identical_requests_share_one_call(slow_ai):
+    """Test that identical concurrent requests are answered by a single upstream call"""
+    single_flight = SingleFlightAI(slow_ai)
+    coalesced = REGISTRY.get_sample_value("chat_ai_coalesced_total") or 0.0
+
+    responses = run_concurrently(single_flight, ["Hello"] * 8)
+
+    assert slow_ai.get_ai_response.call_count == 1
+    assert len(set(responses)) == 1
+    assert REGISTRY.get_sample_value("chat_ai_coalesced_total") == coalesced + 7
+    assert single_flight.in_flight() == 0
+
+
+def test_distinct_requests_are_not_merged(slow_ai):
+    """Test that different prompts make their own calls"""
+    run_concurrently(SingleFlightAI(slow_ai), ["Hello", "Goodbye"])
+
+    assert slow_ai.get_ai_response.call_count == 2
+
+
+def test_key_normalizer(slow_ai):
+    """Test that requests are merged according to the configured key"""
+    run_concurrently(SingleFlightAI(slow_ai), ["Hello", "  HELLO "])
+    assert slow_ai.get_ai_response.call_count == 1
+
+    run_concurrently(SingleFlightAI(slow_ai, key=lambda message, context: message), ["Hello", "  HELLO "])
+    assert slow_ai.get_ai_response.call_count == 3
+
+
+def test_sequential_requests_are_not_cached(slow_ai):
+    """Test that a completed call is not reused by later requests"""
+    single_flight = SingleFlightAI(slow_ai)
+
+    single_flight.get_ai_response("Hello")
+    single_flight.get_ai_response("Hello")
+
+    assert slow_ai.get_ai_response.call_count == 2
+
+
+def test_errors_propagate_to_every_waiter(slow_ai):
+    """Test that the leader's exception is raised for every merged request, and the key is freed afterwards"""
+    def fail(message, context=None):
+        DummyAI.get_ai_response(slow_ai, message)
+        raise RuntimeError("upstream failure")
+
+    slow_ai.get_ai_response.side_effect = fail
+    single_flight = SingleFlightAI(slow_ai)
+
+    results = run_concurrently(single_flight, ["Hello"] * 4)
+
+    assert slow_ai.get_ai_response.call_count == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert single_flight.in_flight() == 0
+
+
+def test_requests_are_merged_per_context(slow_ai):
+    """Test that identical prompts are only merged when they are sent with the same conversation context"""
+    single_flight = SingleFlightAI(slow_ai)
+    contexts = [[{"role": "user", "content": "My name is Ada"}]] * 2 + [[{"role": "user", "content": "I am Bob"}]]
+    start = threading.Barrier(len(contexts))
+
+    def send(context):
+        start.wait()
+        return single_flight.get_ai_response("Hello", context)
+
+    with ThreadPoolExecutor(max_workers=len(contexts)) as executor:
+        list(executor.map(send, contexts))
+
+    assert slow_ai.get_ai_response.call_count == 2
+
+
+def test_streams_are_passed_through():
+    """Test that streamed responses go straight to the wrapped model"""
+    ai = MagicMock(spec=AIModel)
+    ai.stream_ai_response.return_value = iter(["Hi"])
+
+    assert list(SingleFlightAI(ai).stream_ai_response("Hello")) == ["Hi"]
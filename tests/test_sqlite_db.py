@@ -0,0 +1,79 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.constants import Constants
+from db.sqlite_db import RETENTION_SQL, SqliteDb, from_millis, to_millis
+from models.message import Message
+
+START = datetime(2025, 1, 12, 14, 30, tzinfo=timezone.utc)
+
+
+def make_message(second: int, text: str | None = None) -> Message:
+    """Create a message stamped at the given second"""
+    return Message(user="User", message=text or f"message {second}", timestamp=START + timedelta(seconds=second))
+
+
+def texts(documents: list[dict]) -> list[str]:
+    """Returns the text of each document"""
+    return [document[Constants.MESSAGE_FIELD] for document in documents]
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Create a SQLite store keeping three messages per conversation"""
+    store = SqliteDb(str(tmp_path / "messages.db"), max_messages=3)
+    yield store
+    store.close()
+
+
+def test_wal_mode_and_index(db):
+    """Test that the database is in WAL mode and retention is answered by the index"""
+    connection = db._connection()
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = " ".join(row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {RETENTION_SQL}", ("default", 3)))
+    assert "USING COVERING INDEX conversation_timestamp" in plan
+    assert "SCAN" not in plan
+
+
+def test_millisecond_round_trip():
+    """Test that timestamps are stored as UTC milliseconds and read back as naive UTC datetimes"""
+    timestamp = datetime(2025, 1, 12, 15, 30, 0, 123456, tzinfo=timezone(timedelta(hours=1)))
+
+    assert from_millis(to_millis(timestamp)) == datetime(2025, 1, 12, 14, 30, 0, 123000)
+    assert to_millis(datetime(1970, 1, 1, 0, 0, 1)) == 1000
+
+
+def test_get_nth_newest(db):
+    """Test that the message with max_messages newer messages is found only once there is one"""
+    db.insert_messages([make_message(second) for second in range(3)])
+    assert db.get_nth_newest() == []
+
+    db.insert_message(make_message(3))
+
+    assert db.get_nth_newest() == [{Constants.TIMESTAMP_FIELD: datetime(2025, 1, 12, 14, 30)}]
+
+
+def test_enforce_retention_splits_equal_timestamps(db):
+    """Test that retention keeps exactly max_messages, even within a run of equal timestamps"""
+    db.insert_messages([make_message(0, text) for text in ["a", "b", "c", "d"]])
+
+    db.enforce_retention(3)
+
+    assert texts(db.retrieve_messages()) == ["b", "c", "d"]
+
+
+def test_connection_per_thread(db):
+    """Test that each thread reuses its own connection and close() closes all of them"""
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(db._connection()))
+    thread.start()
+    thread.join()
+
+    assert db._connection() is db._connection()
+    assert connections[0] is not db._connection()
+
+    db.close()
+    assert db.count_messages() == 0
@@ -0,0 +1,144 @@
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from db.base_db import BaseDb
+from db.write_behind_db import WriteBehindDb
+from models.message import Message
+
+
+def make_message(i: int, conversation_id: str = "default") -> Message:
+    """Create a test message"""
+    return Message(user="User", message=f"message {i}", timestamp=datetime.now(), conversation_id=conversation_id)
+
+
+@pytest.fixture
+def wrapped_db():
+    """Create a mock database that records the batches written to it"""
+    db = MagicMock(spec=BaseDb)
+    db.batches = []
+    db.written = threading.Event()
+
+    def insert_messages(messages):
+        db.batches.append(list(messages))
+        db.written.set()
+        return True
+
+    db.insert_messages.side_effect = insert_messages
+    return db
+
+
+@pytest.fixture
+def write_behind(wrapped_db):
+    """Create a write-behind database with a long flush interval so that tests control flushing"""
+    db = WriteBehindDb(wrapped_db, batch_size=3, flush_interval=60)
+    yield db
+    db.close()
+
+
+def test_inserts_are_queued(write_behind, wrapped_db):
+    """Test that inserts return immediately without writing"""
+    assert write_behind.insert_message(make_message(0)) is True
+    assert write_behind.pending_count() == 1
+    wrapped_db.insert_messages.assert_not_called()
+
+
+def test_full_batch_is_flushed_in_one_write(write_behind, wrapped_db):
+    """Test that reaching the batch size triggers a single bulk insert"""
+    messages = [make_message(i) for i in range(3)]
+    write_behind.insert_messages(messages[:2])
+    write_behind.insert_message(messages[2])
+
+    assert wrapped_db.written.wait(timeout=5)
+    assert wrapped_db.batches == [messages]
+
+
+def test_flush_interval_bounds_queue_time(wrapped_db):
+    """Test that a partial batch is written once the flush interval elapses"""
+    db = WriteBehindDb(wrapped_db, batch_size=100, flush_interval=0.01)
+    db.insert_message(make_message(0))
+
+    assert wrapped_db.written.wait(timeout=5)
+    db.close()
+
+
+def test_reads_flush_the_queue(write_behind, wrapped_db):
+    """Test that reads see every queued write"""
+    message = make_message(0)
+    write_behind.insert_message(message)
+
+    write_behind.retrieve_messages()
+
+    assert wrapped_db.batches == [[message]]
+    wrapped_db.retrieve_messages.assert_called_once_with(after=None, limit=None, conversation_id="default")
+
+
+def test_retention_flushes_then_trims(write_behind, wrapped_db):
+    """Test that retention writes the queued messages before trimming the conversation in the wrapped database"""
+    calls = []
+    wrapped_db.insert_messages.side_effect = lambda messages: calls.append("insert") or True
+    wrapped_db.enforce_retention.side_effect = lambda *args: calls.append("trim")
+
+    write_behind.insert_messages([make_message(0, "a"), make_message(1, "b")])
+    write_behind.enforce_retention(10, "a")
+
+    assert calls == ["insert", "trim"]
+    wrapped_db.enforce_retention.assert_called_once_with(10, "a")
+    assert write_behind.pending_count() == 0
+
+
+def test_flush_does_not_trim(write_behind, wrapped_db):
+    """Test that the writer leaves retention to its caller, so that trimming stays under the retention leader lock"""
+    write_behind.insert_message(make_message(0))
+    write_behind.flush()
+
+    wrapped_db.enforce_retention.assert_not_called()
+
+
+def test_close_flushes_pending_messages(wrapped_db):
+    """Test that closing writes everything still queued"""
+    db = WriteBehindDb(wrapped_db, batch_size=100, flush_interval=60)
+    message = make_message(0)
+    db.insert_message(message)
+
+    db.close()
+
+    assert wrapped_db.batches == [[message]]
+
+
+def test_failed_flush_requeues_messages(write_behind, wrapped_db):
+    """Test that messages are kept for the next attempt when a write fails"""
+    wrapped_db.insert_messages.side_effect = Exception("write failed")
+    write_behind.insert_message(make_message(0))
+
+    with pytest.raises(Exception, match="write failed"):
+        write_behind.flush()
+
+    assert write_behind.pending_count() == 1
+    wrapped_db.insert_messages.side_effect = None
+
+
+def test_unacknowledged_flush_requeues_messages(write_behind, wrapped_db):
+    """Test that messages are kept for the next attempt when the wrapped database does not acknowledge a write"""
+    wrapped_db.insert_messages.side_effect = None
+    wrapped_db.insert_messages.return_value = False
+    write_behind.insert_message(make_message(0))
+
+    with pytest.raises(RuntimeError, match="not acknowledged"):
+        write_behind.flush()
+
+    assert write_behind.pending_count() == 1
+    wrapped_db.insert_messages.return_value = True
+
+
+def test_close_unregisters_exit_flush(wrapped_db, mocker):
+    """Test that a closed queue is no longer flushed at exit, so that closed instances are not kept alive"""
+    unregister = mocker.patch('db.write_behind_db.atexit.unregister')
+    db = WriteBehindDb(wrapped_db, batch_size=100, flush_interval=60)
+
+    db.close()
+    db.close()
+
+    unregister.assert_called_once_with(db.close)
@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import typing as t
+
+import brotli
+from werkzeug.datastructures import Accept
+
+GZIP = "gzip"
+BROTLI = "br"
+# Supported content codings, preferred first when the client accepts several equally
+ENCODINGS = (BROTLI, GZIP)
+# Levels by how often a body is compressed. Per request, the fastest levels cost a fraction of the defaults for about
+# 10% larger output; bodies compressed once per change (history snapshots) or once at startup (the chat page) can
+# afford more.
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 1
+SNAPSHOT_GZIP_LEVEL = 6
+SNAPSHOT_BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+
+class Precompressed(t.NamedTuple):
+    """A response body that never changes, with its strong validator and its body in each content coding"""
+    body: bytes
+    etag: str
+    encoded_bodies: dict[str, bytes]
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    """ Compresses a response body.
+
+    Args:
+        body: The body
+        encoding: The content coding, one of ENCODINGS
+        gzip_level: The gzip compression level (1-9)
+        brotli_quality: The brotli quality level (0-11)
+
+    Returns:
+        The encoded body
+    """
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def precompress(body: bytes) -> Precompressed:
+    """ Encodes a static response body in every supported content coding at the highest compression.
+
+    Args:
+        body: The body
+
+    Returns:
+        The body, its ETag and its encoded bodies
+    """
+    return Precompressed(body, hashlib.sha1(body).hexdigest(),
+                         {encoding: compress(body, encoding, STATIC_GZIP_LEVEL, STATIC_BROTLI_QUALITY)
+                          for encoding in ENCODINGS})
+
+
+def negotiate_encoding(accept: Accept, encodings: t.Iterable[str] = ENCODINGS) -> str | None:
+    """ Picks the content coding of a response from a request's Accept-Encoding header.
+
+    Args:
+        accept: The parsed Accept-Encoding header (request.accept_encodings)
+        encodings: The content codings available, preferred first
+
+    Returns:
+        The available coding with the highest quality value, or None if the client accepts none of them
+    """
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accept[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
@@ -1,14 +1,182 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+import httpx
+import orjson
+from prometheus_client import Counter
 
 # from splunk_handler import SplunkHandler
 
 
 # import os
 
+DEFAULT_LOG_FILE = "chat_app.log"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_MAX_BODY_CHARS = 200
+REMOTE_BATCH_SIZE = 100
+REMOTE_FLUSH_INTERVAL_SECONDS = 5.0
+REMOTE_TIMEOUT_SECONDS = 5.0
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-def configure_logger() -> logging.Logger:
+# Events logged on every chat request; only a sample_rate fraction of them is kept
+HOT_PATH_EVENTS = frozenset({"user_message", "ai_call", "ai_response", "history_retrieval"})
+# Extra fields carrying message text, truncated to max_body_chars
+BODY_FIELDS = ("body",)
+# LogRecord attributes; anything else on a record was passed with extra= and is written as a JSON field
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))) | {"message", "asctime"}
+
+LOG_RECORDS_DROPPED = Counter("chat_log_records_dropped", "Log records discarded instead of slowing down requests",
+                              ["reason"])
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object, including the fields passed with extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+        document.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        return orjson.dumps(document, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random sample of hot path events and truncates the message text they carry.
+
+    Warnings and errors are always kept, and so are records without an event_type in HOT_PATH_EVENTS.
+    """
+
+    def __init__(self, sample_rate: float = DEFAULT_SAMPLE_RATE, max_body_chars: int = DEFAULT_MAX_BODY_CHARS):
+        """Initializes the filter
+
+        Args:
+            sample_rate: The fraction of hot path events to keep, between 0 and 1
+            max_body_chars: The number of characters of message text to keep
+        """
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_body_chars = max_body_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (self.sample_rate < 1.0 and record.levelno <= logging.INFO
+                and getattr(record, "event_type", None) in HOT_PATH_EVENTS and random.random() >= self.sample_rate):
+            return False
+        for field in BODY_FIELDS:
+            value = getattr(record, field, None)
+            if isinstance(value, str) and len(value) > self.max_body_chars:
+                setattr(record, field, value[:self.max_body_chars] + "…")
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when its bounded queue is full, so that logging never blocks a request"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+
+class RemoteLogHandler(logging.Handler):
+    """Sends records as newline-delimited JSON to an HTTP log collector (e.g. a Splunk HTTP Event Collector, or a
+    local stub during development).
+
+    Records are posted in batches of batch_size, or sooner once flush_interval seconds have passed since the last post.
+    It runs on the logging thread, so a slow collector delays other log records but never a request; a batch the
+    collector rejects is dropped.
+    """
+
+    def __init__(self, url: str, authorization: str | None = None, batch_size: int = REMOTE_BATCH_SIZE,
+                 flush_interval: float = REMOTE_FLUSH_INTERVAL_SECONDS, client: httpx.Client | None = None):
+        """Initializes the handler
+
+        Args:
+            url: The collector endpoint
+            authorization: The Authorization header sent with each batch (e.g. "Splunk <token>")
+            batch_size: The number of records sent per request
+            flush_interval: The maximum number of seconds between posts while records arrive
+            client: The HTTP client to post with (a new one is created if None)
+        """
+        super().__init__()
+        self.url = url
+        self.headers = {"Content-Type": "application/x-ndjson"}
+        if authorization:
+            self.headers["Authorization"] = authorization
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.client = client or httpx.Client(timeout=REMOTE_TIMEOUT_SECONDS)
+        self.buffer: list[str] = []
+        self.last_flush = time.monotonic()
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record: logging.LogRecord):
+        self.buffer.append(self.format(record))
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Posts the buffered records."""
+        self.acquire()
+        try:
+            batch, self.buffer = self.buffer, []
+            self.last_flush = time.monotonic()
+            if not batch:
+                return
+            try:
+                self.client.post(self.url, content="\n".join(batch).encode(), headers=self.headers).raise_for_status()
+            except httpx.HTTPError:
+                # Logging the failure would feed it back into this handler
+                LOG_RECORDS_DROPPED.labels("remote_error").inc(len(batch))
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        self.client.close()
+        super().close()
+
+
+def configure_logger(log_file: str = DEFAULT_LOG_FILE, max_bytes: int = DEFAULT_MAX_BYTES,
+                     backup_count: int = DEFAULT_BACKUP_COUNT, queue_size: int = DEFAULT_QUEUE_SIZE,
+                     sample_rate: float = DEFAULT_SAMPLE_RATE, max_body_chars: int = DEFAULT_MAX_BODY_CHARS,
+                     remote_url: str | None = None, remote_authorization: str | None = None) -> logging.Logger:
+    """Routes every logger through a queue to a background thread that writes the records out.
+
+    A request thread only filters a record (see SamplingFilter) and puts it on a bounded queue, dropping it if the
+    queue is full. The logging thread prints it to the console, appends it as JSON to a rotating log file (if a
+    log_file is given) and, if a remote_url is given, sends it to a log collector. Calling this again replaces the
+    previous configuration.
+
+    Args:
+        log_file: The JSON log file, or an empty string to only log to the console (e.g. when several worker processes
+            would otherwise rotate the same file)
+        max_bytes: The size at which the log file is rotated
+        backup_count: The number of rotated log files kept
+        queue_size: The maximum number of records waiting to be written
+        sample_rate: The fraction of hot path events to keep
+        max_body_chars: The number of characters of message text to keep
+        remote_url: The log collector endpoint, if any
+        remote_authorization: The Authorization header sent to the log collector
+
+    Returns:
+        The application logger
+    """
     # Splunk logging implementation
     #
     # SPLUNK_HOST = os.environ.get('SPLUNK_HOST', 'splunk.example.com')
@@ -31,11 +199,43 @@ def configure_logger() -> logging.Logger:
     # splunk_handler.setLevel(logging.INFO)
     # logger.addHandler(splunk_handler)
     # return logger
+    global _listener
+    stop_logging()
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers = [console_handler]
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if remote_url:
+        handlers.append(RemoteLogHandler(remote_url, remote_authorization))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(SamplingFilter(sample_rate, max_body_chars))
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return logging.getLogger(__name__)
+
+
+def stop_logging():
+    """Writes out the queued records and closes the handlers of the current configuration, if there is one."""
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, DroppingQueueHandler):
+            root.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
 
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    handler = RotatingFileHandler('chat_app.log', maxBytes=10000, backupCount=3)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    return logger
+atexit.register(stop_logging)
@@ -1,20 +1,131 @@
+import base64
+import binascii
+import re
+import threading
+from datetime import datetime, timezone
+
 from config.constants import Constants
+from models.message import DEFAULT_CONVERSATION_ID
+
+CONVERSATION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def utc_timestamp(timestamp: datetime) -> datetime:
+    """ Normalizes a timestamp to an aware UTC datetime (MongoDB returns naive UTC datetimes)
+
+    Args:
+        timestamp: The naive (UTC) or aware timestamp
+
+    Returns:
+        The aware UTC timestamp
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+class MessageClock:
+    """ Issues message timestamps that never go backwards within a process
+
+    Timestamps are truncated to milliseconds (the precision MongoDB stores), so that cached copies of a message are
+    identical to the stored one. A timestamp is never earlier than the previous one, even if the wall clock steps back.
+    """
+
+    def __init__(self):
+        self._last = datetime.min.replace(tzinfo=timezone.utc)
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        """ Returns the timestamp for a message being written now
+
+        Returns:
+            The aware UTC timestamp
+        """
+        now = datetime.now(tz=timezone.utc)
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        with self._lock:
+            self._last = max(self._last, now)
+            return self._last
+
+
+def history_position(messages: list[dict], after: tuple[datetime, int] | None = None) -> tuple[datetime, int] | None:
+    """ Computes the history position just after the last message of a page
+
+    A position (timestamp, seen) points after the first `seen` messages stamped exactly `timestamp` (in storage
+    order), so it identifies a message without exposing its database id.
+
+    Args:
+        messages: The page of messages, oldest first
+        after: The position the page was retrieved after
+
+    Returns:
+        The position after the page (or `after` itself if the page is empty)
+    """
+    if not messages:
+        return after
+    timestamp = utc_timestamp(messages[-1][Constants.TIMESTAMP_FIELD])
+    seen = 0
+    for message in reversed(messages):
+        if utc_timestamp(message[Constants.TIMESTAMP_FIELD]) != timestamp:
+            break
+        seen += 1
+    else:
+        # The whole page shares the timestamp, so it continues the group the previous position was in
+        if after is not None and utc_timestamp(after[0]) == timestamp:
+            seen += after[1]
+    return timestamp, seen
+
+
+def encode_cursor(position: tuple[datetime, int]) -> str:
+    """ Encodes a history position as an opaque history cursor
+
+    Args:
+        position: The (timestamp, seen) position, see history_position
+
+    Returns:
+        The URL-safe cursor string
+    """
+    timestamp, seen = position
+    raw = f"{utc_timestamp(timestamp).isoformat()}|{seen}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """ Decodes a history cursor created by encode_cursor
+
+    Args:
+        cursor: The cursor string
 
+    Returns:
+        The (timestamp, seen) position the cursor points at
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    timestamp, separator, seen = raw.partition("|")
+    if not separator or not seen.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return utc_timestamp(datetime.fromisoformat(timestamp)), int(seen)
 
-def remove_mongo_id(data):
-    """ (Recursively) Removes MongoDB ObjectId from messages for JSON serialization
+
+def parse_conversation_id(conversation_id: str | None) -> str:
+    """ Validates a conversation id received from a client
 
     Args:
-        data: The data to be converted (message or list of messages)
+        conversation_id: The conversation id, or None for the default conversation
 
     Returns:
-        The message or list of messages with no _id field
+        The conversation id
+
+    Raises:
+        ValueError: If the id is not 1 to 64 letters, digits, hyphens or underscores
     """
-    if isinstance(data, list):
-        return [remove_mongo_id(item) for item in data]
-    if isinstance(data, dict):
-        data_cleaned = data.copy()
-        if Constants.ID_FIELD in data_cleaned:
-            del data_cleaned[Constants.ID_FIELD]
-        return data_cleaned
-    return data
+    if conversation_id is None:
+        return DEFAULT_CONVERSATION_ID
+    if not CONVERSATION_ID_PATTERN.fullmatch(conversation_id):
+        raise ValueError(f"Invalid conversation id: {conversation_id!r}")
+    return conversation_id
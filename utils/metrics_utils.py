@@ -0,0 +1,60 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+from config.constants import EnvironmentVariables
+
+# Set by the process manager when several worker processes serve the app; each worker then writes its samples to
+# files in this directory and /metrics aggregates them. prometheus_client reads it when it is first imported.
+MULTIPROCESS_DIR_VARIABLE = EnvironmentVariables.PROMETHEUS_MULTIPROC_DIR_VARIABLE
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Time spent in each stage of handling a chat request", ["stage"],
+                          buckets=LATENCY_BUCKETS)
+DB_CALL_SECONDS = Histogram("chat_db_call_seconds", "Time spent in each call to the message store", ["operation"],
+                            buckets=LATENCY_BUCKETS)
+
+
+@contextmanager
+def timed(histogram: Histogram, label: str) -> Iterator[None]:
+    """Records the duration of the with block in a histogram.
+
+    Args:
+        histogram: A histogram with a single label
+        label: The label value to record the duration under
+    """
+    child = histogram.labels(label)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        child.observe(time.perf_counter() - start)
+
+
+def stage(name: str):
+    """Records the duration of the with block as a stage of handling a chat request (see MetricStages).
+
+    Args:
+        name: The stage
+
+    Returns:
+        The context manager
+    """
+    return timed(STAGE_SECONDS, name)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Renders the metrics in the Prometheus text format, aggregated over every worker process in multiprocess mode.
+
+    Returns:
+        The body and its content type
+    """
+    if MULTIPROCESS_DIR_VARIABLE in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,49 @@
+import re
+import threading
+from functools import lru_cache
+
+from bleach.sanitizer import Cleaner
+
+# bleach.clean returns any other text unchanged: it only escapes or parses the markup characters, and html5lib drops or
+# normalizes the C0 control characters other than tab and line feed (e.g. "\r\n" becomes "\n")
+NEEDS_CLEANING = re.compile(r"[\x00-\x08\x0b-\x1f&<>]")
+MEMO_SIZE = 1024
+# Longer texts are cleaned without being memoized, which bounds the memory held by the memo
+MEMO_MAX_CHARS = 4096
+
+_local = threading.local()
+
+
+def _cleaner() -> Cleaner:
+    """Returns the calling thread's Cleaner, built on first use (a Cleaner's parser has state, so it cannot be
+    shared between threads)."""
+    cleaner = getattr(_local, "cleaner", None)
+    if cleaner is None:
+        # The same settings bleach.clean uses by default
+        cleaner = _local.cleaner = Cleaner()
+    return cleaner
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _clean_memoized(text: str) -> str:
+    """Returns the cleaned text, remembering the MEMO_SIZE most recently used results (e.g. repeated AI outputs)."""
+    return _cleaner().clean(text)
+
+
+def sanitize(text: str) -> str:
+    """Sanitizes message text, with exactly the result of bleach.clean(text).
+
+    Text without markup or control characters, which is most chat text, is returned as is without being parsed. Other
+    text is cleaned with a reusable per-thread Cleaner, and short texts are memoized.
+
+    Args:
+        text: The raw text
+
+    Returns:
+        The sanitized text
+    """
+    if NEEDS_CLEANING.search(text) is None:
+        return text
+    if len(text) <= MEMO_MAX_CHARS:
+        return _clean_memoized(text)
+    return _cleaner().clean(text)